@@ -0,0 +1,49 @@
+"""content simhash and duplicate_of
+
+Adds the near-duplicate columns of content_piece. Tables are created by the app on startup, so on a
+new database there is nothing to migrate; on a database created by this version the statements are
+no-ops.
+
+Revision ID: 195cbcce5983
+Revises: 
+Create Date: 2026-10-17 07:07:17.567571
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision: str = '195cbcce5983'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_content_table() -> bool:
+    # Offline (--sql) there is no database to look at, and the script assumes the table exists
+    return context.is_offline_mode() or sa.inspect(op.get_bind()).has_table("content_piece")
+
+
+def upgrade() -> None:
+    if not _has_content_table():
+        return
+    op.execute("ALTER TABLE content_piece ADD COLUMN IF NOT EXISTS simhash BIGINT")
+    op.execute("ALTER TABLE content_piece ADD COLUMN IF NOT EXISTS duplicate_of VARCHAR")
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'content_piece_duplicate_of_fkey') THEN
+                ALTER TABLE content_piece ADD CONSTRAINT content_piece_duplicate_of_fkey
+                    FOREIGN KEY (duplicate_of) REFERENCES content_piece (id) ON DELETE SET NULL;
+            END IF;
+        END $$
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_content_piece_duplicate_of ON content_piece (duplicate_of)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_content_piece_duplicate_of")
+    op.execute("ALTER TABLE content_piece DROP COLUMN IF EXISTS duplicate_of")
+    op.execute("ALTER TABLE content_piece DROP COLUMN IF EXISTS simhash") 
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""content canonical_url
+
+Adds canonical_url to content_piece, fills it in for the stored pieces and makes it unique. Where
+stored pieces share a canonical URL, the one retrieved first gets it and the others are left without,
+so the constraint can be created. The backfill needs a database connection; with --sql it is left
+out and pieces stored before this revision simply have no canonical URL.
+
+Revision ID: 25fe1964373a
+Revises: 195cbcce5983
+Create Date: 2026-10-17 07:08:09.830020
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+
+from digest.retrieval.urls import canonicalize_url
+
+# revision identifiers, used by Alembic.
+revision: str = '25fe1964373a'
+down_revision: Union[str, None] = '195cbcce5983'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 1000
+
+
+def _has_content_table() -> bool:
+    # Offline (--sql) there is no database to look at, and the script assumes the table exists
+    return context.is_offline_mode() or sa.inspect(op.get_bind()).has_table("content_piece")
+
+
+def _backfill() -> None:
+    connection = op.get_bind()
+    taken = set(connection.execute(sa.text(
+        "SELECT canonical_url FROM content_piece WHERE canonical_url IS NOT NULL"
+    )).scalars())
+    rows = connection.execute(sa.text(
+        "SELECT id, url FROM content_piece WHERE canonical_url IS NULL AND url IS NOT NULL "
+        "ORDER BY retrieved_at, id"
+    )).all()
+
+    updates = []
+    for content_id, url in rows:
+        canonical_url = canonicalize_url(url)
+        if canonical_url is None or canonical_url in taken:
+            continue
+        taken.add(canonical_url)
+        updates.append({"id": content_id, "canonical_url": canonical_url})
+    for start in range(0, len(updates), BATCH_SIZE):
+        connection.execute(
+            sa.text("UPDATE content_piece SET canonical_url = :canonical_url WHERE id = :id"),
+            updates[start:start + BATCH_SIZE],
+        )
+
+
+def upgrade() -> None:
+    if not _has_content_table():
+        return
+    op.execute("ALTER TABLE content_piece ADD COLUMN IF NOT EXISTS canonical_url VARCHAR")
+    if not context.is_offline_mode():
+        _backfill()
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_content_canonical_url') THEN
+                ALTER TABLE content_piece ADD CONSTRAINT uq_content_canonical_url UNIQUE (canonical_url);
+            END IF;
+        END $$
+    """)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE content_piece DROP CONSTRAINT IF EXISTS uq_content_canonical_url")
+    op.execute("ALTER TABLE content_piece DROP COLUMN IF EXISTS canonical_url") 
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""content revisions
+
+Adds content_hash to content_piece and the content_revision table for the versions upserts replace,
+and limits the tsvector trigger to updates of the columns it reads.
+
+Revision ID: 86192970a358
+Revises: 25fe1964373a
+Create Date: 2026-10-17 07:08:34.306732
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision: str = '86192970a358'
+down_revision: Union[str, None] = '25fe1964373a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_content_table() -> bool:
+    # Offline (--sql) there is no database to look at, and the script assumes the table exists
+    return context.is_offline_mode() or sa.inspect(op.get_bind()).has_table("content_piece")
+
+
+def _create_trigger(events: str) -> None:
+    op.execute("DROP TRIGGER IF EXISTS content_piece_tsvector_update ON content_piece")
+    op.execute(f"""
+        CREATE TRIGGER content_piece_tsvector_update
+            BEFORE {events} ON content_piece
+            FOR EACH ROW
+            EXECUTE FUNCTION content_piece_tsvector_trigger()
+    """)
+
+
+def upgrade() -> None:
+    if not _has_content_table():
+        return
+    # Pieces stored before have no hash; upserts hash them from their text when they are compared
+    op.execute("ALTER TABLE content_piece ADD COLUMN IF NOT EXISTS content_hash VARCHAR")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS content_revision (
+            id SERIAL PRIMARY KEY,
+            content_id VARCHAR NOT NULL REFERENCES content_piece (id) ON DELETE CASCADE,
+            title VARCHAR NOT NULL,
+            content VARCHAR NOT NULL,
+            content_hash VARCHAR,
+            replaced_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_content_revision_content_id ON content_revision (content_id)")
+    _create_trigger("INSERT OR UPDATE OF title, content, metainfo")
+
+
+def downgrade() -> None:
+    _create_trigger("INSERT OR UPDATE")
+    op.execute("DROP TABLE IF EXISTS content_revision")
+    op.execute("ALTER TABLE content_piece DROP COLUMN IF EXISTS content_hash") 
\ No newline at end of file
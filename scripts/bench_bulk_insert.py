@@ -0,0 +1,81 @@
+"""
+Compare the rows per second of AsyncContentRepository.bulk_insert (multi-row INSERT) and bulk_load (COPY).
+
+Usage: python scripts/bench_bulk_insert.py [ROWS] [INSERT_BATCH]
+
+Needs the database from DATABASE_URL. Rows are written for a throwaway source that is deleted
+afterwards. bulk_insert is called in batches of INSERT_BATCH rows (default 1000), since a single
+statement can't take more than 32767 parameters; bulk_load chunks by BULK_LOAD_CHUNK_SIZE itself.
+Language detection is skipped, so only the database path is timed.
+"""
+import asyncio
+import sys
+import time
+import uuid
+
+from sqlalchemy import text
+
+from digest.config.settings import settings
+from digest.database.enums import ContentType, SourceType
+from digest.database.models.content import ContentPiece
+from digest.database.models.source import Source
+from digest.database.repositories.content import AsyncContentRepository
+from digest.database.session import async_engine, async_session_maker
+
+
+def make_pieces(source_id: str, rows: int):
+    run = uuid.uuid4().hex[:8]
+    return [
+        ContentPiece(
+            id=f"{source_id}:{run}:{i}",
+            title=f"Benchmark piece {i}",
+            content=f"Body of benchmark piece {i}. " * 20,
+            content_type=ContentType.ARTICLE,
+            url=f"https://bench.example.com/{run}/{i}",
+            source_id=source_id,
+            metainfo={"language": "english"},
+        )
+        for i in range(rows)
+    ]
+
+
+async def run(rows: int, insert_batch: int):
+    source = Source(name=f"bench-{uuid.uuid4().hex[:8]}", source_type=SourceType.CUSTOM, parser_id="rss")
+    async with async_session_maker() as session:
+        session.add(source)
+        await session.commit()
+
+    try:
+        async with async_session_maker() as session:
+            repository = AsyncContentRepository(session)
+            pieces = make_pieces(source.id, rows)
+            started = time.perf_counter()
+            inserted = 0
+            for start in range(0, rows, insert_batch):
+                inserted += len(await repository.bulk_insert(pieces[start:start + insert_batch]))
+            insert_time = time.perf_counter() - started
+
+            pieces = make_pieces(source.id, rows)
+            started = time.perf_counter()
+            loaded = len(await repository.bulk_load(pieces))
+            load_time = time.perf_counter() - started
+
+        print(f"{'path':<32}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+        for path, count, seconds in (
+            (f"bulk_insert (batches of {insert_batch})", inserted, insert_time),
+            (f"bulk_load (chunks of {settings.BULK_LOAD_CHUNK_SIZE})", loaded, load_time),
+        ):
+            print(f"{path:<32}{count:>10}{seconds:>10.2f}{count / seconds:>12.0f}")
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(text("DELETE FROM content_piece WHERE source_id = :id"), {"id": source.id})
+            await session.execute(text("DELETE FROM source WHERE id = :id"), {"id": source.id})
+            await session.commit()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1000,
+    ))
@@ -0,0 +1,41 @@
+"""
+Compare the lxml fast path of the RSS parser with feedparser.
+
+Times the parse step only, as it runs in a parse pool worker: building content pieces is not included.
+
+Usage: python scripts/bench_feed_parsing.py [FEED_FILE ...]
+
+Defaults to the feeds in tests/fixtures/feeds. Prints the median time per parse of each file.
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from digest.retrieval.parsers.rss import parse_feed
+
+FIXTURES = Path(__file__).parents[1] / "tests" / "fixtures" / "feeds"
+ROUNDS = 50
+
+
+def median_time(body: bytes, fast_path: bool) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        parse_feed(body, fast_path)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main(paths):
+    print(f"{'feed':<24}{'entries':>8}{'lxml ms':>10}{'feedparser ms':>15}{'speedup':>9}")
+    for path in paths:
+        body = path.read_bytes()
+        _, entries = parse_feed(body)
+        fast = median_time(body, fast_path=True)
+        slow = median_time(body, fast_path=False)
+        print(f"{path.name:<24}{len(entries):>8}{fast * 1000:>10.2f}{slow * 1000:>15.2f}{slow / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main([Path(arg) for arg in sys.argv[1:]] or sorted(FIXTURES.glob("*")))
@@ -0,0 +1,18 @@
+from fastapi import HTTPException, status
+
+from digest.config.settings import settings
+
+
+def require_local_ingest() -> None:
+    """
+    Dependency of the endpoints that report on the in-process fetch loop.
+
+    With INGEST_MODE=distributed, circuit breakers, schedules, fetch jobs and scheduler stats live in the
+    ingest workers. The API process would answer with its own idle state, which looks healthy rather than
+    unknown, so these endpoints answer 409 instead.
+    """
+    if settings.INGEST_MODE != "local":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Fetch loop state is kept by the ingest workers in distributed mode",
+        )
@@ -1,10 +1,12 @@
 from fastapi import APIRouter
 
-from digest.api.v1.endpoints import sources, content
+from digest.api.v1.endpoints import sources, content, retrieval, fetch_jobs
 
 api_router = APIRouter()
 api_router.include_router(sources.router, prefix="/sources", tags=["Sources"])
 api_router.include_router(content.router, prefix="/content", tags=["Content"])
+api_router.include_router(retrieval.router, prefix="/retrieval", tags=["Retrieval"])
+api_router.include_router(fetch_jobs.router, prefix="/fetch-jobs", tags=["Retrieval"])
 
 @api_router.get("/health", tags=["health"])
 async def health_check():
@@ -1,41 +1,41 @@
 from fastapi import APIRouter, Depends, Query
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Dict, Any
 from time import time
-from digest.database.repositories.content import ContentRepository
-from digest.database.session import get_session
+from digest.database.repositories.content import AsyncContentRepository
+from digest.database.session import get_async_session
 
 router = APIRouter()
 
 
 @router.get("")
-async def get_content(page: int = 1, page_size: int = 10, session: Session = Depends(get_session)):
-    content_repository = ContentRepository(session)
-    return content_repository.get_all_paged(page, page_size)
+async def get_content(page: int = 1, page_size: int = 10, session: AsyncSession = Depends(get_async_session)):
+    content_repository = AsyncContentRepository(session)
+    return await content_repository.get_all_paged(page, page_size)
 
 @router.get("/search")
-async def search_content(query: str, session: Session = Depends(get_session)):
-    content_repository = ContentRepository(session)
-    return content_repository.search(query)
+async def search_content(query: str, session: AsyncSession = Depends(get_async_session)):
+    content_repository = AsyncContentRepository(session)
+    return await content_repository.search(query)
 
 @router.get("/search/benchmark")
 async def benchmark_search(
     query: str,
     similarity_threshold: float = Query(default=0.3, ge=0.0, le=1.0),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ) -> Dict[str, Any]:
     """
     Benchmark different search approaches and return timing and relevance metrics.
 
     """
-    content_repository = ContentRepository(session)
+    content_repository = AsyncContentRepository(session)
 
     # Run different search methods and measure their performance
     results = {}
 
     # 1. Full-text search only
     start_time = time()
-    fts_results = content_repository.search_fts_only(query, include_plan=True)
+    fts_results = await content_repository.search_fts_only(query, include_plan=True)
     fts_time = (time() - start_time) * 1000
 
     fts_plan = fts_results[0].query_plan if fts_results else {}
@@ -58,7 +58,9 @@ async def benchmark_search(
 
     # 2. Trigram search only
     start_time = time()
-    trgm_results = content_repository.search_trigram_only(query, similarity_threshold, include_plan=True)
+    trgm_results = await content_repository.search_trigram_only(
+        query, similarity_threshold, include_plan=True
+    )
     trgm_time = (time() - start_time) * 1000
 
     # Extract query plan info
@@ -82,7 +84,7 @@ async def benchmark_search(
 
     # 3. Combined search (current implementation)
     start_time = time()
-    combined_results = content_repository.search(query, similarity_threshold, include_plan=True)
+    combined_results = await content_repository.search(query, similarity_threshold, include_plan=True)
     combined_time = (time() - start_time) * 1000
 
     combined_plan = combined_results[0].query_plan if combined_results else {}
@@ -104,7 +106,7 @@ async def benchmark_search(
 
     # 4. No index search (LIKE/ILIKE)
     start_time = time()
-    no_index_results = content_repository.search_no_index(query, include_plan=True)
+    no_index_results = await content_repository.search_no_index(query, include_plan=True)
     no_index_time = (time() - start_time) * 1000
 
     no_index_plan = no_index_results[0].query_plan if no_index_results else {}
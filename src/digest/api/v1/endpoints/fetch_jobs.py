@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from digest.api.dependencies import require_local_ingest
+from digest.retrieval.task_manager import task_manager
+
+router = APIRouter()
+
+
+@router.get("/{job_id}", dependencies=[Depends(require_local_ingest)])
+async def get_fetch_job(job_id: str):
+    """State, timings and outcome of a fetch job."""
+    job = task_manager.jobs.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Fetch job with ID '{job_id}' does not exists",
+        )
+    return job
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+
+from digest.api.dependencies import require_local_ingest
+from digest.retrieval.scheduler import SchedulerStats
+from digest.retrieval.task_manager import task_manager
+
+router = APIRouter()
+
+
+@router.get("/scheduler", dependencies=[Depends(require_local_ingest)])
+async def get_scheduler_stats() -> SchedulerStats:
+    """
+    Queue depth, concurrency usage and scheduling lag (seconds between a fetch being due and starting).
+    """
+    return task_manager.scheduler.stats()
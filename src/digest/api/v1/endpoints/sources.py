@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from digest.api.dependencies import require_local_ingest
+from digest.config.settings import settings
 from digest.database.models.source import Source
-from digest.database.repositories.sources import SourceRepository
-from digest.database.session import get_session
+from digest.database.repositories.leases import LeaseRepository
+from digest.database.repositories.sources import AsyncSourceRepository
+from digest.database.session import get_async_session
 from digest.retrieval.parsers.base import ParserRegistry
 from digest.retrieval.task_manager import task_manager
 
@@ -11,21 +14,31 @@ router = APIRouter()
 
 
 @router.post("")
-async def create_source(config: Source, session: Session = Depends(get_session)
+async def create_source(config: Source, session: AsyncSession = Depends(get_async_session)
 ):
-    source_repository = SourceRepository(session)
+    source_repository = AsyncSourceRepository(session)
     try:
-        source = source_repository.create(config)
-        task_manager.start_parser(source.id)
+        source = await source_repository.create(config)
+        if settings.INGEST_MODE == "local":
+            await task_manager.reconcile_source(source.id)
+        else:
+            # A lease row due now, so the next claim of any ingest worker picks the source up
+            await LeaseRepository(session).mark_due(source.id)
         return source
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
 
+@router.get("/breakers", dependencies=[Depends(require_local_ingest)])
+async def get_breakers(tripped_only: bool = False):
+    """Per-host circuit breakers of the fetch loop; `tripped_only` hides the closed ones."""
+    return task_manager.breakers.list(tripped_only)
+
+
 @router.get("/{source_id}")
-async def get_source(source_id: str, session: Session = Depends(get_session)):
-    source_repository = SourceRepository(session)
-    source = source_repository.get_by_id(source_id)
+async def get_source(source_id: str, session: AsyncSession = Depends(get_async_session)):
+    source_repository = AsyncSourceRepository(session)
+    source = await source_repository.get_by_id(source_id)
     if not source:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -35,34 +48,40 @@ async def get_source(source_id: str, session: Session = Depends(get_session)):
 
 
 @router.get("")
-async def get_all_sources(session: Session = Depends(get_session)):
-    source_repository = SourceRepository(session)
-    return source_repository.get_all()
+async def get_all_sources(session: AsyncSession = Depends(get_async_session)):
+    source_repository = AsyncSourceRepository(session)
+    return await source_repository.get_all()
 
 
 @router.delete("/{source_id}")
-async def delete_source(source_id: str, session: Session = Depends(get_session)):
-    source_repository = SourceRepository(session)
-    result = source_repository.delete(source_id)
+async def delete_source(source_id: str, session: AsyncSession = Depends(get_async_session)):
+    source_repository = AsyncSourceRepository(session)
+    result = await source_repository.delete(source_id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Source with ID '{source_id}' does not exists",
         )
-
-    task_manager.stop_parser(source_id)
+    # Otherwise the reconcile loop stops the parser within RECONCILE_INTERVAL
+    if settings.INGEST_MODE == "local":
+        await task_manager.reconcile_source(source_id)
 
 # uh, that's probably not per REST spec but I don't want to duplicate the source id in the body
 @router.put("")
-async def update_source(source: Source, session: Session = Depends(get_session)):
-    source_repository = SourceRepository(session)
-    source = source_repository.update(source)
+async def update_source(source: Source, session: AsyncSession = Depends(get_async_session)):
+    source_repository = AsyncSourceRepository(session)
+    source = await source_repository.update(source)
+    # Otherwise the reconcile loop applies the change within RECONCILE_INTERVAL
+    if settings.INGEST_MODE == "local":
+        await task_manager.reconcile_source(source.id)
     return source
 
 @router.patch("/{source_id}")
-async def patch_source(source_id: str, source_new: Source, session: Session = Depends(get_session)):
-    source_repository = SourceRepository(session)
-    source = source_repository.get_by_id(source_id)
+async def patch_source(
+    source_id: str, source_new: Source, session: AsyncSession = Depends(get_async_session)
+):
+    source_repository = AsyncSourceRepository(session)
+    source = await source_repository.get_by_id(source_id)
     if not source:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -71,14 +90,16 @@ async def patch_source(source_id: str, source_new: Source, session: Session = De
     for key, value in source_new.model_dump().items():
         if not key == "id": 
             setattr(source, key, value)
-    source = source_repository.update(source)
+    source = await source_repository.update(source)
+    if settings.INGEST_MODE == "local":
+        await task_manager.reconcile_source(source.id)
     return source
 
 
 @router.get("/{source_id}/test")
-async def test_source(source_id: str, session: Session = Depends(get_session)):
-    source_repository = SourceRepository(session)
-    source = source_repository.get_by_id(source_id)
+async def test_source(source_id: str, session: AsyncSession = Depends(get_async_session)):
+    source_repository = AsyncSourceRepository(session)
+    source = await source_repository.get_by_id(source_id)
     if not source:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -88,15 +109,36 @@ async def test_source(source_id: str, session: Session = Depends(get_session)):
     parser = ParserRegistry.get_parser(source.parser_id)
     return await parser(source.id, source.config).test_connection()
 
+@router.get("/{source_id}/schedule", dependencies=[Depends(require_local_ingest)])
+async def get_source_schedule(source_id: str, session: AsyncSession = Depends(get_async_session)):
+    """Configured and effective polling interval of a source."""
+    source_repository = AsyncSourceRepository(session)
+    source = await source_repository.get_by_id(source_id)
+    if not source:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Source with ID '{source_id}' does not exists",
+        )
+    return await task_manager.get_schedule(source)
+
 @router.get("/{source_id}/fetch")
-async def fetch_source(source_id: str, session: Session = Depends(get_session)):
-    source_repository = SourceRepository(session)
-    source = source_repository.get_by_id(source_id)
+async def fetch_source(source_id: str, session: AsyncSession = Depends(get_async_session)):
+    source_repository = AsyncSourceRepository(session)
+    source = await source_repository.get_by_id(source_id)
     if not source:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Source with ID '{source_id}' does not exists",
         )
-    task_manager.one_off_fetch(source_id)
-    # TODO: some task status checking endpoint, or plain wait for it?
-    return {"message": "Fetching source"}
+    if settings.INGEST_MODE == "distributed":
+        # Jobs run on the ingest workers and are only tracked there
+        await LeaseRepository(session).mark_due(source_id)
+        return {"message": "Fetching source"}
+    # Poll GET /fetch-jobs/{id} for the outcome
+    return await task_manager.one_off_fetch(source_id)
+
+
+@router.get("/{source_id}/fetch-jobs", dependencies=[Depends(require_local_ingest)])
+async def get_source_fetch_jobs(source_id: str):
+    """Recent fetch jobs of a source, newest first."""
+    return task_manager.jobs.for_source(source_id)
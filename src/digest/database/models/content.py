@@ -1,10 +1,11 @@
+import hashlib
 from datetime import datetime
 from typing import Optional, Dict, Any
 from sqlmodel import Relationship, SQLModel, Field, Column
 from uuid import UUID, uuid4
 from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlmodel import Index, text, UniqueConstraint, DDL
-from sqlalchemy import event, Column as SQLAlchemyColumn, Table
+from sqlalchemy import BigInteger, event, Column as SQLAlchemyColumn, Table
 from sqlalchemy.ext.declarative import declared_attr
 from pgvector.sqlalchemy import Vector
 from digest.database.enums import ContentType
@@ -54,6 +55,7 @@ class ContentPiece(SQLModel, table=True):
     """Database model for content pieces."""
     __table_args__ = (
         UniqueConstraint('url', name='uq_content_url'),
+        UniqueConstraint('canonical_url', name='uq_content_canonical_url'),
         Index(
             'ix_content_piece_trigram',
             text('title gin_trgm_ops'),
@@ -72,6 +74,9 @@ class ContentPiece(SQLModel, table=True):
     content: str
     content_type: ContentType = Field(default=ContentType.ARTICLE)
     url: Optional[str] = Field(default=None)
+    # Normalized url, so tracking parameters, AMP pages and such don't store a page twice;
+    # see digest.retrieval.urls
+    canonical_url: Optional[str] = Field(default=None)
     author: Optional[str] = Field(default=None)
     published_at: Optional[datetime] = Field(default=None)
     retrieved_at: datetime = Field(default_factory=datetime.utcnow)
@@ -79,6 +84,12 @@ class ContentPiece(SQLModel, table=True):
     metainfo: Dict[str, Any] = Field(default_factory=dict, sa_type=JSONB)
     processed: bool = Field(default=False)
     embedding: Optional[list[float]] = Field(sa_column=Column(Vector(768), nullable=True))
+    content_hash: Optional[str] = Field(default=None)  # of title and content, see compute_hash
+    # SimHash of the content and the stored piece it nearly duplicates, see digest.retrieval.dedup
+    simhash: Optional[int] = Field(default=None, sa_type=BigInteger)
+    duplicate_of: Optional[str] = Field(
+        default=None, foreign_key="content_piece.id", ondelete="SET NULL", index=True
+    )
 
     # Generated columns for full-text search
     title_tsv: Optional[str] = Field(
@@ -102,6 +113,23 @@ class ContentPiece(SQLModel, table=True):
     def convert_language_code(lang_code: str) -> str:
         return LANGDETECT_TO_POSTGRES_MAP.get(lang_code, 'simple')
 
+    @staticmethod
+    def compute_hash(title: str, content: str) -> str:
+        """Hash of the parts of a piece whose change makes it an updated version worth storing."""
+        return hashlib.blake2b(f"{title}\0{content}".encode(), digest_size=16).hexdigest()
+
+
+class ContentRevision(SQLModel, table=True):
+    """Earlier version of a content piece, kept when an upsert replaced it."""
+    __tablename__ = 'content_revision'
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    content_id: str = Field(foreign_key="content_piece.id", ondelete="CASCADE", index=True)
+    title: str
+    content: str
+    content_hash: Optional[str] = Field(default=None)
+    replaced_at: datetime = Field(default_factory=datetime.utcnow)
+
 # Create trigram extension before anything else
 event.listen(
     SQLModel.metadata,
@@ -131,8 +159,9 @@ def create_triggers(target, connection, **kw):
         END;
         $$ LANGUAGE plpgsql;
 
+        -- Only when the text or its language changes, so e.g. marking a piece processed doesn't rebuild them
         CREATE TRIGGER content_piece_tsvector_update
-            BEFORE INSERT OR UPDATE ON content_piece
+            BEFORE INSERT OR UPDATE OF title, content, metainfo ON content_piece
             FOR EACH ROW
             EXECUTE FUNCTION content_piece_tsvector_trigger();
 
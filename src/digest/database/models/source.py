@@ -34,3 +34,48 @@ class Source(SQLModel, table=True):
     )
     feed_source_score: List["FeedSourceScore"] = Relationship(back_populates="source") # type: ignore
     trusted_by: List["TrustedSource"] = Relationship(back_populates="source") # type: ignore
+    fetch_state: Optional["SourceFetchState"] = Relationship(
+        back_populates="source",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan", "uselist": False}
+    )
+    lease: Optional["SourceLease"] = Relationship(
+        back_populates="source",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan", "uselist": False}
+    )
+
+
+class SourceFetchState(SQLModel, table=True):
+    """Database model for per-source retrieval state that has to survive restarts."""
+    __tablename__ = "source_fetch_state" # type: ignore
+
+    source_id: str = Field(foreign_key="source.id", primary_key=True)
+    # HTTP validators from the last successful response, sent back as conditional request headers
+    etag: Optional[str] = Field(default=None)
+    last_modified: Optional[str] = Field(default=None)
+    # Moving estimate of new items per second and the poll interval derived from it (adaptive polling)
+    item_rate: Optional[float] = Field(default=None)
+    effective_interval: Optional[int] = Field(default=None)
+    # Publication date of the newest entry seen so far; streaming feed parsing stops at older entries
+    newest_published_at: Optional[datetime] = Field(default=None)
+    # ID of the newest Telegram message seen so far; channel scraping stops when it reaches it
+    last_message_id: Optional[int] = Field(default=None)
+    # BLAKE2 hash of the last feed body, so an identical body isn't parsed again when the server has no
+    # validators
+    body_hash: Optional[str] = Field(default=None)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    source: Source = Relationship(back_populates="fetch_state")
+
+
+class SourceLease(SQLModel, table=True):
+    """Database model for the due time and lease of a source, claimed by distributed ingest workers."""
+    __tablename__ = "source_lease" # type: ignore
+
+    source_id: str = Field(foreign_key="source.id", primary_key=True)
+    next_fetch_at: Optional[datetime] = Field(default=None, index=True) # UTC, None means due now
+    # Worker holding the source and when its claim runs out, so a crashed worker's sources are picked up again
+    owner: Optional[str] = Field(default=None)
+    expires_at: Optional[datetime] = Field(default=None)
+    consecutive_failures: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+
+    source: Source = Relationship(back_populates="lease")
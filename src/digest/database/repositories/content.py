@@ -1,14 +1,34 @@
+import json
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 from uuid import UUID
-from sqlalchemy import func, or_, text, literal
+from sqlalchemy import and_, delete, func, or_, text, literal, update
 from sqlmodel import Session, cast, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.dialects.postgresql import insert, REGCONFIG
-import langdetect
 from dataclasses import dataclass
 
 
+from digest.config.settings import settings
 from digest.database.enums import ContentType
-from digest.database.models.content import ContentPiece
+from digest.database.models.content import ContentPiece, ContentRevision
+from digest.retrieval.language import language_detector
+from digest.retrieval.urls import canonicalize_url
+
+# Columns written by bulk_load; the tsvector columns are filled in by the insert trigger
+COPY_COLUMNS = (
+    "id", "title", "content", "content_hash", "content_type", "url", "canonical_url", "author",
+    "published_at", "retrieved_at", "source_id", "metainfo", "processed", "embedding", "simhash",
+    "duplicate_of",
+)
+
+
+class PartialInsertError(RuntimeError):
+    """Raised by bulk_load when a chunk fails after earlier chunks were committed."""
+
+    def __init__(self, message: str, inserted: List[str]):
+        super().__init__(message)
+        self.inserted = inserted  # IDs committed before the failure
 
 
 @dataclass
@@ -22,6 +42,42 @@ class SearchResult:
     query_plan: Optional[Dict[str, Any]] = None
 
 
+def to_search_config(lang_code: Optional[str]) -> str:
+    """PostgreSQL text search configuration name for a langdetect code; 'english' if it's unknown."""
+    if lang_code is None:
+        return 'english'
+    return ContentPiece.convert_language_code(lang_code)
+
+
+def detect_language(text: str) -> str:
+    """Detect language of the text and convert to PostgreSQL text search configuration name."""
+    return to_search_config(language_detector.detect(text))
+
+
+def fill_derived_fields(content_pieces: List[ContentPiece]) -> None:
+    """Set the canonical URL and content hash of every piece that doesn't have them yet."""
+    for piece in content_pieces:
+        if piece.canonical_url is None:
+            piece.canonical_url = canonicalize_url(piece.url)
+        if piece.content_hash is None:
+            piece.content_hash = ContentPiece.compute_hash(piece.title, piece.content)
+
+
+async def fill_languages(content_pieces: List[ContentPiece]) -> None:
+    """Detect the language of every piece whose metainfo lacks one, as a single batch off the event loop."""
+    pending = []
+    for piece in content_pieces:
+        if not piece.metainfo:
+            piece.metainfo = {}
+        if 'language' not in piece.metainfo:
+            pending.append(piece)
+    if not pending:
+        return
+    languages = await language_detector.detect_many([piece.content for piece in pending])
+    for piece, lang_code in zip(pending, languages):
+        piece.metainfo['language'] = to_search_config(lang_code)
+
+
 class ContentRepository:
     """Repository for managing content pieces in the database."""
 
@@ -30,11 +86,7 @@ class ContentRepository:
 
     def _detect_language(self, text: str) -> str:
         """Detect language of the text and convert to PostgreSQL text search configuration name."""
-        try:
-            lang_code = langdetect.detect(text)
-            return ContentPiece.convert_language_code(lang_code)
-        except:
-            return 'english'
+        return detect_language(text)
 
     def _update_tsvectors(self, content_piece: ContentPiece):
         """Update tsvector columns based on content language."""
@@ -60,6 +112,7 @@ class ContentRepository:
 
     def create(self, content_piece: ContentPiece) -> ContentPiece:
         """Create a new content piece."""
+        fill_derived_fields([content_piece])
         metainfo = content_piece.metainfo or {}
         if 'language' not in metainfo:
             metainfo['language'] = self._detect_language(content_piece.content)
@@ -246,8 +299,10 @@ class ContentRepository:
         return True
 
     def get_unprocessed(self) -> List[ContentPiece]:
-        """Get all unprocessed content pieces."""
-        statement = select(ContentPiece).where(ContentPiece.processed == False)
+        """Get all unprocessed content pieces, leaving out near-duplicates of stored ones."""
+        statement = select(ContentPiece).where(
+            ContentPiece.processed.is_(False), ContentPiece.duplicate_of.is_(None)
+        )
         return list(self.session.exec(statement))
 
     def mark_as_processed(self, content_id: UUID) -> bool:
@@ -261,14 +316,15 @@ class ContentRepository:
         self.session.commit()
         return True
 
-    def bulk_insert(self, content_pieces: List[ContentPiece]) -> int:
+    def bulk_insert(self, content_pieces: List[ContentPiece]) -> List[str]:
         """
-        Efficiently inserts multiple content pieces, skipping those with duplicate URLs.
-        Returns the number of new pieces inserted.
+        Efficiently inserts multiple content pieces, skipping those with a duplicate ID, URL or canonical URL.
+        Returns the IDs of the pieces actually inserted.
         """
         if not content_pieces:
-            return 0
+            return []
 
+        fill_derived_fields(content_pieces)
         # TODO: should be moved to pipelines and ran by a task manager
         for piece in content_pieces:
             if not piece.metainfo:
@@ -276,18 +332,18 @@ class ContentRepository:
             if 'language' not in piece.metainfo:
                 piece.metainfo['language'] = self._detect_language(piece.content)
 
-        # Get initial count
-        initial_count = self.session.scalar(select(func.count()).select_from(ContentPiece)) or 0
-
         # Convert to dicts because we're using SQL-level statement
         content_dicts = [piece.model_dump() for piece in content_pieces]
-        stmt = insert(ContentPiece).values(content_dicts).on_conflict_do_nothing(index_elements=['url'])
-        self.session.execute(stmt)
+        stmt = (
+            insert(ContentPiece)
+            .values(content_dicts)
+            # No conflict target: pieces clashing on ID, URL or canonical URL are all skipped
+            .on_conflict_do_nothing()
+            .returning(ContentPiece.id)
+        )
+        inserted = list(self.session.execute(stmt).scalars())
         self.session.commit()
-
-        # Get final count and return the difference
-        final_count = self.session.scalar(select(func.count()).select_from(ContentPiece)) or 0
-        return final_count - initial_count
+        return inserted
 
     def get_latest_content_for_source(self, source_id: str, limit: int = 1) -> List[ContentPiece]:
         """Get the most recent content pieces for a source."""
@@ -417,3 +473,335 @@ class ContentRepository:
                 SET enable_seqscan = on;
             """)
             self.session.execute(reset_stmt)
+
+
+class AsyncContentRepository:
+    """
+    Async counterpart of ContentRepository, for use from the event loop.
+
+    The search and benchmarking queries are run through the synchronous implementation on the
+    session's connection, so there is a single copy of them.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def _run_sync(self, method: str, *args, **kwargs):
+        return await self.session.run_sync(
+            lambda session: getattr(ContentRepository(session), method)(*args, **kwargs)
+        )
+
+    async def create(self, content_piece: ContentPiece) -> ContentPiece:
+        """Create a new content piece."""
+        fill_derived_fields([content_piece])
+        await fill_languages([content_piece])
+
+        self.session.add(content_piece)
+        await self.session.commit()
+        await self.session.refresh(content_piece)
+        return content_piece
+
+    async def get_by_id(self, content_id: UUID) -> Optional[ContentPiece]:
+        """Get a content piece by ID."""
+        return await self.session.get(ContentPiece, content_id)
+
+    async def get_by_source(self, source_id: UUID) -> List[ContentPiece]:
+        """Get all content pieces for a source."""
+        statement = select(ContentPiece).where(ContentPiece.source_id == source_id)
+        return list(await self.session.exec(statement))
+
+    async def get_by_type(self, content_type: ContentType) -> List[ContentPiece]:
+        """Get all content pieces of a specific type."""
+        statement = select(ContentPiece).where(ContentPiece.content_type == content_type)
+        return list(await self.session.exec(statement))
+
+    async def search(
+        self, query: str, similarity_threshold: float = 0.3, include_plan: bool = False
+    ) -> List[SearchResult]:
+        """Combined full-text and trigram search, see ContentRepository.search."""
+        return await self._run_sync('search', query, similarity_threshold, include_plan)
+
+    async def search_fts_only(self, query: str, include_plan: bool = False) -> List[SearchResult]:
+        """Full-text search only using tsvector."""
+        return await self._run_sync('search_fts_only', query, include_plan)
+
+    async def search_trigram_only(
+        self, query: str, similarity_threshold: float = 0.3, include_plan: bool = False
+    ) -> List[SearchResult]:
+        """Trigram similarity search only."""
+        return await self._run_sync('search_trigram_only', query, similarity_threshold, include_plan)
+
+    async def search_no_index(self, query: str, include_plan: bool = False) -> List[SearchResult]:
+        """Search without using any indices (forced sequential scan)."""
+        return await self._run_sync('search_no_index', query, include_plan)
+
+    async def update(self, content_piece: ContentPiece) -> ContentPiece:
+        """Update a content piece."""
+        self.session.add(content_piece)
+        await self.session.commit()
+        await self.session.refresh(content_piece)
+        return content_piece
+
+    async def delete(self, content_id: UUID) -> bool:
+        """Delete a content piece."""
+        content_piece = await self.get_by_id(content_id)
+        if not content_piece:
+            return False
+
+        await self.session.delete(content_piece)
+        await self.session.commit()
+        return True
+
+    async def get_unprocessed(self) -> List[ContentPiece]:
+        """Get all unprocessed content pieces, leaving out near-duplicates of stored ones."""
+        statement = select(ContentPiece).where(
+            ContentPiece.processed.is_(False), ContentPiece.duplicate_of.is_(None)
+        )
+        return list(await self.session.exec(statement))
+
+    async def mark_as_processed(self, content_id: UUID) -> bool:
+        """Mark a content piece as processed."""
+        content_piece = await self.get_by_id(content_id)
+        if not content_piece:
+            return False
+
+        content_piece.processed = True
+        self.session.add(content_piece)
+        await self.session.commit()
+        return True
+
+    async def bulk_insert(self, content_pieces: List[ContentPiece]) -> List[str]:
+        """
+        Efficiently inserts multiple content pieces, skipping those with a duplicate ID, URL or canonical URL.
+        Returns the IDs of the pieces actually inserted.
+        """
+        if not content_pieces:
+            return []
+
+        fill_derived_fields(content_pieces)
+        await fill_languages(content_pieces)
+
+        # Only inserted rows are returned, so duplicates skipped by the conflict clause are left out
+        content_dicts = [piece.model_dump() for piece in content_pieces]
+        stmt = (
+            insert(ContentPiece)
+            .values(content_dicts)
+            # No conflict target: pieces clashing on ID, URL or canonical URL are all skipped
+            .on_conflict_do_nothing()
+            .returning(ContentPiece.id)
+        )
+        inserted = list((await self.session.execute(stmt)).scalars())
+        await self.session.commit()
+        return inserted
+
+    @staticmethod
+    def _copy_record(piece: ContentPiece) -> tuple:
+        """A content piece as a row of COPY_COLUMNS, in the form asyncpg's COPY expects."""
+        return (
+            piece.id,
+            piece.title,
+            piece.content,
+            piece.content_hash,
+            # Enum columns store member names
+            ContentType(piece.content_type).name,
+            piece.url,
+            piece.canonical_url,
+            piece.author,
+            piece.published_at,
+            piece.retrieved_at,
+            piece.source_id,
+            json.dumps(piece.metainfo),
+            piece.processed,
+            piece.embedding,
+            piece.simhash,
+            piece.duplicate_of,
+        )
+
+    async def bulk_load(
+        self, content_pieces: List[ContentPiece], chunk_size: int = settings.BULK_LOAD_CHUNK_SIZE
+    ) -> List[str]:
+        """
+        Insert many content pieces through COPY, for backfills and very large feeds.
+
+        Each chunk of `chunk_size` pieces is copied into a temporary staging table and merged into
+        content_piece with a single INSERT .. SELECT that skips pieces conflicting on their ID, URL or
+        canonical URL. Statement size and planning time stay the same however many pieces there are. Every
+        chunk is committed separately, so when a chunk fails, the ones before it are kept.
+
+        Returns:
+            The IDs of the pieces actually inserted
+
+        Raises:
+            PartialInsertError: If a chunk fails after others were committed, with the IDs they inserted
+        """
+        fill_derived_fields(content_pieces)
+        await fill_languages(content_pieces)
+
+        columns = ", ".join(COPY_COLUMNS)
+        inserted = []
+        for start in range(0, len(content_pieces), chunk_size):
+            try:
+                inserted += await self._load_chunk(content_pieces[start:start + chunk_size], columns)
+            except Exception as e:
+                if not inserted:
+                    raise
+                # Retrying the batch would find the committed pieces stored already and not report them
+                raise PartialInsertError(str(e), inserted) from e
+        return inserted
+
+    async def _load_chunk(self, chunk: List[ContentPiece], columns: str) -> List[str]:
+        """Copy a chunk of pieces in through a staging table and commit it, returning the IDs inserted."""
+        # Dropped on commit, so pooled connections don't keep it around
+        await self.session.execute(text(
+            f"CREATE TEMP TABLE content_piece_staging ON COMMIT DROP AS "
+            f"SELECT {columns} FROM content_piece WITH NO DATA"
+        ))
+        connection = await (await self.session.connection()).get_raw_connection()
+        await connection.driver_connection.copy_records_to_table(
+            "content_piece_staging",
+            records=[self._copy_record(piece) for piece in chunk],
+            columns=COPY_COLUMNS,
+        )
+        # No conflict target, so the primary key, URL and canonical URL constraints are all handled
+        result = await self.session.execute(text(
+            f"INSERT INTO content_piece ({columns}) SELECT {columns} FROM content_piece_staging "
+            f"ON CONFLICT DO NOTHING RETURNING id"
+        ))
+        inserted = list(result.scalars().all())
+        await self.session.commit()
+        return inserted
+
+    async def _stored_hashes(self, content_ids: List[str]) -> Dict[str, str]:
+        """Content hashes of the stored pieces among `content_ids`, by ID."""
+        statement = select(ContentPiece.id, ContentPiece.content_hash).where(ContentPiece.id.in_(content_ids))
+        hashes = dict((await self.session.execute(statement)).all())
+        # Pieces stored before content hashes were are hashed from their text, without writing the hash
+        unhashed = [content_id for content_id, content_hash in hashes.items() if content_hash is None]
+        if unhashed:
+            statement = select(ContentPiece.id, ContentPiece.title, ContentPiece.content).where(
+                ContentPiece.id.in_(unhashed)
+            )
+            for content_id, title, content in await self.session.execute(statement):
+                hashes[content_id] = ContentPiece.compute_hash(title, content)
+        return hashes
+
+    async def upsert(self, content_pieces: List[ContentPiece]) -> List[str]:
+        """
+        Insert new content pieces and update the stored ones whose title or content changed.
+
+        Whether a piece changed is decided by its content hash. Unchanged pieces cost a lookup: their
+        rows are neither written nor locked and the tsvector trigger doesn't run for them. A changed
+        piece's previous version is kept in content_revision, at most CONTENT_REVISIONS_KEPT per
+        piece, and the piece is marked unprocessed with its embedding cleared, so it is redone.
+
+        Returns:
+            The IDs of the pieces inserted or updated
+        """
+        if not content_pieces:
+            return []
+
+        fill_derived_fields(content_pieces)
+        stored = await self._stored_hashes([piece.id for piece in content_pieces])
+        new = [piece for piece in content_pieces if piece.id not in stored]
+        changed = [
+            piece for piece in content_pieces if piece.id in stored and stored[piece.id] != piece.content_hash
+        ]
+
+        written = []
+        if new:
+            if len(new) >= settings.BULK_LOAD_MIN_ROWS:
+                written += await self.bulk_load(new)
+            else:
+                written += await self.bulk_insert(new)
+        if changed:
+            written += await self._update_changed(changed)
+        return written
+
+    async def _update_changed(self, content_pieces: List[ContentPiece]) -> List[str]:
+        """Replace stored pieces with new versions, keeping the old ones as revisions. Returns their IDs."""
+        await fill_languages(content_pieces)
+        replaced_at = datetime.utcnow()
+        updated = []
+        for piece in content_pieces:
+            # Guarded by the hash, so a version stored concurrently isn't replaced or recorded twice
+            outdated = and_(
+                ContentPiece.id == piece.id, ContentPiece.content_hash.is_distinct_from(piece.content_hash)
+            )
+            await self.session.execute(
+                insert(ContentRevision).from_select(
+                    ["content_id", "title", "content", "content_hash", "replaced_at"],
+                    select(
+                        ContentPiece.id, ContentPiece.title, ContentPiece.content, ContentPiece.content_hash,
+                        literal(replaced_at),
+                    ).where(outdated),
+                )
+            )
+            result = await self.session.execute(
+                update(ContentPiece).where(outdated).values(
+                    title=piece.title,
+                    content=piece.content,
+                    content_hash=piece.content_hash,
+                    author=piece.author,
+                    published_at=piece.published_at,
+                    metainfo=piece.metainfo,
+                    simhash=piece.simhash,
+                    processed=False,
+                    embedding=None,
+                ).returning(ContentPiece.id)
+            )
+            updated.extend(result.scalars())
+
+        # Keep the latest revisions of every updated piece
+        ranked = select(
+            ContentRevision.id,
+            func.row_number().over(
+                partition_by=ContentRevision.content_id,
+                order_by=(ContentRevision.replaced_at.desc(), ContentRevision.id.desc()),
+            ).label("position"),
+        ).where(ContentRevision.content_id.in_(updated)).subquery()
+        await self.session.execute(
+            delete(ContentRevision).where(ContentRevision.id.in_(
+                select(ranked.c.id).where(ranked.c.position > settings.CONTENT_REVISIONS_KEPT)
+            ))
+        )
+        await self.session.commit()
+        return updated
+
+    async def get_revisions(self, content_id: str) -> List[ContentRevision]:
+        """Get the earlier versions of a content piece, most recently replaced first."""
+        statement = select(ContentRevision).where(
+            ContentRevision.content_id == content_id
+        ).order_by(ContentRevision.replaced_at.desc(), ContentRevision.id.desc())
+        return list(await self.session.exec(statement))
+
+    async def get_latest_content_for_source(self, source_id: str, limit: int = 1) -> List[ContentPiece]:
+        """Get the most recent content pieces for a source."""
+        statement = select(ContentPiece).where(
+            ContentPiece.source_id == source_id
+        ).order_by(text('retrieved_at DESC')).limit(limit)
+
+        return list(await self.session.exec(statement))
+
+    async def get_recent_ids(self, source_id: str, limit: int) -> List[str]:
+        """Get the IDs of the most recently retrieved content pieces of a source, newest first."""
+        statement = select(ContentPiece.id).where(
+            ContentPiece.source_id == source_id
+        ).order_by(ContentPiece.retrieved_at.desc()).limit(limit)
+        return list(await self.session.exec(statement))
+
+    async def get_recent_fingerprints(self, limit: int) -> List[tuple]:
+        """Get (id, simhash) of the latest retrieved pieces that are not near-duplicates, newest first."""
+        statement = select(ContentPiece.id, ContentPiece.simhash).where(
+            ContentPiece.simhash.is_not(None), ContentPiece.duplicate_of.is_(None)
+        ).order_by(ContentPiece.retrieved_at.desc()).limit(limit)
+        return [tuple(row) for row in await self.session.exec(statement)]
+
+    async def get_all_paged(self, page: int = 1, page_size: int = 10) -> List[ContentPiece]:
+        """Get all content pieces paged."""
+        statement = (
+            select(ContentPiece)
+            .order_by(text('retrieved_at DESC'))
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+        )
+        return list(await self.session.exec(statement))
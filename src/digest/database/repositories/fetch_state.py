@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digest.database.models.source import SourceFetchState
+
+
+class FetchStateRepository:
+    """Repository for managing per-source fetch state in the database."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get(self, source_id: str) -> Optional[SourceFetchState]:
+        """Get the fetch state of a source."""
+        return self.session.get(SourceFetchState, source_id)
+
+    def get_or_create(self, source_id: str) -> SourceFetchState:
+        """Get the fetch state of a source, or a new empty one if it was never fetched."""
+        return self.get(source_id) or SourceFetchState(source_id=source_id)
+
+    def save(self, state: SourceFetchState) -> SourceFetchState:
+        """Insert or update the fetch state of a source."""
+        state.updated_at = datetime.utcnow()
+        state = self.session.merge(state)
+        self.session.commit()
+        return state
+
+
+class AsyncFetchStateRepository:
+    """Async counterpart of FetchStateRepository, for use from the event loop."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get(self, source_id: str) -> Optional[SourceFetchState]:
+        """Get the fetch state of a source."""
+        return await self.session.get(SourceFetchState, source_id)
+
+    async def get_or_create(self, source_id: str) -> SourceFetchState:
+        """Get the fetch state of a source, or a new empty one if it was never fetched."""
+        return await self.get(source_id) or SourceFetchState(source_id=source_id)
+
+    async def save(self, state: SourceFetchState) -> SourceFetchState:
+        """Insert or update the fetch state of a source."""
+        state.updated_at = datetime.utcnow()
+        state = await self.session.merge(state)
+        await self.session.commit()
+        return state
@@ -0,0 +1,105 @@
+from typing import List, Optional
+
+from sqlalchemy import case, exists, func, literal_column, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digest.database.models.source import Source, SourceLease
+
+# Lease times are taken from the database clock, so workers on different nodes agree on them
+utc_now = func.timezone(literal_column("'UTC'"), func.now())
+one_second = literal_column("interval '1 second'")
+
+
+class LeaseRepository:
+    """Repository for the source leases that ingest workers claim in distributed mode."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get(self, source_id: str) -> Optional[SourceLease]:
+        """Get the lease row of a source."""
+        return await self.session.get(SourceLease, source_id)
+
+    async def ensure_all(self) -> None:
+        """Create lease rows for sources without one, due one update interval after their last retrieval."""
+        first_due = Source.last_retrieved + Source.update_frequency * one_second
+        has_lease = exists().where(SourceLease.source_id == Source.id)
+        stmt = insert(SourceLease).from_select(
+            ["source_id", "next_fetch_at"],
+            select(Source.id, first_due).where(~has_lease),
+        ).on_conflict_do_nothing(index_elements=["source_id"])
+        await self.session.execute(stmt)
+        await self.session.commit()
+
+    async def claim(self, owner: str, limit: int, lease_seconds: float) -> List[str]:
+        """
+        Lease up to `limit` due sources to `owner`.
+
+        Rows locked by a concurrent claim are skipped rather than waited for, so workers never
+        block each other or claim the same source. Expired leases count as free, disabled sources
+        are never claimed. A claimed source is due again when its lease expires, so `mark_due`
+        during the fetch is told apart from the due time the claim replaced.
+
+        Returns:
+            IDs of the claimed sources, most overdue first
+        """
+        due = (
+            select(SourceLease.source_id, SourceLease.next_fetch_at)
+            .join(Source, Source.id == SourceLease.source_id)
+            .where(Source.enabled.is_(True))
+            .where(or_(SourceLease.next_fetch_at.is_(None), SourceLease.next_fetch_at <= utc_now))
+            .where(or_(SourceLease.expires_at.is_(None), SourceLease.expires_at < utc_now))
+            .order_by(SourceLease.next_fetch_at.asc().nulls_first())
+            .limit(limit)
+            .with_for_update(of=SourceLease, skip_locked=True)
+            .cte("due")
+        )
+        expires_at = utc_now + one_second * lease_seconds
+        stmt = (
+            update(SourceLease)
+            .where(SourceLease.source_id == due.c.source_id)
+            .values(owner=owner, expires_at=expires_at, next_fetch_at=expires_at)
+            .returning(SourceLease.source_id, due.c.next_fetch_at)
+        )
+        rows = (await self.session.execute(stmt)).all()
+        await self.session.commit()
+        rows.sort(key=lambda row: (row.next_fetch_at is not None, row.next_fetch_at))
+        return [row.source_id for row in rows]
+
+    async def release(
+        self, source_id: str, owner: str, next_fetch_in: float, consecutive_failures: int
+    ) -> bool:
+        """
+        Give a source back, due again in `next_fetch_in` seconds, or right away if `mark_due` was
+        called while it was leased.
+
+        Returns:
+            False if the lease expired and another worker claimed the source in the meantime
+        """
+        # Claims set a due time, so None can only come from mark_due during the fetch
+        next_fetch_at = case(
+            (SourceLease.next_fetch_at.is_(None), None),
+            else_=utc_now + one_second * next_fetch_in,
+        )
+        stmt = (
+            update(SourceLease)
+            .where(SourceLease.source_id == source_id, SourceLease.owner == owner)
+            .values(
+                owner=None,
+                expires_at=None,
+                next_fetch_at=next_fetch_at,
+                consecutive_failures=consecutive_failures,
+            )
+        )
+        result = await self.session.execute(stmt)
+        await self.session.commit()
+        return result.rowcount > 0
+
+    async def mark_due(self, source_id: str) -> None:
+        """Make a source due now, so the next claim picks it up."""
+        stmt = insert(SourceLease).values(source_id=source_id, next_fetch_at=None)
+        stmt = stmt.on_conflict_do_update(index_elements=["source_id"], set_={"next_fetch_at": None})
+        await self.session.execute(stmt)
+        await self.session.commit()
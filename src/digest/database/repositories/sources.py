@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from digest.database.models.source import Source
 from digest.database.enums import SourceType
@@ -35,7 +36,7 @@ class SourceRepository:
 
     def get_enabled(self) -> List[Source]:
         """Get all enabled sources."""
-        statement = select(Source).where(Source.enabled == True)
+        statement = select(Source).where(Source.enabled.is_(True))
         return list(self.session.exec(statement))
 
     def get_all(self) -> List[Source]:
@@ -70,3 +71,69 @@ class SourceRepository:
         self.session.add(source)
         self.session.commit()
         return True
+
+
+class AsyncSourceRepository:
+    """Async counterpart of SourceRepository, for use from the event loop."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, source: Source) -> Source:
+        """Create a new source."""
+        self.session.add(source)
+        await self.session.commit()
+        await self.session.refresh(source)
+        return source
+
+    async def get_by_id(self, source_id: str) -> Optional[Source]:
+        """Get a source by ID."""
+        return await self.session.get(Source, source_id)
+
+    async def get_by_name(self, name: str) -> Optional[Source]:
+        """Get a source by name."""
+        statement = select(Source).where(Source.name == name)
+        return (await self.session.exec(statement)).first()
+
+    async def get_by_type(self, source_type: SourceType) -> List[Source]:
+        """Get sources by type."""
+        statement = select(Source).where(Source.source_type == source_type)
+        return list(await self.session.exec(statement))
+
+    async def get_enabled(self) -> List[Source]:
+        """Get all enabled sources."""
+        statement = select(Source).where(Source.enabled.is_(True))
+        return list(await self.session.exec(statement))
+
+    async def get_all(self) -> List[Source]:
+        """Get all sources."""
+        statement = select(Source)
+        return list(await self.session.exec(statement))
+
+    async def update(self, source: Source) -> Source:
+        """Update a source."""
+        self.session.add(source)
+        await self.session.commit()
+        await self.session.refresh(source)
+        return source
+
+    async def delete(self, source_id: str) -> bool:
+        """Delete a source."""
+        source = await self.get_by_id(source_id)
+        if not source:
+            return False
+
+        await self.session.delete(source)
+        await self.session.commit()
+        return True
+
+    async def update_last_retrieved(self, source_id: str) -> bool:
+        """Update the last_retrieved timestamp of a source."""
+        source = await self.get_by_id(source_id)
+        if not source:
+            return False
+
+        source.last_retrieved = datetime.utcnow()
+        self.session.add(source)
+        await self.session.commit()
+        return True
@@ -1,6 +1,7 @@
 from typing import List, Optional
 from uuid import UUID
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from digest.database.models.relationships import TrustedSource
 
@@ -57,3 +58,57 @@ class SubscriptionRepository:
         self.session.delete(subscription)
         self.session.commit()
         return True
+
+
+class AsyncSubscriptionRepository:
+    """Async counterpart of SubscriptionRepository, for use from the event loop."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, user_id: UUID, source_id: str) -> TrustedSource:
+        """Create a new subscription."""
+        subscription = TrustedSource(user_id=user_id, source_id=source_id)
+        self.session.add(subscription)
+        await self.session.commit()
+        await self.session.refresh(subscription)
+        return subscription
+
+    async def get(self, user_id: UUID, source_id: UUID) -> Optional[TrustedSource]:
+        """Get a specific subscription."""
+        statement = select(TrustedSource).where(
+            TrustedSource.user_id == user_id,
+            TrustedSource.source_id == source_id
+        )
+        return (await self.session.exec(statement)).first()
+
+    async def get_user_subscriptions(self, user_id: UUID) -> List[TrustedSource]:
+        """Get all subscriptions for a user."""
+        statement = select(TrustedSource).where(
+            TrustedSource.user_id == user_id
+        )
+        return list(await self.session.exec(statement))
+
+    async def get_source_subscribers(self, source_id: UUID) -> List[TrustedSource]:
+        """Get all subscriptions for a source."""
+        statement = select(TrustedSource).where(
+            TrustedSource.source_id == source_id
+        )
+        return list(await self.session.exec(statement))
+
+    async def update(self, subscription: TrustedSource) -> TrustedSource:
+        """Update a subscription."""
+        self.session.add(subscription)
+        await self.session.commit()
+        await self.session.refresh(subscription)
+        return subscription
+
+    async def delete(self, user_id: UUID, source_id: UUID) -> bool:
+        """Delete a subscription."""
+        subscription = await self.get(user_id, source_id)
+        if not subscription:
+            return False
+
+        await self.session.delete(subscription)
+        await self.session.commit()
+        return True
@@ -1,6 +1,11 @@
 from digest.config.settings import settings
-from typing import Generator
+from typing import AsyncGenerator, Generator
+from pgvector.asyncpg import register_vector
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine, text
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pathlib import Path
 
 # Create engine
@@ -8,6 +13,32 @@ engine = create_engine(
     settings.DATABASE_URL,
 )
 
+
+def get_async_database_url(url: str) -> str:
+    """Point a PostgreSQL URL at the asyncpg driver, whichever driver it names."""
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+# Async engine for the API and the fetch loop, so queries don't block the event loop
+async_engine = create_async_engine(
+    get_async_database_url(settings.DATABASE_URL),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _register_vector_type(dbapi_connection, connection_record):
+    """asyncpg needs a codec for the pgvector column type on every new connection."""
+    dbapi_connection.run_async(register_vector)
+
+
+# Objects stay usable after commit, since async sessions can't lazily reload expired attributes
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 def create_db_and_tables() -> None:
     """Create database and tables."""
     SQLModel.metadata.create_all(engine)
@@ -20,5 +51,8 @@ def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
-def get_long_session() -> Session:
-    return Session(engine)
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """Get async database session."""
+    async with async_session_maker() as session:
+        yield session
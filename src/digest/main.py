@@ -6,16 +6,23 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from digest.config.settings import settings
 from digest.api.router import api_router
-from digest.database.session import create_db_and_tables
+from digest.database.session import async_engine, create_db_and_tables
 from digest.prepare import prepare
+from digest.retrieval.http import close_http_client
+from digest.retrieval.parse_pool import close_parse_pool
 from digest.retrieval.task_manager import task_manager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    task_manager.start_all_parsers()
+    # In distributed mode, ingest workers poll the sources and the API only serves them
+    if settings.INGEST_MODE == "local":
+        await task_manager.start_all_parsers()
     yield
     await task_manager.stop_all_parsers()
+    await close_http_client()
+    close_parse_pool()
+    await async_engine.dispose()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -0,0 +1,130 @@
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
+
+from digest.config.settings import settings
+
+
+def backoff_delay(
+    failures: int,
+    base_delay: float = settings.BACKOFF_BASE_DELAY,
+    max_delay: float = settings.BACKOFF_MAX_DELAY,
+) -> float:
+    """
+    Delay before retrying after `failures` consecutive failures.
+
+    The delay doubles with every failure up to `max_delay`, and a random jitter of up to half of it
+    keeps sources that failed together from retrying together.
+    """
+    delay = min(max_delay, base_delay * 2 ** max(failures - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class BreakerState(str, Enum):
+    """States of a circuit breaker."""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class BreakerStatus:
+    """Snapshot of a circuit breaker, as reported by the API."""
+    host: str
+    state: BreakerState
+    failures: int
+    opened_at: Optional[datetime]
+    retry_in: float
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guarding a single host.
+
+    After `failure_threshold` consecutive failures the breaker opens and no fetches are allowed for
+    `reset_timeout` seconds. Then it is half-open: one probe fetch is let through, and its outcome
+    either closes the breaker or opens it again.
+    """
+
+    # How long other sources wait while the half-open probe is running
+    PROBE_WAIT = 30
+
+    def __init__(
+        self,
+        host: str,
+        failure_threshold: int = settings.BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = settings.BREAKER_RESET_TIMEOUT,
+    ):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[datetime] = None
+        self._opened_at_monotonic = 0.0
+
+    def allow(self) -> bool:
+        """Whether a fetch from this host may start now."""
+        if self.state == BreakerState.CLOSED:
+            return True
+        # A half-open probe that never reported back is replaced after another reset timeout
+        if self._open_for() >= self.reset_timeout:
+            self.state = BreakerState.HALF_OPEN
+            self._opened_at_monotonic = time.monotonic()
+            return True
+        return False
+
+    def retry_in(self) -> float:
+        """Seconds until a rejected fetch should try again."""
+        if self.state == BreakerState.OPEN:
+            return max(0.0, self.reset_timeout - self._open_for())
+        if self.state == BreakerState.HALF_OPEN:
+            return min(self.PROBE_WAIT, self.reset_timeout)
+        return 0.0
+
+    def record_success(self) -> None:
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == BreakerState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = BreakerState.OPEN
+            self.opened_at = datetime.utcnow()
+            self._opened_at_monotonic = time.monotonic()
+
+    def status(self) -> BreakerStatus:
+        return BreakerStatus(
+            host=self.host,
+            state=self.state,
+            failures=self.failures,
+            opened_at=self.opened_at,
+            retry_in=self.retry_in(),
+        )
+
+    def _open_for(self) -> float:
+        return time.monotonic() - self._opened_at_monotonic
+
+
+class CircuitBreakers:
+    """Circuit breakers by host, created on first use."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(host)
+        return self._breakers[host]
+
+    def list(self, tripped_only: bool = False) -> List[BreakerStatus]:
+        """Status of all breakers, or only of those that are not closed."""
+        return [
+            breaker.status()
+            for breaker in self._breakers.values()
+            if not tripped_only or breaker.state != BreakerState.CLOSED
+        ]
@@ -0,0 +1,124 @@
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from digest.config.settings import settings
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3  # words per shingle
+
+_MASK = (1 << FINGERPRINT_BITS) - 1
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+")
+
+
+def _feature(shingle: str) -> str:
+    """Hash of a shingle as a string of bits, so the bits of many shingles can be counted column by column."""
+    return format(int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big"), "064b")
+
+
+def simhash(text: str, min_words: int = settings.NEAR_DUP_MIN_WORDS) -> Optional[int]:
+    """
+    64-bit SimHash of a text's word shingles, as a signed integer so it fits a Postgres BIGINT.
+
+    Texts that differ in a few words get fingerprints that differ in a few bits. Markup is ignored,
+    so the same story wrapped in different HTML by different feeds gets the same fingerprint.
+
+    Returns:
+        The fingerprint, or None if the text has fewer than `min_words` words: short texts share too
+        many shingles by chance for their fingerprints to mean anything
+    """
+    words = _WORD_RE.findall(_TAG_RE.sub(" ", text).lower())
+    if len(words) < max(min_words, SHINGLE_SIZE):
+        return None
+    features = [_feature(" ".join(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    fingerprint = 0
+    for column in zip(*features):
+        # A bit is set when most shingles have it set
+        fingerprint = fingerprint << 1 | (2 * column.count("1") > len(features))
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint >> (FINGERPRINT_BITS - 1) else fingerprint
+
+
+def simhashes(texts: List[str]) -> List[Optional[int]]:
+    """Fingerprints of a batch of texts, for running off the event loop."""
+    return [simhash(text) for text in texts]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return ((a ^ b) & _MASK).bit_count()
+
+
+class NearDuplicateIndex:
+    """
+    In-memory index of content fingerprints for finding near-duplicates.
+
+    A fingerprint is split into `max_distance + 1` bands: two fingerprints that differ in at most
+    `max_distance` bits must agree on at least one whole band, so only the pieces sharing a band
+    with the query are compared bit by bit. The index remembers the `capacity` most recently added
+    pieces; the fingerprints themselves are stored with the content, so it is rebuilt from the
+    database after a restart.
+    """
+
+    def __init__(
+        self,
+        max_distance: int = settings.NEAR_DUP_MAX_DISTANCE,
+        capacity: int = settings.NEAR_DUP_INDEX_SIZE,
+    ):
+        self.max_distance = max_distance
+        self.capacity = capacity
+        self.loaded = False
+        bands = max_distance + 1
+        # Band boundaries, as (shift, mask); the last band takes the remaining bits
+        width = FINGERPRINT_BITS // bands
+        self._bands = [
+            (i * width, (1 << (width if i < bands - 1 else FINGERPRINT_BITS - i * width)) - 1)
+            for i in range(bands)
+        ]
+        self._fingerprints: "OrderedDict[str, int]" = OrderedDict()
+        self._buckets: List[Dict[int, Set[str]]] = [{} for _ in self._bands]
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        return [fingerprint >> shift & mask for shift, mask in self._bands]
+
+    def add(self, content_id: str, fingerprint: int) -> None:
+        """Index a stored piece, evicting the oldest beyond capacity."""
+        if content_id in self._fingerprints:
+            return
+        self._fingerprints[content_id] = fingerprint
+        for buckets, key in zip(self._buckets, self._band_keys(fingerprint)):
+            buckets.setdefault(key, set()).add(content_id)
+        while len(self._fingerprints) > self.capacity:
+            self._remove(*self._fingerprints.popitem(last=False))
+
+    def load(self, fingerprints: Iterable[Tuple[str, int]]) -> None:
+        """Index stored pieces, oldest first."""
+        for content_id, fingerprint in fingerprints:
+            self.add(content_id, fingerprint)
+        self.loaded = True
+
+    def _remove(self, content_id: str, fingerprint: int) -> None:
+        for buckets, key in zip(self._buckets, self._band_keys(fingerprint)):
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(content_id)
+                if not bucket:
+                    del buckets[key]
+
+    def find(self, fingerprint: int, exclude: Optional[str] = None) -> Optional[str]:
+        """ID of the closest indexed piece within max_distance bits, None if there is none."""
+        candidates: Set[str] = set()
+        for buckets, key in zip(self._buckets, self._band_keys(fingerprint)):
+            candidates.update(buckets.get(key, ()))
+        candidates.discard(exclude)
+
+        matches = [
+            (hamming_distance(fingerprint, self._fingerprints[content_id]), content_id)
+            for content_id in candidates
+        ]
+        # Ties go to the smallest ID, so every process links a piece to the same canonical one
+        best = min((match for match in matches if match[0] <= self.max_distance), default=None)
+        return best[1] if best else None
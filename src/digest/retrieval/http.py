@@ -0,0 +1,353 @@
+import asyncio
+import ipaddress
+import socket
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+
+from digest.config.settings import settings
+
+
+class ResponseTooLarge(Exception):
+    """Raised when a response body grows past the size limit of the download."""
+
+    def __init__(self, url: str, max_bytes: int, status_code: int):
+        super().__init__(f"Response from {url} is larger than {max_bytes} bytes")
+        self.url = url
+        self.max_bytes = max_bytes
+        self.status_code = status_code
+
+
+@dataclass
+class Download:
+    """A response whose body was read within a size limit."""
+    status_code: int
+    headers: httpx.Headers
+    content: bytes  # decoded body
+    bytes_downloaded: int  # bytes received over the wire, before decompression
+
+
+class CachingResolverBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that shares DNS lookups between connections.
+
+    Resolved addresses are cached per (host, port) for `ttl` seconds and concurrent lookups of the
+    same host are coalesced. TLS still uses the original host name for SNI and certificate checks,
+    since httpcore passes it to `start_tls` separately.
+    """
+
+    def __init__(self, ttl: float = 300, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.ttl = ttl
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._lookups: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """Return the addresses of `host`, from the cache when possible."""
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        if key in self._lookups:
+            return await asyncio.shield(self._lookups[key])
+
+        lookup = asyncio.get_running_loop().create_future()
+        self._lookups[key] = lookup
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            self._cache[key] = (time.monotonic() + self.ttl, addresses)
+            lookup.set_result(addresses)
+            return addresses
+        except asyncio.CancelledError:
+            lookup.cancel()
+            raise
+        except Exception as e:
+            lookup.set_exception(e)
+            # Mark the exception as retrieved in case no concurrent lookup is waiting for it
+            lookup.exception()
+            raise
+        finally:
+            del self._lookups[key]
+
+    def invalidate(self, host: str, port: int) -> None:
+        self._cache.pop((host, port), None)
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await self.resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        # None of the cached addresses work anymore, look the host up again next time
+        self.invalidate(host, port)
+        raise error or httpcore.ConnectError(f"No addresses found for {host}")
+
+    async def connect_unix_socket(
+        self,
+        path: str,
+        timeout: Optional[float] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+# httpcore errors and the httpx errors they are raised as, so callers only have to handle httpx's
+_HTTPCORE_ERRORS = {
+    httpcore.TimeoutException: httpx.TimeoutException,
+    httpcore.ConnectTimeout: httpx.ConnectTimeout,
+    httpcore.ReadTimeout: httpx.ReadTimeout,
+    httpcore.WriteTimeout: httpx.WriteTimeout,
+    httpcore.PoolTimeout: httpx.PoolTimeout,
+    httpcore.NetworkError: httpx.NetworkError,
+    httpcore.ConnectError: httpx.ConnectError,
+    httpcore.ReadError: httpx.ReadError,
+    httpcore.WriteError: httpx.WriteError,
+    httpcore.ProxyError: httpx.ProxyError,
+    httpcore.UnsupportedProtocol: httpx.UnsupportedProtocol,
+    httpcore.ProtocolError: httpx.ProtocolError,
+    httpcore.LocalProtocolError: httpx.LocalProtocolError,
+    httpcore.RemoteProtocolError: httpx.RemoteProtocolError,
+}
+
+
+def _as_httpx_error(error: Exception) -> Exception:
+    """The most specific httpx error for an httpcore one; other errors are returned unchanged."""
+    for cls in type(error).__mro__:
+        if cls in _HTTPCORE_ERRORS:
+            mapped = _HTTPCORE_ERRORS[cls](str(error))
+            mapped.__cause__ = error
+            return mapped
+    return error
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: AsyncIterable[bytes]):
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except Exception as e:
+            raise _as_httpx_error(e)
+
+    async def aclose(self) -> None:
+        if hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport on an `httpcore.AsyncConnectionPool` that we configure ourselves.
+
+    `httpx.AsyncHTTPTransport` builds its pool internally and has no option for the network backend,
+    which is what the DNS cache plugs into; this transport takes the backend as a constructor argument.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = settings.HTTP_MAX_CONNECTIONS,
+        keepalive_expiry: float = settings.HTTP_KEEPALIVE_EXPIRY,
+        http2: bool = settings.HTTP_HTTP2,
+        network_backend: Optional[httpcore.AsyncNetworkBackend] = None,
+    ):
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=network_backend,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        try:
+            response = await self._pool.handle_async_request(core_request)
+        except Exception as e:
+            raise _as_httpx_error(e)
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_ResponseStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._pool.aclose()
+
+
+@dataclass
+class _HostLimit:
+    semaphore: asyncio.Semaphore
+    users: int = 0  # requests holding or waiting for the semaphore
+
+
+class HttpClient:
+    """
+    Async HTTP client shared by all parsers.
+
+    Wraps a single `httpx.AsyncClient`, so connections are pooled and kept alive across fetches,
+    HTTP/2 is negotiated where the server supports it, DNS lookups are cached and the number of
+    concurrent requests to one host is capped.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = settings.HTTP_MAX_CONNECTIONS,
+        max_connections_per_host: int = settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+        keepalive_expiry: float = settings.HTTP_KEEPALIVE_EXPIRY,
+        http2: bool = settings.HTTP_HTTP2,
+        dns_cache_ttl: float = settings.HTTP_DNS_CACHE_TTL,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            max_connections: Maximum number of open connections across all hosts
+            max_connections_per_host: Maximum number of concurrent requests to a single host
+            keepalive_expiry: Seconds an idle connection is kept open for reuse
+            http2: Whether to negotiate HTTP/2
+            dns_cache_ttl: Seconds a DNS lookup is reused
+            transport: Custom transport, mostly useful for tests
+        """
+        if transport is None:
+            transport = PooledTransport(
+                max_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+                http2=http2,
+                network_backend=CachingResolverBackend(dns_cache_ttl),
+            )
+
+        self._client = httpx.AsyncClient(transport=transport, follow_redirects=True)
+        self.max_connections_per_host = max_connections_per_host
+        # Only hosts with requests in flight have an entry, so fetching many hosts doesn't grow it
+        self._host_limits: Dict[str, _HostLimit] = {}
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str) -> AsyncIterator[None]:
+        host = urlsplit(url).netloc.lower()
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = _HostLimit(asyncio.Semaphore(self.max_connections_per_host))
+        limit.users += 1
+        try:
+            async with limit.semaphore:
+                yield
+        finally:
+            limit.users -= 1
+            if limit.users == 0:
+                del self._host_limits[host]
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a request and read the whole response body."""
+        async with self._host_slot(url):
+            return await self._client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("HEAD", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Send a request and yield the response before its body is read."""
+        async with self._host_slot(url):
+            async with self._client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def download(self, url: str, max_bytes: Optional[int] = None, **kwargs: Any) -> Download:
+        """
+        GET a URL and read its body, giving up as soon as it grows past `max_bytes`.
+
+        The body is negotiated compressed (gzip, deflate or brotli) and the limit applies to it after
+        decompression, so a small compressed response can't inflate past it either.
+
+        Raises:
+            ResponseTooLarge: The body is larger than `max_bytes`
+        """
+        async with self.stream("GET", url, **kwargs) as response:
+            # Don't start downloading an uncompressed body that is announced too large
+            length = response.headers.get("Content-Length", "")
+            if max_bytes is not None and "Content-Encoding" not in response.headers:
+                if length.isdigit() and int(length) > max_bytes:
+                    raise ResponseTooLarge(url, max_bytes, response.status_code)
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    # Leaving the block closes the response, the rest of the body is never downloaded
+                    raise ResponseTooLarge(url, max_bytes, response.status_code)
+                chunks.append(chunk)
+            return Download(
+                status_code=response.status_code,
+                headers=response.headers,
+                content=b"".join(chunks),
+                bytes_downloaded=response.num_bytes_downloaded,
+            )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_http_client: Optional[HttpClient] = None
+
+
+def get_http_client() -> HttpClient:
+    """Get the process-wide HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None:
+        _http_client = HttpClient()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the process-wide HTTP client and its pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
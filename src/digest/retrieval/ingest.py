@@ -0,0 +1,185 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from digest.config.settings import settings
+from digest.database.models.content import ContentPiece
+from digest.database.repositories.content import PartialInsertError
+
+# Stores content pieces in one transaction and returns the IDs of those actually inserted
+ContentStore = Callable[[List[ContentPiece]], Awaitable[List[str]]]
+
+
+@dataclass
+class _Submission:
+    pieces: List[ContentPiece]
+    future: asyncio.Future
+    submitted_at: float  # event loop time
+
+
+class IngestBuffer:
+    """
+    Write-behind buffer that stores the content of many fetches in a few transactions.
+
+    Fetches submit their pieces and wait for the flush that stores them. A flush starts when
+    `max_rows` pieces are waiting or the oldest of them has waited `max_delay` seconds, and stores
+    everything waiting in a single call to `store`, so a thousand fetches of two new items each cost
+    a handful of commits instead of a thousand. If a combined flush fails, its submissions are
+    retried one by one, so a bad batch only fails the fetch it came from. Pieces a store committed
+    before failing (see PartialInsertError) are still reported as inserted by the retries.
+
+    At most `capacity` pieces are buffered or being flushed; further submissions wait for room,
+    which slows fetching down to the speed the database accepts writes at. A single submission larger
+    than `capacity` is let in once the buffer is empty. Submitted pieces are stored even if the
+    submitter is cancelled in the meantime.
+    """
+
+    def __init__(
+        self,
+        store: ContentStore,
+        max_rows: int = settings.INGEST_BUFFER_ROWS,
+        max_delay: float = settings.INGEST_BUFFER_DELAY,
+        capacity: int = settings.INGEST_BUFFER_CAPACITY,
+    ):
+        """
+        Initialize the buffer.
+
+        Args:
+            store: Stores a batch of pieces in one transaction, returning the IDs it inserted
+            max_rows: Pieces that trigger a flush without waiting for `max_delay`
+            max_delay: Seconds the oldest waiting piece is held back for more to join its flush
+            capacity: Pieces buffered or being flushed before submissions have to wait
+        """
+        self.store = store
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.capacity = capacity
+        self._pending: List[_Submission] = []
+        self._pending_rows = 0
+        self._rows = 0  # pending and being flushed
+        self._room = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._draining = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def buffered(self) -> int:
+        """Pieces waiting for or in a flush."""
+        return self._rows
+
+    async def submit(self, pieces: List[ContentPiece]) -> List[str]:
+        """
+        Buffer pieces for storage and wait until they are stored.
+
+        Returns:
+            The IDs of the pieces that were inserted, in order
+        """
+        if not pieces:
+            return []
+        async with self._room:
+            await self._room.wait_for(lambda: self._rows == 0 or self._rows + len(pieces) <= self.capacity)
+            self._rows += len(pieces)
+
+        loop = asyncio.get_running_loop()
+        submission = _Submission(pieces, loop.create_future(), loop.time())
+        self._pending.append(submission)
+        self._pending_rows += len(pieces)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        # The flush goes ahead if the caller is cancelled, the pieces are in the batch already
+        return await asyncio.shield(submission.future)
+
+    async def close(self) -> None:
+        """Flush everything buffered, without waiting for more, and stop the flush task."""
+        if self._task is None:
+            return
+        self._draining = True
+        self._wakeup.set()
+        try:
+            async with self._room:
+                await self._room.wait_for(lambda: self._rows == 0)
+        finally:
+            self._draining = False
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            # Let other fetches join the batch until it is full or its oldest pieces waited long enough
+            while self._pending and self._pending_rows < self.max_rows and not self._draining:
+                remaining = self._pending[0].submitted_at + self.max_delay - loop.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            self._wakeup.clear()
+
+            batch = self._take()
+            if not batch:
+                # Woken by close() with nothing waiting
+                continue
+            try:
+                await self._flush(batch)
+            finally:
+                async with self._room:
+                    self._rows -= sum(len(submission.pieces) for submission in batch)
+                    self._room.notify_all()
+            if self._pending:
+                self._wakeup.set()
+
+    def _take(self) -> List[_Submission]:
+        """Remove waiting submissions from the front, up to max_rows pieces but at least one submission."""
+        batch, rows = [], 0
+        while self._pending and (not batch or rows + len(self._pending[0].pieces) <= self.max_rows):
+            submission = self._pending.pop(0)
+            batch.append(submission)
+            rows += len(submission.pieces)
+        self._pending_rows -= rows
+        return batch
+
+    async def _flush(self, batch: List[_Submission]) -> None:
+        try:
+            inserted = set(await self.store([piece for submission in batch for piece in submission.pieces]))
+        except Exception as e:
+            # Committed before the failure, so the retries skip them as duplicates
+            committed = set(e.inserted) if isinstance(e, PartialInsertError) else set()
+            if len(batch) == 1 and not committed:
+                self._fail(batch[0], e)
+                return
+            for submission in batch:
+                try:
+                    inserted = set(await self.store(submission.pieces)) | committed
+                except Exception as e:
+                    self._fail(submission, e)
+                    continue
+                committed.difference_update(self._resolve(submission, inserted))
+            return
+        for submission in batch:
+            self._resolve(submission, inserted)
+
+    @staticmethod
+    def _resolve(submission: _Submission, inserted: set) -> List[str]:
+        """Hand a submission the IDs of its pieces in `inserted`, removing them from it, and return them."""
+        new_ids = []
+        for piece in submission.pieces:
+            # Credit a row to the first submission that had it, if several in the batch did
+            if piece.id in inserted:
+                inserted.discard(piece.id)
+                new_ids.append(piece.id)
+        if not submission.future.done():
+            submission.future.set_result(new_ids)
+        return new_ids
+
+    @staticmethod
+    def _fail(submission: _Submission, error: Exception) -> None:
+        if not submission.future.done():
+            submission.future.set_exception(error)
+            # Mark the exception as retrieved in case the submitter was cancelled and nobody awaits it
+            submission.future.exception()
@@ -0,0 +1,120 @@
+import asyncio
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Deque, Dict, List, Optional
+from uuid import uuid4
+
+from digest.config.settings import settings
+
+
+class FetchJobStatus(str, Enum):
+    """Lifecycle states of a fetch job."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class FetchTrigger(str, Enum):
+    """What started a fetch job."""
+    SCHEDULED = "scheduled"
+    MANUAL = "manual"
+
+
+@dataclass
+class FetchJob:
+    """A single fetch of a source, with its outcome and timings (seconds)."""
+    id: str
+    source_id: str
+    trigger: FetchTrigger
+    status: FetchJobStatus = FetchJobStatus.QUEUED
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    fetch_time: Optional[float] = None  # whole parser fetch, HTTP and parsing
+    http_time: Optional[float] = None  # None when the parser doesn't report it separately
+    parse_time: Optional[float] = None
+    insert_time: Optional[float] = None
+    items: Optional[int] = None
+    new_items: Optional[int] = None
+    duplicates: Optional[int] = None  # fetched items linked to stored content they nearly duplicate
+    unchanged: Optional[str] = None  # set when the source had nothing new to parse, see FetchStats.unchanged
+    bytes_downloaded: Optional[int] = None
+    error: Optional[str] = None
+    host_failure: bool = False  # the parser's fetch failed in a way that counts against the host
+
+    @property
+    def active(self) -> bool:
+        return self.status in (FetchJobStatus.QUEUED, FetchJobStatus.RUNNING)
+
+
+class FetchJobRegistry:
+    """
+    In-memory record of recent fetch jobs.
+
+    Keeps the last `history` jobs of every source. At most one job per source is active at a time:
+    callers look up `active` before creating a new one and wait for it instead.
+    """
+
+    def __init__(self, history: int = settings.FETCH_JOB_HISTORY):
+        self.history = history
+        self._jobs: Dict[str, FetchJob] = {}
+        self._by_source: Dict[str, Deque[str]] = defaultdict(deque)
+        self._futures: Dict[str, asyncio.Future] = {}
+
+    def create(self, source_id: str, trigger: FetchTrigger) -> FetchJob:
+        """Register a new queued job. Must be called from a running event loop."""
+        job = FetchJob(id=str(uuid4()), source_id=source_id, trigger=trigger, created_at=datetime.utcnow())
+        self._jobs[job.id] = job
+        self._futures[job.id] = asyncio.get_running_loop().create_future()
+
+        job_ids = self._by_source[source_id]
+        job_ids.append(job.id)
+        while len(job_ids) > self.history:
+            evicted = job_ids.popleft()
+            self._jobs.pop(evicted, None)
+            self._futures.pop(evicted, None)
+        return job
+
+    def get(self, job_id: str) -> Optional[FetchJob]:
+        return self._jobs.get(job_id)
+
+    def for_source(self, source_id: str) -> List[FetchJob]:
+        """Recent jobs of a source, newest first."""
+        job_ids = reversed(self._by_source.get(source_id, ()))
+        return [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs]
+
+    def active(self, source_id: str) -> Optional[FetchJob]:
+        """The queued or running job of a source, if any."""
+        job_ids = self._by_source.get(source_id)
+        job = self._jobs.get(job_ids[-1]) if job_ids else None
+        return job if job and job.active else None
+
+    def start(self, job: FetchJob) -> None:
+        job.status = FetchJobStatus.RUNNING
+        job.started_at = datetime.utcnow()
+
+    def finish(self, job: FetchJob, error: Optional[BaseException] = None) -> None:
+        """Mark a job as done and wake up everyone waiting for it."""
+        job.status = FetchJobStatus.FAILED if error else FetchJobStatus.SUCCEEDED
+        job.finished_at = datetime.utcnow()
+        job.error = str(error) if error else None
+
+        future = self._futures.get(job.id)
+        if future is None or future.done():
+            return
+        if error:
+            future.set_exception(error)
+            # Mark the exception as retrieved in case nobody is waiting for the job
+            future.exception()
+        else:
+            future.set_result(job)
+
+    async def wait(self, job: FetchJob) -> FetchJob:
+        """Wait until a job is done. Raises the job's error if it failed."""
+        future = self._futures.get(job.id)
+        if future is None:
+            return job
+        return await asyncio.shield(future)
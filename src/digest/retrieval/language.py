@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Sequence
+
+import langdetect
+
+from digest.config.settings import settings
+from digest.retrieval.parse_pool import close_parse_pool, get_parse_pool
+
+# langdetect samples randomly; a fixed seed makes the same text always get the same language
+langdetect.DetectorFactory.seed = 0
+
+
+def _detect(text: str) -> Optional[str]:
+    """langdetect code of the text (e.g. "en"), None if it can't tell."""
+    try:
+        return langdetect.detect(text)
+    except langdetect.LangDetectException:
+        return None
+
+
+def _detect_all(texts: List[str]) -> List[Optional[str]]:
+    return [_detect(text) for text in texts]
+
+
+class LanguageDetector:
+    """
+    Language detection shared by ingestion, processors and search.
+
+    Only the first `max_chars` characters of a text are looked at: langdetect's answer settles long
+    before that, and its cost grows with the input. Results are cached by a hash of that prefix, so
+    a text that is detected again (by a processor after ingestion, or a repeated search query) costs
+    a dictionary lookup. `detect_many` detects the texts that aren't cached off the event loop, in
+    the parse pool when there is one and in a thread otherwise.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = settings.LANGDETECT_CACHE_SIZE,
+        max_chars: int = settings.LANGDETECT_MAX_CHARS,
+    ):
+        self.cache_size = cache_size
+        self.max_chars = max_chars
+        self._cache: "OrderedDict[bytes, Optional[str]]" = OrderedDict()
+        # The sync repository detects from worker threads too
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def _lookup(self, key: bytes) -> Optional[str]:
+        """Cached language for the key; raises KeyError when it isn't cached."""
+        with self._lock:
+            language = self._cache[key]
+            self._cache.move_to_end(key)
+            return language
+
+    def _store(self, key: bytes, language: Optional[str]) -> None:
+        with self._lock:
+            self._cache[key] = language
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def detect(self, text: str) -> Optional[str]:
+        """Detect the language of one text in the calling thread; meant for short texts like queries."""
+        text = text[:self.max_chars]
+        key = self._key(text)
+        try:
+            return self._lookup(key)
+        except KeyError:
+            pass
+        language = _detect(text)
+        self._store(key, language)
+        return language
+
+    async def detect_many(self, texts: Sequence[str]) -> List[Optional[str]]:
+        """
+        Detect the languages of a batch of texts without blocking the event loop.
+
+        Returns:
+            The langdetect code of each text, in order; None where the language can't be told
+        """
+        prefixes = [text[:self.max_chars] for text in texts]
+        keys = [self._key(prefix) for prefix in prefixes]
+        languages: List[Optional[str]] = [None] * len(texts)
+        # Indices of the texts to detect, by key, so duplicates in the batch are detected once
+        missing: "OrderedDict[bytes, List[int]]" = OrderedDict()
+        for i, key in enumerate(keys):
+            try:
+                languages[i] = self._lookup(key)
+            except KeyError:
+                missing.setdefault(key, []).append(i)
+        if not missing:
+            return languages
+
+        batch = [prefixes[indices[0]] for indices in missing.values()]
+        pool = get_parse_pool()
+        if pool is None:
+            detected = await asyncio.to_thread(_detect_all, batch)
+        else:
+            try:
+                detected = await asyncio.get_running_loop().run_in_executor(pool, _detect_all, batch)
+            except BrokenProcessPool:
+                close_parse_pool(wait=False)
+                raise
+        for (key, indices), language in zip(missing.items(), detected):
+            self._store(key, language)
+            for i in indices:
+                languages[i] = language
+        return languages
+
+
+language_detector = LanguageDetector()
@@ -0,0 +1,53 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, TypeVar
+
+from digest.config.settings import settings
+
+T = TypeVar("T")
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """Get the process-wide parse pool, creating it on first use. None if PARSE_PROCESSES is 0."""
+    global _parse_pool
+    if _parse_pool is None and settings.PARSE_PROCESSES > 0:
+        # Spawn rather than fork: a forked child would inherit the event loop's threads and locks mid-use
+        _parse_pool = ProcessPoolExecutor(
+            settings.PARSE_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_pool
+
+
+async def run_parse(func: Callable[..., T], *args: Any, size: int = 0) -> T:
+    """
+    Run a CPU-bound parse step in the parse pool, or inline if there is no pool or the input is small.
+
+    Args:
+        func: Module-level function, so it can be pickled; its arguments and result are pickled as well
+        args: Arguments to call it with
+        size: Size of the input in bytes; below PARSE_POOL_MIN_BYTES the round trip costs more than it saves
+
+    Returns:
+        The return value of `func`
+    """
+    pool = get_parse_pool()
+    if pool is None or size < settings.PARSE_POOL_MIN_BYTES:
+        return func(*args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the pool is unusable, start a new one next time
+        close_parse_pool(wait=False)
+        raise
+
+
+def close_parse_pool(wait: bool = True) -> None:
+    """Shut down the process-wide parse pool and its worker processes."""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=wait, cancel_futures=True)
+        _parse_pool = None
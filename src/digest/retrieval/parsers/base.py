@@ -1,8 +1,42 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Type, ClassVar
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Type
+from urllib.parse import urlsplit
 
-from digest.database.models.content import ContentPiece
 from digest.database.enums import SourceType
+from digest.database.models.content import ContentPiece
+from digest.database.models.source import SourceFetchState
+from digest.retrieval.http import HttpClient, get_http_client
+from digest.retrieval.seen import SeenCache
+
+
+class FetchError(RuntimeError):
+    """Raised by parsers when the source answered, but not with content."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class FetchStats:
+    """Timings (seconds) and counts a parser reports about its current fetch. None when not measured."""
+    http_time: Optional[float] = None
+    parse_time: Optional[float] = None
+    entries: Optional[int] = None  # entries in the response, including the ones skipped as already seen
+    unchanged: Optional[str] = None  # why nothing was parsed: "not_modified" (HTTP 304) or "same_body"
+    bytes_downloaded: Optional[int] = None  # bytes received over the wire, before decompression
+
+    @contextmanager
+    def measure(self, field: str) -> Iterator[None]:
+        """Add the time spent in the block to `field`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, field, (getattr(self, field) or 0.0) + time.perf_counter() - start)
 
 
 class ParserRegistry:
@@ -49,18 +83,49 @@ class BaseParser(ABC):
     description: ClassVar[str]
     supported_source_types: ClassVar[List[SourceType]]
     
-    def __init__(self, source_id: str, config: Dict[str, Any]):
+    def __init__(
+        self,
+        source_id: str,
+        config: Dict[str, Any],
+        fetch_state: Optional[SourceFetchState] = None,
+        seen: Optional[SeenCache] = None,
+    ):
         """
         Initialize the parser with source-specific configuration.
         
         Args:
             source_id: Identifier of the source
             config: Parser-specific configuration
+            fetch_state: Persisted state of previous fetches, updated in place by `fetch`
+            seen: IDs of content that is already stored; `fetch` skips those entries
         """
         self.source_id = source_id
         self.config = config
+        self.fetch_state = fetch_state or SourceFetchState(source_id=source_id)
+        self.seen = seen
+        self.stats = FetchStats()  # reset by the caller before every fetch
         self.validate_config()
     
+    @property
+    def host(self) -> Optional[str]:
+        """Host the parser fetches from, used to group failures per host. None if there is no single host."""
+        url = self.config.get("url")
+        return urlsplit(url).hostname if isinstance(url, str) else None
+    
+    @property
+    def http(self) -> HttpClient:
+        """Process-wide pooled HTTP client, shared by all parsers."""
+        return get_http_client()
+    
+    def is_seen(self, content_id: str, content_hash: Optional[str] = None) -> bool:
+        """
+        Whether a piece with this ID is already stored, so `fetch` can skip building it.
+
+        Parsers pass the hash of the entry's content (see ContentPiece.compute_hash) when CONTENT_UPSERT
+        is on: a piece whose content changed since it was stored is not seen, so it reaches the update.
+        """
+        return self.seen is not None and self.seen.contains(self.source_id, content_id, content_hash)
+    
     @classmethod
     @abstractmethod
     def config_schema(cls) -> Dict[str, Any]:
@@ -1,16 +1,80 @@
-import asyncio
 import datetime
 import hashlib
+import time
 import uuid
-from typing import Any, Dict, List, Optional
+from dataclasses import astuple
+from typing import Any, Dict, List, Optional, Tuple
 
-import requests
 import feedparser
 from pydantic import HttpUrl, ValidationError
 
+from digest.config.settings import settings
 from digest.database.models.content import ContentPiece
 from digest.database.enums import ContentType, SourceType
-from digest.retrieval.parsers.base import BaseParser, ParserRegistry
+from digest.retrieval.http import ResponseTooLarge
+from digest.retrieval.parse_pool import run_parse
+from digest.retrieval.parsers.base import BaseParser, FetchError, ParserRegistry
+from digest.retrieval.parsers.xmlfeed import FeedEntry, FeedStreamParser, FeedSyntaxError
+
+
+def _parse_fast(body: bytes) -> Tuple[Optional[str], List[FeedEntry]]:
+    """Parse a well-formed RSS/Atom document with lxml. Raises FeedSyntaxError for anything else."""
+    feed = FeedStreamParser()
+    entries = feed.feed(body) + feed.close()
+    return feed.feed_title, entries
+
+
+def _parse_with_feedparser(body: bytes) -> Tuple[Optional[str], List[FeedEntry]]:
+    """Parse any feed feedparser can make sense of."""
+    feed = feedparser.parse(body)
+    entries = []
+    for entry in feed.entries:
+        # Extract the publication date
+        published = None
+        if hasattr(entry, "published_parsed") and entry.published_parsed:
+            published = datetime.datetime(*entry.published_parsed[:6])
+
+        # Extract content
+        content = None
+        if hasattr(entry, "content") and entry.content:
+            content = entry.content[0].value
+
+        entries.append(FeedEntry(
+            id=entry.get("id"),
+            link=entry.get("link"),
+            title=entry.get("title"),
+            content=content,
+            summary=entry.get("summary") or entry.get("description"),
+            author=entry.get("author"),
+            published=published,
+            tags=[tag.term for tag in entry.get("tags", [])],
+        ))
+    return feed.feed.get("title"), entries
+
+
+def parse_feed(body: bytes, fast_path: bool = True) -> Tuple[Optional[str], List[tuple]]:
+    """
+    Parse a feed document into its title and entries.
+
+    Runs in a parse pool worker when one is configured, so it only takes and returns plain data:
+    each entry is a `FeedEntry` flattened with `astuple`, which keeps the result cheap to pickle.
+
+    Args:
+        body: The feed document
+        fast_path: Try the lxml parser first and only fall back to feedparser for malformed documents
+
+    Returns:
+        The feed title and the entries, in document order
+    """
+    if fast_path:
+        try:
+            feed_title, entries = _parse_fast(body)
+        except FeedSyntaxError:
+            # Malformed feeds are what feedparser's recovery is for
+            feed_title, entries = _parse_with_feedparser(body)
+    else:
+        feed_title, entries = _parse_with_feedparser(body)
+    return feed_title, [astuple(entry) for entry in entries]
 
 
 @ParserRegistry.register
@@ -45,6 +109,17 @@ class RssParser(BaseParser):
                     "type": "integer",
                     "description": "Timeout for HTTP requests in seconds",
                     "default": 30
+                },
+                "max_bytes": {
+                    "type": "integer",
+                    "description": "Abort the download when the decompressed feed grows larger than this. "
+                                   "Defaults to HTTP_MAX_BODY_BYTES"
+                },
+                "stream": {
+                    "type": "boolean",
+                    "description": "Parse the feed while it downloads and stop at the first entry older than "
+                                   "the newest one already seen. For very large feeds listed newest first",
+                    "default": False
                 }
             }
         }
@@ -59,68 +134,182 @@ class RssParser(BaseParser):
         except ValidationError:
             raise ValueError(f"Invalid URL: {self.config['url']}")
     
+    def _conditional_headers(self) -> Dict[str, str]:
+        """Validators from the previous response, so an unchanged feed is answered with 304."""
+        headers = {}
+        if self.fetch_state.etag:
+            headers["If-None-Match"] = self.fetch_state.etag
+        if self.fetch_state.last_modified:
+            headers["If-Modified-Since"] = self.fetch_state.last_modified
+        return headers
+
+    def _update_newest_published(self, published: List[Optional[datetime.datetime]]) -> None:
+        dates = [date for date in published if date is not None]
+        if self.fetch_state.newest_published_at:
+            dates.append(self.fetch_state.newest_published_at)
+        if dates:
+            # Capped at now: a single future-dated entry would otherwise hide every entry published before it
+            self.fetch_state.newest_published_at = min(max(dates), datetime.datetime.utcnow())
+
+    def _watermark(self) -> Optional[datetime.datetime]:
+        """Publication date below which streaming stops reading, None to read the whole feed."""
+        newest = self.fetch_state.newest_published_at
+        # Updated entries keep their publication date, so with upserts on the whole feed is read. A
+        # watermark in the future was stored before it was capped and can't be trusted either.
+        if settings.CONTENT_UPSERT or newest is None or newest > datetime.datetime.utcnow():
+            return None
+        return newest
+
+    def _piece_from_entry(self, entry: FeedEntry, feed_title: Optional[str]) -> Optional[ContentPiece]:
+        """Build a content piece from a parsed entry, None if it is already stored."""
+        entry_id = entry.id or entry.link
+        # Stable IDs whichever parser read the entry, so switching parsers doesn't duplicate content
+        entry_id = hashlib.md5(entry_id.encode()).hexdigest() if entry_id else str(uuid.uuid4())
+        content_id = f"{self.source_id}:{entry_id}"
+        title = entry.title if entry.title is not None else "Untitled"
+        content = entry.content or entry.summary or ""
+        # Updates are only picked up by upserts, otherwise a stored ID is all it takes to be seen
+        content_hash = ContentPiece.compute_hash(title, content) if settings.CONTENT_UPSERT else None
+        if self.is_seen(content_id, content_hash):
+            return None
+        return ContentPiece(
+            id=content_id,
+            title=title,
+            content=content,
+            content_hash=content_hash,
+            content_type=ContentType.ARTICLE,
+            url=entry.link,
+            author=entry.author,
+            published_at=entry.published,
+            source_id=self.source_id,
+            metainfo={
+                "feed_title": feed_title or "",
+                "categories": entry.tags,
+            }
+        )
+
+    def _pieces_from_entries(self, feed_title: Optional[str], entries: List[tuple]) -> List[ContentPiece]:
+        """Build the content pieces of entries returned by `parse_feed`, skipping the ones already stored."""
+        content_pieces = [self._piece_from_entry(FeedEntry(*entry), feed_title) for entry in entries]
+        return [piece for piece in content_pieces if piece]
+
+    def _count_bytes(self, downloaded: int) -> None:
+        # Added up, since a streaming fetch that falls back to a full download transfers the feed twice
+        self.stats.bytes_downloaded = (self.stats.bytes_downloaded or 0) + downloaded
+
+    async def _fetch_streaming(
+        self, url: str, headers: Dict[str, str], timeout: float, max_bytes: int
+    ) -> Optional[List[ContentPiece]]:
+        """
+        Parse the feed chunk by chunk while it downloads, so memory stays flat however large it is.
+
+        Assumes the feed lists entries newest first and stops reading at the first entry older than
+        the newest one seen by a previous fetch, unless CONTENT_UPSERT is on.
+
+        Returns:
+            The new content pieces, or None if the feed is not well-formed XML
+        """
+        started = time.perf_counter()
+        feed = FeedStreamParser()
+        watermark = self._watermark()
+        content_pieces = []
+        published = []
+        
+        def consume(entries: List[FeedEntry]) -> bool:
+            """Turn parsed entries into pieces. False once an entry is older than what we already have."""
+            for entry in entries:
+                if watermark and entry.published and entry.published < watermark:
+                    # Counted as fetched like the old entries of a full parse, e.g. for saturation checks
+                    published.append(entry.published)
+                    return False
+                published.append(entry.published)
+                piece = self._piece_from_entry(entry, feed.feed_title)
+                if piece:
+                    content_pieces.append(piece)
+            return True
+        
+        async with self.http.stream("GET", url, headers=headers, timeout=timeout) as response:
+            try:
+                if response.status_code == 304:
+                    self.stats.unchanged = "not_modified"
+                    return []
+                if response.status_code != 200:
+                    raise FetchError(
+                        f"Failed to fetch RSS feed: HTTP {response.status_code}", response.status_code
+                    )
+                
+                size = 0
+                try:
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > max_bytes:
+                            # Leaving the block aborts the download
+                            raise FetchError(f"Feed is larger than {max_bytes} bytes", response.status_code)
+                        with self.stats.measure("parse_time"):
+                            more = consume(feed.feed(chunk))
+                        if not more:
+                            # Leaving the block closes the response, the rest of the feed is never downloaded
+                            break
+                    else:
+                        with self.stats.measure("parse_time"):
+                            consume(feed.close())
+                except FeedSyntaxError:
+                    return None
+                validators = response.headers.get("ETag"), response.headers.get("Last-Modified")
+            finally:
+                self._count_bytes(response.num_bytes_downloaded)
+        
+        self.stats.entries = len(published)
+        self.stats.http_time = time.perf_counter() - started - (self.stats.parse_time or 0.0)
+        self.fetch_state.etag, self.fetch_state.last_modified = validators
+        self._update_newest_published(published)
+        return content_pieces
+
     async def fetch(self) -> List[ContentPiece]:
         """Fetch and parse the RSS feed."""
         url = self.config["url"]
-        headers = self.config.get("headers", {})
+        headers = {**self.config.get("headers", {}), **self._conditional_headers()}
         timeout = self.config.get("timeout", 30)
+        max_bytes = self.config.get("max_bytes", settings.HTTP_MAX_BODY_BYTES)
         
-        # Use asyncio to run the HTTP request in a thread pool
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: requests.get(url, headers=headers, timeout=timeout)
-        )
+        if self.config.get("stream", False):
+            content_pieces = await self._fetch_streaming(url, headers, timeout, max_bytes)
+            if content_pieces is not None:
+                return content_pieces
+            # Not well-formed XML, let feedparser make what it can of the whole document
+            self.stats.parse_time = None
+        
+        with self.stats.measure("http_time"):
+            try:
+                response = await self.http.download(url, max_bytes, headers=headers, timeout=timeout)
+            except ResponseTooLarge as e:
+                raise FetchError(str(e), e.status_code) from e
+        self._count_bytes(response.bytes_downloaded)
         
+        if response.status_code == 304:
+            # Not modified since the last fetch, nothing to parse
+            self.stats.unchanged = "not_modified"
+            return []
         if response.status_code != 200:
-            raise RuntimeError(f"Failed to fetch RSS feed: HTTP {response.status_code}")
+            raise FetchError(f"Failed to fetch RSS feed: HTTP {response.status_code}", response.status_code)
         
-        # Parse the feed
-        feed = feedparser.parse(response.text)
+        body_hash = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+        if body_hash == self.fetch_state.body_hash:
+            # Byte-identical to the last body, so every entry in it is stored already
+            self.stats.unchanged = "same_body"
+            return []
+        self.fetch_state.body_hash = body_hash
         
-        # Convert feed entries to ContentPiece objects
-        content_pieces = []
-        for entry in feed.entries:
-            # Create a unique ID based on the entry ID or link
-            entry_id = entry.get("id", entry.get("link", ""))
-            if not entry_id:
-                entry_id = str(uuid.uuid4())
-            else:
-                # Create a stable hash from the entry ID
-                entry_id = hashlib.md5(entry_id.encode()).hexdigest()
-            
-            # Extract the publication date
-            published_at = None
-            if hasattr(entry, "published_parsed") and entry.published_parsed:
-                published_at = datetime.datetime(*entry.published_parsed[:6])
-            
-            # Extract content
-            content = ""
-            if hasattr(entry, "content") and entry.content:
-                content = entry.content[0].value
-            elif hasattr(entry, "summary") and entry.summary:
-                content = entry.summary
-            elif hasattr(entry, "description") and entry.description:
-                content = entry.description
-            
-            # Create the ContentPiece
-            content_piece = ContentPiece(
-                id=f"{self.source_id}:{entry_id}",
-                title=entry.get("title", "Untitled"),
-                content=content,
-                content_type=ContentType.ARTICLE,
-                url=entry.get("link"),
-                author=entry.get("author"),
-                published_at=published_at,
-                source_id=self.source_id,
-                metainfo={
-                    "feed_title": feed.feed.get("title", ""),
-                    "categories": [tag.term for tag in entry.get("tags", [])] if hasattr(entry, "tags") else []
-                }
+        with self.stats.measure("parse_time"):
+            feed_title, entries = await run_parse(
+                parse_feed, response.content, settings.RSS_FAST_PATH, size=len(response.content)
             )
-            
-            content_pieces.append(content_piece)
+            content_pieces = self._pieces_from_entries(feed_title, entries)
+        self.stats.entries = len(entries)
         
+        self.fetch_state.etag = response.headers.get("ETag")
+        self.fetch_state.last_modified = response.headers.get("Last-Modified")
+        self._update_newest_published([piece.published_at for piece in content_pieces])
         return content_pieces
     
     async def test_connection(self) -> bool:
@@ -130,11 +319,7 @@ class RssParser(BaseParser):
             headers = self.config.get("headers", {})
             timeout = self.config.get("timeout", 30)
             
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: requests.head(url, headers=headers, timeout=timeout)
-            )
+            response = await self.http.head(url, headers=headers, timeout=timeout)
             
             return response.status_code == 200
         except Exception:
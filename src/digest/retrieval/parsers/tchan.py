@@ -1,10 +1,11 @@
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 
-from pydantic import HttpUrl
-from tchan import ChannelScraper
+from tchan import ChannelMessage, ChannelScraper
 
-from digest.database.models.content import ContentPiece
+from digest.config.settings import settings
 from digest.database.enums import ContentType, SourceType
+from digest.database.models.content import ContentPiece
 from digest.retrieval.parsers.base import BaseParser, ParserRegistry
 
 
@@ -15,6 +16,9 @@ class TchanParser(BaseParser):
     description = "Parses content from public Telegram channels."
     supported_source_types = [SourceType.CUSTOM]
 
+    # Scrapes run in worker threads; this caps how many channels are scraped at the same time
+    _scrape_slots: Optional[asyncio.Semaphore] = None
+
     @classmethod
     def config_schema(cls) -> Dict[str, Any]:
         return {
@@ -26,24 +30,66 @@ class TchanParser(BaseParser):
             },
         }
 
+    @property
+    def host(self) -> Optional[str]:
+        return "t.me"
+
     def validate_config(self) -> None:
         if "channel_name" not in self.config:
             raise ValueError("channel_name is required for tchan parser")
         if "limit" not in self.config:
             raise ValueError("limit is required for tchan parser")
 
+    @classmethod
+    def _get_scrape_slots(cls) -> asyncio.Semaphore:
+        if cls._scrape_slots is None:
+            cls._scrape_slots = asyncio.Semaphore(settings.TCHAN_MAX_CONCURRENT_SCRAPES)
+        return cls._scrape_slots
+
+    @staticmethod
+    def _scrape(
+        channel_name: str, limit: int, last_message_id: Optional[int]
+    ) -> Tuple[List[ChannelMessage], int]:
+        """
+        Read the newest messages of a channel, blocking; meant to run in a worker thread.
+
+        Messages come newest first, so reading stops at the first one that is not newer than
+        `last_message_id`, or after `limit` messages.
+
+        Returns:
+            The new messages and the number of messages read, including the already seen one
+            reading stopped at
+        """
+        scraper = ChannelScraper()
+        messages = []
+        entries = 0
+        for message in scraper.messages(channel_name):
+            if entries >= limit:
+                break
+            entries += 1
+            if last_message_id is not None and message.id <= last_message_id:
+                break
+            messages.append(message)
+        return messages, entries
+
     async def fetch(self) -> List[ContentPiece]:
         channel_name = self.config["channel_name"]
         limit = self.config["limit"]
+        last_message_id = self.fetch_state.last_message_id
+
+        async with self._get_scrape_slots():
+            messages, self.stats.entries = await asyncio.to_thread(
+                self._scrape, channel_name, limit, last_message_id
+            )
 
-        scraper = ChannelScraper()
         content_pieces = []
-        for _, message in zip(range(limit), scraper.messages(channel_name)):
-            if message.text is None:
+        for message in messages:
+            content_id = f"{self.source_id}{message.id}"
+            if message.text is None or self.is_seen(content_id):
                 continue
 
             content_piece = ContentPiece(
-                id=f"{self.source_id}{message.id}",
+                id=content_id,
                 title="",
                 content=message.text,
                 content_type=ContentType.POST,
@@ -55,6 +101,8 @@ class TchanParser(BaseParser):
 
             content_pieces.append(content_piece)
 
+        if messages:
+            self.fetch_state.last_message_id = max(message.id for message in messages)
         return content_pieces
 
     async def test_connection(self) -> bool:
@@ -62,7 +110,7 @@ class TchanParser(BaseParser):
 
         scraper = ChannelScraper()
         try:
-            _ = scraper.info(channel_name)
+            _ = await asyncio.to_thread(scraper.info, channel_name)
             return True
         except:
             return False
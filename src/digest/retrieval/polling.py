@@ -0,0 +1,62 @@
+import hashlib
+from typing import Optional
+
+from digest.config.settings import settings
+
+
+def update_item_rate(
+    previous_rate: Optional[float],
+    new_items: int,
+    elapsed: float,
+    smoothing: float = settings.ADAPTIVE_SMOOTHING,
+) -> float:
+    """
+    Update the moving estimate of how many new items a source publishes per second.
+
+    Args:
+        previous_rate: Current estimate, None if the source has no estimate yet
+        new_items: Number of new items the last fetch inserted
+        elapsed: Seconds since the fetch before it
+        smoothing: Weight of the latest observation (exponentially weighted moving average)
+    """
+    observed = new_items / max(elapsed, 1.0)
+    if previous_rate is None:
+        return observed
+    return smoothing * observed + (1 - smoothing) * previous_rate
+
+
+def adaptive_interval(
+    item_rate: float,
+    current_interval: float,
+    saturated: bool = False,
+    target_items: float = settings.ADAPTIVE_TARGET_ITEMS,
+    min_interval: float = settings.ADAPTIVE_MIN_INTERVAL,
+    max_interval: float = settings.ADAPTIVE_MAX_INTERVAL,
+) -> int:
+    """
+    Poll interval expected to find about `target_items` new items per fetch.
+
+    Args:
+        item_rate: Estimated new items per second
+        current_interval: Interval used for the last fetch
+        saturated: Every item in the last fetch was new, so the feed may have dropped some
+            before we saw them and the rate is underestimated
+        target_items: Desired number of new items per fetch
+        min_interval: Lower bound in seconds
+        max_interval: Upper bound in seconds
+    """
+    interval = target_items / item_rate if item_rate > 0 else max_interval
+    if saturated:
+        interval = min(interval, current_interval / 2)
+    return int(min(max(interval, min_interval), max_interval))
+
+
+def spread_delay(key: str, window: float) -> float:
+    """
+    Deterministic delay between 0 and `window` seconds for `key`.
+
+    Derived from a hash of the key, so keys are spread evenly over the window and every restart
+    spreads them the same way.
+    """
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64 * window
@@ -1,9 +1,9 @@
 import yake
 import textstat
-import langdetect
 from typing import Any, Dict, List, Optional
 
 from digest.database.models.content import ContentPiece
+from digest.retrieval.language import language_detector
 from digest.retrieval.processors.base import BaseProcessor, ProcessorRegistry
 
 
@@ -30,12 +30,9 @@ class LanguageDetectorProcessor(BaseProcessor):
         if not processed_content.content:
             return processed_content
             
-        try:
-            language = langdetect.detect(processed_content.content)
-            processed_content.metainfo["language"] = language
-        except:
-            # Default to English if detection fails
-            processed_content.metainfo["language"] = "en"
+        (language,) = await language_detector.detect_many([processed_content.content])
+        # Default to English if detection fails
+        processed_content.metainfo["language"] = language or "en"
             
         return processed_content
 
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from digest.config.settings import settings
+
+
+class TokenBucket:
+    """
+    Limits how often something happens: `rate` times per second on average, in bursts of up to `burst`.
+
+    Callers that find the bucket empty reserve the next token and sleep until it is due, so they
+    go through in the order they arrived.
+    """
+
+    def __init__(self, rate: float = settings.FETCH_RATE_LIMIT, burst: int = settings.FETCH_RATE_BURST):
+        """
+        Initialize the bucket, full.
+
+        Args:
+            rate: Tokens added per second; 0 disables the limit
+            burst: Maximum number of tokens saved up while idle
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Take a token, waiting until one is available."""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        # Tokens go negative while callers wait; each one sleeps until its own token is due
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
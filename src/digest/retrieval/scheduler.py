@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# Periodic job callback: receives the key and returns the delay (in seconds) until the key
+# should run again, or None to stop scheduling it.
+PeriodicCallback = Callable[[str], Awaitable[Optional[float]]]
+OneOffJob = Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class SchedulerStats:
+    """Point-in-time view of the scheduler state."""
+    scheduled: int
+    queue_depth: int
+    running: int
+    concurrency: int
+    last_lag: float
+    avg_lag: float
+    max_lag: float
+
+
+@dataclass
+class _QueueItem:
+    key: str
+    due: float
+    job: Optional[OneOffJob] = None
+    future: Optional[asyncio.Future] = None
+
+
+class FetchScheduler:
+    """
+    Single timer driving all periodic fetches.
+
+    Due times are kept in a min-heap. One dispatcher coroutine sleeps until the earliest due time
+    and hands due keys to a fixed pool of worker coroutines, so the number of concurrent fetches
+    never exceeds ``concurrency`` no matter how many keys are scheduled.
+    """
+
+    def __init__(self, callback: PeriodicCallback, concurrency: int = 16, retry_delay: float = 60):
+        """
+        Initialize the scheduler.
+
+        Args:
+            callback: Coroutine run for every due key; returns the delay until the next run
+            concurrency: Maximum number of jobs running at the same time
+            retry_delay: Delay used when the callback raises instead of returning a delay
+        """
+        self.callback = callback
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, Tuple[float, int]] = {}  # key -> live heap entry
+        self._periodic: Set[str] = set()
+        self._running: Dict[str, int] = {}
+        self._in_flight: Set[str] = set()  # periodic keys queued or running
+        self._counter = itertools.count()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self._last_lag = 0.0
+        self._avg_lag = 0.0
+        self._max_lag = 0.0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        """Start the dispatcher and the worker pool. Must be called from a running event loop."""
+        if self.started:
+            return
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._dispatch_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Cancel the dispatcher and all workers, dropping anything still queued."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        while self._queue is not None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item.future is not None and not item.future.done():
+                item.future.cancel()
+        self._heap.clear()
+        self._entries.clear()
+        self._periodic.clear()
+        self._in_flight.clear()
+
+    def schedule(self, key: str, delay: float = 0) -> None:
+        """Schedule ``key`` to run periodically, the first time after ``delay`` seconds."""
+        self.start()
+        self._periodic.add(key)
+        self._push(key, time.monotonic() + max(0.0, delay))
+
+    def unschedule(self, key: str) -> None:
+        """Stop running ``key`` periodically. A run already in progress is not interrupted."""
+        self._periodic.discard(key)
+        self._entries.pop(key, None)
+
+    def is_scheduled(self, key: str) -> bool:
+        return key in self._periodic
+
+    def next_run_in(self, key: str) -> Optional[float]:
+        """Seconds until the next periodic run of ``key``, or None if it is not waiting in the heap."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return max(0.0, entry[0] - time.monotonic())
+
+    def submit(self, key: str, job: OneOffJob) -> asyncio.Future:
+        """
+        Run a one-off job for ``key`` as soon as a worker is free.
+
+        Returns:
+            A future resolved with the job result
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_QueueItem(key, time.monotonic(), job, future))
+        return future
+
+    def stats(self) -> SchedulerStats:
+        return SchedulerStats(
+            scheduled=len(self._entries),
+            queue_depth=self._queue.qsize() if self._queue is not None else 0,
+            running=sum(self._running.values()),
+            concurrency=self.concurrency,
+            last_lag=self._last_lag,
+            avg_lag=self._avg_lag,
+            max_lag=self._max_lag,
+        )
+
+    def _push(self, key: str, due: float) -> None:
+        entry = (due, next(self._counter))
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (*entry, key))
+        # Superseded entries are skipped lazily; rebuild the heap when they pile up
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(*entry, key) for key, entry in self._entries.items()]
+            heapq.heapify(self._heap)
+        if self._wakeup is not None and self._heap[0][2] == key:
+            self._wakeup.set()
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, key = heapq.heappop(self._heap)
+                if self._entries.get(key) != (due, seq):
+                    continue
+                del self._entries[key]
+                if key in self._in_flight:
+                    # The pending run reschedules the key when it finishes
+                    continue
+                self._in_flight.add(key)
+                self._queue.put_nowait(_QueueItem(key, due))
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _record_lag(self, lag: float) -> None:
+        self._last_lag = lag
+        self._avg_lag = lag if self._avg_lag == 0 else 0.9 * self._avg_lag + 0.1 * lag
+        self._max_lag = max(self._max_lag, lag)
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            self._record_lag(max(0.0, time.monotonic() - item.due))
+            self._running[item.key] = self._running.get(item.key, 0) + 1
+            try:
+                if item.job is not None:
+                    await self._run_one_off(item)
+                else:
+                    await self._run_periodic(item.key)
+            finally:
+                self._running[item.key] -= 1
+                if not self._running[item.key]:
+                    del self._running[item.key]
+                self._queue.task_done()
+
+    async def _run_one_off(self, item: _QueueItem) -> None:
+        try:
+            result = await item.job()
+        except asyncio.CancelledError:
+            item.future.cancel()
+            raise
+        except Exception as e:
+            print(f"Error in one-off job for {item.key}: {str(e)}")
+            if not item.future.done():
+                item.future.set_exception(e)
+                # Mark the exception as retrieved in case the submitter doesn't await the future
+                item.future.exception()
+        else:
+            if not item.future.done():
+                item.future.set_result(result)
+
+    async def _run_periodic(self, key: str) -> None:
+        try:
+            delay = await self.callback(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in scheduled job for {key}: {str(e)}")
+            delay = self.retry_delay
+        finally:
+            self._in_flight.discard(key)
+
+        if delay is None:
+            self._periodic.discard(key)
+        elif key in self._periodic:
+            self._push(key, time.monotonic() + delay)
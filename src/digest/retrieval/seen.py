@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from digest.config.settings import settings
+
+
+class SeenCache:
+    """
+    Bounded per-source record of content IDs that are already stored.
+
+    Parsers consult it before building a ContentPiece, so entries a feed keeps repeating between
+    polls cost a dictionary lookup instead of an object, a language detection and a discarded insert.
+    Each source keeps its `capacity` most recently seen IDs, and only the `max_sources` most recently
+    used sources are kept. IDs that fall out are just inserted again and dropped by the database, as
+    before, and an evicted source is loaded again on its next fetch. With the content hash of a piece
+    recorded as well, an entry whose content changed since is not reported as seen, so it can be updated.
+    """
+
+    def __init__(
+        self,
+        capacity: int = settings.SEEN_CACHE_SIZE,
+        max_sources: int = settings.SEEN_CACHE_SOURCES,
+    ):
+        self.capacity = capacity
+        self.max_sources = max_sources
+        # Source ID -> content ID -> content hash, least recently used source first
+        self._seen: "OrderedDict[str, OrderedDict[str, Optional[str]]]" = OrderedDict()
+
+    def is_warm(self, source_id: str) -> bool:
+        """Whether the source's IDs were loaded or recorded since the cache was created."""
+        return source_id in self._seen
+
+    def contains(self, source_id: str, content_id: str, content_hash: Optional[str] = None) -> bool:
+        """Whether the ID is stored; if `content_hash` is given, also whether it was stored with that hash."""
+        ids = self._seen.get(source_id)
+        if ids is None:
+            return False
+        self._seen.move_to_end(source_id)
+        if content_id not in ids:
+            return False
+        ids.move_to_end(content_id)
+        return content_hash is None or ids[content_id] == content_hash
+
+    def add(
+        self,
+        source_id: str,
+        content_ids: Iterable[str],
+        content_hashes: Optional[Iterable[Optional[str]]] = None,
+    ) -> None:
+        """Record stored IDs, oldest first, evicting the least recently seen beyond capacity."""
+        ids = self._seen.setdefault(source_id, OrderedDict())
+        self._seen.move_to_end(source_id)
+        content_ids = list(content_ids)
+        hashes = list(content_hashes) if content_hashes is not None else [None] * len(content_ids)
+        for content_id, content_hash in zip(content_ids, hashes):
+            ids[content_id] = content_hash
+            ids.move_to_end(content_id)
+        while len(ids) > self.capacity:
+            ids.popitem(last=False)
+        while len(self._seen) > self.max_sources:
+            self._seen.popitem(last=False)
+
+    def forget(self, source_id: str) -> None:
+        self._seen.pop(source_id, None)
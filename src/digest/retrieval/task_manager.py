@@ -1,104 +1,469 @@
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, List
-from sqlalchemy.ext.asyncio import AsyncSession
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import requests
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from digest.config.settings import settings
+from digest.database.models.content import ContentPiece
+from digest.database.models.source import Source, SourceFetchState
+from digest.database.repositories.content import AsyncContentRepository
+from digest.database.repositories.fetch_state import AsyncFetchStateRepository
+from digest.database.repositories.sources import AsyncSourceRepository
+from digest.database.session import async_session_maker
+from digest.retrieval.backoff import CircuitBreakers, backoff_delay
+from digest.retrieval.dedup import NearDuplicateIndex, simhashes
+from digest.retrieval.ingest import IngestBuffer
+from digest.retrieval.jobs import FetchJob, FetchJobRegistry, FetchTrigger
+from digest.retrieval.parsers.base import BaseParser, FetchError, FetchStats, ParserRegistry
+from digest.retrieval.polling import adaptive_interval, spread_delay, update_item_rate
+from digest.retrieval.ratelimit import TokenBucket
+from digest.retrieval.scheduler import FetchScheduler
+from digest.retrieval.seen import SeenCache
+
+ERROR_RETRY_DELAY = 60  # seconds to wait before retrying a source after an unexpected error
+# Fetch state that describes the feed itself; a source pointed at another feed starts over without it
+FEED_STATE_FIELDS = ("etag", "last_modified", "newest_published_at", "last_message_id", "body_hash")
+
+
+@dataclass
+class SourceSchedule:
+    """Polling schedule of a source."""
+    source_id: str
+    adaptive: bool
+    update_frequency: int  # configured interval, seconds
+    effective_interval: int  # interval actually used, seconds
+    item_rate: Optional[float]  # estimated new items per hour
+    next_fetch_in: Optional[float]  # seconds, None when the source is not scheduled
+    consecutive_failures: int
+
+
+@dataclass
+class ReconcileResult:
+    """IDs of the sources a reconciliation touched."""
+    started: List[str] = field(default_factory=list)
+    stopped: List[str] = field(default_factory=list)
+    reconfigured: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.started or self.stopped or self.reconfigured)
 
-from digest.retrieval.parsers.base import BaseParser, ParserRegistry
-from digest.database.models.source import Source
-from digest.database.repositories.sources import SourceRepository
-from digest.database.repositories.content import ContentRepository
-from digest.database.session import get_long_session
 
 class TaskManager:
-    def __init__(self, source_repository: SourceRepository, content_repository: ContentRepository):
-        self.source_repository = source_repository
-        self.content_repository = content_repository
-        self.parser_tasks: Dict[str, asyncio.Task] = {}
-
-    async def _fetch_content(self, parser: BaseParser):
-        content_pieces = await parser.fetch()
-        source = self.source_repository.get_by_id(parser.source_id)
-        if not source:
-            raise ValueError(f"Source with ID '{parser.source_id}' does not exist")
-        if content_pieces:
-            # Efficiently insert new content pieces, skipping duplicates
-            new_pieces = self.content_repository.bulk_insert(content_pieces)
-            print(f"Parser for {source.name} got {len(content_pieces)} content pieces, {new_pieces} new pieces inserted")
-        current_time = datetime.utcnow()
-        source.last_retrieved = current_time
-        self.source_repository.update(source)
-    async def _start_parser(self, source: Source):
+    def __init__(self, session_factory: async_sessionmaker, concurrency: int = settings.FETCH_CONCURRENCY):
+        # Every fetch cycle opens its own short-lived session, so fetches don't share an identity map
+        # and a failed commit only affects the fetch that made it
+        self.session_factory = session_factory
+        self.sources: Dict[str, Source] = {}  # detached snapshots, refreshed by every fetch
+        self.parsers: Dict[str, BaseParser] = {}
+        self.applied: Dict[str, Tuple[Any, ...]] = {}  # fingerprint of the source each parser was made from
+        self.failures: Dict[str, int] = {}  # consecutive failed fetches by source
+        self.breakers = CircuitBreakers()
+        self.jobs = FetchJobRegistry()
+        self.seen = SeenCache()
+        self.near_duplicates = NearDuplicateIndex()
+        # Held while a cache is loaded, so concurrent first fetches load it once and the rest wait for it
+        self._seen_locks: Dict[str, asyncio.Lock] = {}
+        self._near_duplicates_lock = asyncio.Lock()
+        self.rate_limit = TokenBucket()
+        # Fetches store their content through the buffer, so commits are shared between them
+        self.ingest = IngestBuffer(self._store_content)
+        self.scheduler = FetchScheduler(self._run_scheduled, concurrency, retry_delay=ERROR_RETRY_DELAY)
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    def create_parser(self, source: Source, state: SourceFetchState) -> BaseParser:
+        parser_cls = ParserRegistry.get_parser(source.parser_id)
+        return parser_cls(source.id, source.config, state, self.seen)
+
+    async def load_source(self, source_id: str) -> Tuple[Source, SourceFetchState]:
+        async with self.session_factory() as session:
+            source = await AsyncSourceRepository(session).get_by_id(source_id)
+            if not source:
+                raise ValueError(f"Source with ID '{source_id}' does not exist")
+            return source, await AsyncFetchStateRepository(session).get_or_create(source_id)
+
+    def _poll_interval(self, source: Source, state: SourceFetchState) -> int:
+        """Seconds between fetches: the adaptive interval when enabled, else the configured frequency."""
+        if settings.ADAPTIVE_POLLING and state.effective_interval:
+            return state.effective_interval
+        return source.update_frequency
+
+    def _adapt_poll_interval(self, source: Source, state: SourceFetchState, fetched: int, new_pieces: int):
+        if not settings.ADAPTIVE_POLLING or not source.last_retrieved:
+            return
+        elapsed = (datetime.utcnow() - source.last_retrieved).total_seconds()
+        state.item_rate = update_item_rate(state.item_rate, new_pieces, elapsed)
+        state.effective_interval = adaptive_interval(
+            state.item_rate,
+            self._poll_interval(source, state),
+            saturated=fetched > 1 and new_pieces == fetched,
+        )
+
+    async def _warm_seen(self, source_id: str):
+        """Load the IDs of a source's latest stored content into the seen cache, once per source."""
+        if self.seen.is_warm(source_id):
+            return
+        async with self._seen_locks.setdefault(source_id, asyncio.Lock()):
+            if self.seen.is_warm(source_id):
+                return
+            async with self.session_factory() as session:
+                repository = AsyncContentRepository(session)
+                content_ids = await repository.get_recent_ids(source_id, self.seen.capacity)
+            self.seen.add(source_id, reversed(content_ids))
+
+    async def _warm_near_duplicates(self):
+        """Load the fingerprints of the latest stored content into the near-duplicate index, once."""
+        if self.near_duplicates.loaded:
+            return
+        async with self._near_duplicates_lock:
+            if self.near_duplicates.loaded:
+                return
+            async with self.session_factory() as session:
+                repository = AsyncContentRepository(session)
+                fingerprints = await repository.get_recent_fingerprints(self.near_duplicates.capacity)
+            self.near_duplicates.load(reversed(fingerprints))
+
+    async def _link_near_duplicates(self, content_pieces: List[ContentPiece]) -> int:
+        """Fingerprint the pieces and link those nearly matching stored content. Returns the number linked."""
+        await self._warm_near_duplicates()
+        fingerprints = await asyncio.to_thread(simhashes, [piece.content for piece in content_pieces])
+        duplicates = 0
+        for piece, fingerprint in zip(content_pieces, fingerprints):
+            piece.simhash = fingerprint
+            if fingerprint is not None:
+                piece.duplicate_of = self.near_duplicates.find(fingerprint, exclude=piece.id)
+                duplicates += piece.duplicate_of is not None
+        return duplicates
+
+    async def _store_content(self, content_pieces: List[ContentPiece]) -> List[str]:
+        """
+        Store a batch of pieces, skipping duplicates.
+
+        Returns the IDs of the pieces inserted; with CONTENT_UPSERT, also of those updated, so they
+        count as new content and are processed again.
+        """
+        async with self.session_factory() as session:
+            content_repository = AsyncContentRepository(session)
+            if settings.CONTENT_UPSERT:
+                return await content_repository.upsert(content_pieces)
+            if len(content_pieces) >= settings.BULK_LOAD_MIN_ROWS:
+                return await content_repository.bulk_load(content_pieces)
+            return await content_repository.bulk_insert(content_pieces)
+
+    async def _fetch_content(self, parser: BaseParser, job: FetchJob) -> int:
+        """Fetch a source once and store the new content. Returns the number of new pieces."""
+        state = parser.fetch_state
+        snapshot = state.model_dump(exclude={"updated_at"})
+        new_ids: List[str] = []
         try:
-            print(f"Parser for {source.name} activated")
-            parser_cls = ParserRegistry.get_parser(source.parser_id)
-            parser = parser_cls(source.id, source.config)
-            update_frequency = source.update_frequency
+            await self._warm_seen(parser.source_id)
+            # Fetch before taking a connection from the pool, so slow hosts don't hold one
+            await self.rate_limit.acquire()
+            parser.stats = FetchStats()
+            fetch_started = time.perf_counter()
+            try:
+                content_pieces = await parser.fetch()
+            except Exception as e:
+                # Only the fetch itself says anything about the host; database errors are ours
+                job.host_failure = self._is_host_failure(e)
+                raise
+            job.fetch_time = time.perf_counter() - fetch_started
+            job.http_time = parser.stats.http_time
+            job.parse_time = parser.stats.parse_time
+            job.unchanged = parser.stats.unchanged
+            job.bytes_downloaded = parser.stats.bytes_downloaded
+            # Entries skipped as already seen still count as fetched, e.g. for detecting saturated feeds
+            fetched = parser.stats.entries if parser.stats.entries is not None else len(content_pieces)
+            job.items = fetched
 
-            while True:
-                try:
-                    current_time = datetime.utcnow()
-                    last_fetch = source.last_retrieved
+            if content_pieces and settings.NEAR_DUP_DETECTION:
+                job.duplicates = await self._link_near_duplicates(content_pieces)
 
-                    if last_fetch and (current_time - last_fetch).total_seconds() < update_frequency:
-                        await asyncio.sleep(30)
-                        continue
+            insert_started = time.perf_counter()
+            if content_pieces:
+                # Stored together with the content of other fetches; waits for that shared commit
+                new_ids = await self.ingest.submit(content_pieces)
+            async with self.session_factory() as session:
+                source_repository = AsyncSourceRepository(session)
+                # Re-read by primary key, so changes made through the API apply from the next fetch on
+                source = await source_repository.get_by_id(parser.source_id)
+                if not source:
+                    raise ValueError(f"Source with ID '{parser.source_id}' does not exist")
+                if content_pieces:
+                    print(
+                        f"Parser for {source.name} got {len(content_pieces)} content pieces, "
+                        f"{len(new_ids)} new pieces inserted"
+                    )
+                self._adapt_poll_interval(source, state, fetched, len(new_ids))
 
-                    await self._fetch_content(parser)
-                    await asyncio.sleep(update_frequency)
+                if state.model_dump(exclude={"updated_at"}) != snapshot:
+                    parser.fetch_state = await AsyncFetchStateRepository(session).save(state)
+                source.last_retrieved = datetime.utcnow()
+                source = await source_repository.update(source)
+            job.insert_time = time.perf_counter() - insert_started
+            job.new_items = len(new_ids)
+        except Exception:
+            # Keep sending the old validators, otherwise the next fetch would get a 304
+            # for content we never stored
+            for key, value in snapshot.items():
+                setattr(state, key, value)
+            raise
 
-                except asyncio.CancelledError:
-                    raise
-                except Exception as e:
-                    print(f"Error in parser loop for {source.name}: {str(e)}")
-                    await asyncio.sleep(60)  # Wait before retrying after error
+        # Duplicates the database skipped are stored as well, so every piece of the batch counts as seen
+        self.seen.add(
+            source.id,
+            [piece.id for piece in content_pieces],
+            [piece.content_hash for piece in content_pieces],
+        )
+        if source.id in self.sources:
+            self.sources[source.id] = source
+        # Only stored originals are linked to
+        inserted = set(new_ids)
+        for piece in content_pieces:
+            if piece.id in inserted and piece.duplicate_of is None and piece.simhash is not None:
+                self.near_duplicates.add(piece.id, piece.simhash)
+        return len(new_ids)
 
-        except asyncio.CancelledError:
-            print(f"Parser for {source.name} stopped")
+    async def _run_job(self, job: FetchJob, parser: BaseParser) -> FetchJob:
+        """Run a fetch job, or wait for it if another worker already picked it up."""
+        if not job.active or job.started_at:
+            return await self.jobs.wait(job)
+        self.jobs.start(job)
+        try:
+            await self._fetch_content(parser, job)
+        except Exception as e:
+            self.jobs.finish(job, e)
             raise
+        self.jobs.finish(job)
+        return job
+
+    @staticmethod
+    def _is_host_status(status_code: Optional[int]) -> bool:
+        return status_code is not None and (status_code >= 500 or status_code == 429)
+
+    @classmethod
+    def _is_host_failure(cls, error: Exception) -> bool:
+        """Whether an error says the host is unhealthy, rather than something being wrong with one source."""
+        if isinstance(error, FetchError):
+            return error.status_code is None or cls._is_host_status(error.status_code)
+        # requests (used by tchan) errors are all OSErrors, bad URLs and redirect loops included
+        if isinstance(error, requests.HTTPError):
+            return cls._is_host_status(error.response.status_code if error.response is not None else None)
+        if isinstance(error, requests.RequestException):
+            return isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return isinstance(error, (httpx.TransportError, OSError, asyncio.TimeoutError))
+
+    async def _run_scheduled(self, source_id: str) -> Optional[float]:
+        """Scheduler callback: fetch one source and return the delay until its next fetch."""
+        source = self.sources.get(source_id)
+        parser = self.parsers.get(source_id)
+        if not source or not parser:
+            return None
+        return await self.fetch_source(source, parser)
+
+    async def fetch_source(self, source: Source, parser: BaseParser) -> float:
+        """
+        Fetch a source once, counting failures per source and host.
+
+        Returns:
+            Seconds until the next fetch of the source
+        """
+        source_id = source.id
+        breaker = self.breakers.get(parser.host) if parser.host else None
+        if breaker and not breaker.allow():
+            # Spread the sources of a tripped host so they don't all probe it at the same moment
+            return breaker.retry_in() + random.uniform(0, ERROR_RETRY_DELAY)
+
+        # A manual fetch of the source that is already queued or running is taken over, not repeated
+        job = self.jobs.active(source_id) or self.jobs.create(source_id, FetchTrigger.SCHEDULED)
+        try:
+            await self._run_job(job, parser)
         except Exception as e:
-            print(f"Fatal error in parser for {source.name}: {str(e)}")
-            raise e
-
-    def start_all_parsers(self):
-        """Start all parsers as background tasks"""
-        for source in self.source_repository.get_all():
-            if source.id not in self.parser_tasks:
-                self.parser_tasks[source.id] = asyncio.create_task(
-                    self._start_parser(source)
+            failures = self.failures[source_id] = self.failures.get(source_id, 0) + 1
+            if breaker and job.host_failure:
+                breaker.record_failure()
+            delay = backoff_delay(failures)
+            print(
+                f"Error in parser loop for {source.name} "
+                f"(failure {failures}, retrying in {delay:.0f}s): {str(e)}"
+            )
+            return delay
+
+        self.failures.pop(source_id, None)
+        if breaker:
+            breaker.record_success()
+        return self._poll_interval(self.sources.get(source_id, source), parser.fetch_state)
+
+    @staticmethod
+    def _fingerprint(source: Source) -> Tuple[Any, ...]:
+        """What a scheduled parser depends on; when any of it changes, the source is reconfigured."""
+        return source.parser_id, source.config, source.update_frequency
+
+    def _schedule(self, source: Source, state: SourceFetchState, spread: float = 0.0):
+        """
+        Create the parser of a source and schedule its next fetch.
+
+        Args:
+            source: The source
+            state: Its fetch state
+            spread: Window in seconds; a source due within it is fetched at its own fixed point in the
+                window instead, so sources that are all due at once aren't all fetched at once
+        """
+        self.parsers[source.id] = self.create_parser(source, state)
+        self.sources[source.id] = source
+        self.applied[source.id] = self._fingerprint(source)
+
+        delay = 0.0
+        if source.last_retrieved:
+            elapsed = (datetime.utcnow() - source.last_retrieved).total_seconds()
+            delay = max(0.0, self._poll_interval(source, state) - elapsed)
+        if delay < spread:
+            delay = max(delay, spread_delay(source.id, spread))
+        self.scheduler.schedule(source.id, delay)
+        print(f"Parser for {source.name} activated")
+
+    async def _apply(
+        self, source: Source, fetch_state_repository: AsyncFetchStateRepository, spread: float = 0.0
+    ) -> Optional[str]:
+        """Start or reconfigure the parser of an enabled source. Returns what was done, None if up to date."""
+        applied = self.applied.get(source.id)
+        fingerprint = self._fingerprint(source)
+        if applied == fingerprint:
+            return None
+        if applied is None:
+            self._schedule(source, await fetch_state_repository.get_or_create(source.id), spread)
+            return "started"
+
+        state = self.parsers[source.id].fetch_state
+        if applied[:2] != fingerprint[:2]:
+            # A copy, so a fetch still running with the old parser doesn't write the old feed's state into it
+            state = SourceFetchState(**{**state.model_dump(), **dict.fromkeys(FEED_STATE_FIELDS)})
+        self._schedule(source, state)
+        return "reconfigured"
+
+    async def reconcile(self, spread: float = 0.0) -> ReconcileResult:
+        """
+        Bring the scheduled parsers in line with the enabled sources in the database.
+
+        Only sources that changed are touched: new and re-enabled sources are started, deleted and
+        disabled ones are stopped, and ones with a new parser, config or update frequency get a new
+        parser and are rescheduled. A fetch already running finishes with the parser it started with.
+
+        Args:
+            spread: Window over which started sources that are already due are spread, see `_schedule`
+        """
+        result = ReconcileResult()
+        async with self.session_factory() as session:
+            desired = {source.id: source for source in await AsyncSourceRepository(session).get_enabled()}
+            for source_id in list(self.sources):
+                if source_id not in desired:
+                    self.stop_parser(source_id)
+                    result.stopped.append(source_id)
+
+            fetch_state_repository = AsyncFetchStateRepository(session)
+            for source in desired.values():
+                try:
+                    change = await self._apply(source, fetch_state_repository, spread)
+                except Exception as e:
+                    print(f"Error starting parser for source {source.id}: {str(e)}")
+                    continue
+                if change:
+                    getattr(result, change).append(source.id)
+        return result
+
+    async def reconcile_source(self, source_id: str) -> Optional[str]:
+        """Apply the stored settings of one source right away, e.g. after an edit through the API."""
+        async with self.session_factory() as session:
+            source = await AsyncSourceRepository(session).get_by_id(source_id)
+            if not source or not source.enabled:
+                if source_id not in self.sources:
+                    return None
+                self.stop_parser(source_id)
+                return "stopped"
+            try:
+                return await self._apply(source, AsyncFetchStateRepository(session))
+            except Exception as e:
+                print(f"Error starting parser for source {source_id}: {str(e)}")
+                return None
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(settings.RECONCILE_INTERVAL)
+            try:
+                result = await self.reconcile()
+            except Exception as e:
+                print(f"Error reconciling sources: {str(e)}")
+                continue
+            if result.changed:
+                print(
+                    f"Reconciled sources: {len(result.started)} started, {len(result.stopped)} stopped, "
+                    f"{len(result.reconfigured)} reconfigured"
                 )
 
+    async def start_all_parsers(self):
+        """Schedule the parsers of all enabled sources and keep them in sync with the database."""
+        self.scheduler.start()
+        # After a deploy most sources are overdue; ramp them up instead of fetching them all at once
+        await self.reconcile(spread=settings.STARTUP_SPREAD)
+        if self._reconcile_task is None:
+            self._reconcile_task = asyncio.create_task(self._reconcile_loop())
+
     async def stop_all_parsers(self):
         """Gracefully stop all parsers"""
-        for task in self.parser_tasks.values():
-            task.cancel()
-        await asyncio.gather(*self.parser_tasks.values(), return_exceptions=True)
-        self.parser_tasks.clear()
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            await asyncio.gather(self._reconcile_task, return_exceptions=True)
+            self._reconcile_task = None
+        await self.scheduler.stop()
+        # Content of fetches that were cancelled after handing it over is stored before returning
+        await self.ingest.close()
+        self.parsers.clear()
+        self.sources.clear()
+        self.applied.clear()
+        self.failures.clear()
 
-    def start_parser(self, source_id: str):
-        source = self.source_repository.get_by_id(source_id)
-        if not source:
-            raise ValueError(f"Source with ID '{source_id}' does not exist")
+    def stop_parser(self, source_id: str):
+        self.scheduler.unschedule(source_id)
+        self.parsers.pop(source_id, None)
+        self.applied.pop(source_id, None)
+        self.failures.pop(source_id, None)
+        self.seen.forget(source_id)
+        self._seen_locks.pop(source_id, None)
+        source = self.sources.pop(source_id, None)
+        if source:
+            print(f"Parser for {source.name} stopped")
 
-        try:
-            self.parser_tasks[source.id] = asyncio.create_task(self._start_parser(source))
-        except Exception as e:
-            print(f"Error starting parser for source {source_id}: {str(e)}")
+    async def get_schedule(self, source: Source) -> SourceSchedule:
+        parser = self.parsers.get(source.id)
+        if parser:
+            state = parser.fetch_state
+        else:
+            async with self.session_factory() as session:
+                state = await AsyncFetchStateRepository(session).get_or_create(source.id)
+        return SourceSchedule(
+            source_id=source.id,
+            adaptive=settings.ADAPTIVE_POLLING,
+            update_frequency=source.update_frequency,
+            effective_interval=self._poll_interval(source, state),
+            item_rate=state.item_rate * 3600 if state.item_rate is not None else None,
+            next_fetch_in=self.scheduler.next_run_in(source.id),
+            consecutive_failures=self.failures.get(source.id, 0),
+        )
 
-    def stop_parser(self, source_id: str):
-        if source_id in self.parser_tasks:
-            self.parser_tasks[source_id].cancel()
-            del self.parser_tasks[source_id]
-
-    def one_off_fetch(self, source_id: str):
-        source = self.source_repository.get_by_id(source_id)
-        if not source:
-            raise ValueError(f"Source with ID '{source_id}' does not exist")
-        parser = ParserRegistry.get_parser(source.parser_id)
-        return asyncio.create_task(self._fetch_content(parser(source.id, source.config)))
-
-# Initialize repositories with a long-lived session
-session = get_long_session()
-task_manager = TaskManager(
-    source_repository=SourceRepository(session),
-    content_repository=ContentRepository(session)
-)
+    async def one_off_fetch(self, source_id: str) -> FetchJob:
+        """Queue a fetch of a source, or return the job already queued or running for it."""
+        # Scheduled sources are fetched through their own parser, so their fetch state stays consistent
+        parser = self.parsers.get(source_id) or self.create_parser(*await self.load_source(source_id))
+        job = self.jobs.active(source_id)
+        if not job:
+            job = self.jobs.create(source_id, FetchTrigger.MANUAL)
+            self.scheduler.submit(source_id, lambda: self._run_job(job, parser))
+        return job
+
+task_manager = TaskManager(async_session_maker)
@@ -0,0 +1,81 @@
+from fnmatch import fnmatchcase
+from typing import Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from digest.config.settings import settings
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+AMP_CACHE_SUFFIX = ".cdn.ampproject.org"
+
+
+def _strip_amp(host: str, path: str) -> tuple:
+    """Host and path of the regular page for an AMP URL; other URLs are returned unchanged."""
+    if host.endswith(AMP_CACHE_SUFFIX):
+        # Google's AMP cache: /c/s/example.com/story, "c" for documents, "s" for https
+        segments = path.split("/")[1:]
+        if segments and segments[0] in ("c", "v", "i"):
+            segments = segments[1:]
+        if segments and segments[0] == "s":
+            segments = segments[1:]
+        if segments and segments[0]:
+            host, path = segments[0], "/" + "/".join(segments[1:])
+    if host.startswith("amp."):
+        host = host[len("amp."):]
+
+    segments = path.split("/")
+    if segments[-1] == "amp" or (segments[-1] == "" and len(segments) > 2 and segments[-2] == "amp"):
+        path = path[:path.rindex("amp")]
+    elif len(segments) > 2 and segments[1] == "amp":
+        path = "/" + "/".join(segments[2:])
+    elif segments[-1].endswith(".amp"):
+        path = path[:-len(".amp")]
+    elif ".amp." in segments[-1]:
+        path = path.replace(".amp.", ".", 1)
+    return host, path
+
+
+def canonicalize_url(
+    url: Optional[str],
+    drop_params: Sequence[str] = settings.CANONICAL_URL_DROP_PARAMS,
+    strip_www: bool = settings.CANONICAL_URL_STRIP_WWW,
+) -> Optional[str]:
+    """
+    Normalized form of a URL, the same for the variants under which feeds publish one page.
+
+    The scheme is always https and the host is lower-cased, without a default port and, when
+    `strip_www` is set, without "www.". AMP versions map to the regular page, tracking parameters
+    are dropped and the remaining ones sorted, and the fragment and any trailing slash are removed.
+
+    Args:
+        url: URL to normalize
+        drop_params: Query parameters to remove, as shell-style patterns (e.g. "utm_*")
+        strip_www: Whether example.com and www.example.com are the same site
+
+    Returns:
+        The canonical URL, or None if `url` is empty or not an absolute http(s) URL
+    """
+    if not url:
+        return None
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.rstrip(".")
+    host, path = _strip_amp(host, parts.path)
+    if strip_www and host.startswith("www."):
+        host = host[len("www."):]
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS[parts.scheme.lower()]:
+        host = f"{host}:{port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not any(fnmatchcase(key.lower(), pattern) for pattern in drop_params)
+    )
+    return urlunsplit(("https", host, path.rstrip("/"), urlencode(query), ""))
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import socket
+from typing import Optional, Set
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from digest.config.settings import settings
+from digest.database.repositories.leases import LeaseRepository
+from digest.retrieval.task_manager import ERROR_RETRY_DELAY, TaskManager
+
+
+class IngestWorker:
+    """
+    Ingest worker for distributed mode.
+
+    Instead of scheduling sources in memory, the worker claims due sources from the `source_lease`
+    table, fetches them and releases them with their next due time. Claims skip rows locked by other
+    workers and leases expire, so any number of workers on any number of nodes can share the sources
+    without fetching one twice, and the sources of a crashed worker are picked up after
+    `lease_seconds`. Sources created through the API get their lease row right away; the worker
+    adds the rows of any others (e.g. inserted directly into the database) every `sync_interval`.
+    """
+
+    def __init__(
+        self,
+        task_manager: TaskManager,
+        session_factory: async_sessionmaker,
+        worker_id: Optional[str] = None,
+        concurrency: int = settings.FETCH_CONCURRENCY,
+        lease_seconds: float = settings.INGEST_LEASE_SECONDS,
+        poll_interval: float = settings.INGEST_POLL_INTERVAL,
+        sync_interval: float = settings.RECONCILE_INTERVAL,
+    ):
+        """
+        Initialize the worker.
+
+        Args:
+            task_manager: Runs the fetches, with the same failure handling as local mode
+            session_factory: Factory for the short-lived sessions used to claim and release sources
+            worker_id: Lease owner name, unique per worker; defaults to host, pid and a random suffix
+            concurrency: Maximum number of sources fetched at the same time
+            lease_seconds: How long a claimed source stays reserved for this worker
+            poll_interval: Seconds between claims when no fetch finished in between
+            sync_interval: Seconds between checks for sources without a lease row
+        """
+        self.task_manager = task_manager
+        self.session_factory = session_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.sync_interval = sync_interval
+
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def run(self) -> None:
+        """Claim and fetch due sources until cancelled."""
+        self._wakeup = asyncio.Event()
+        print(f"Ingest worker {self.worker_id} started")
+        loop = asyncio.get_running_loop()
+        next_sync = loop.time()
+        while True:
+            if loop.time() >= next_sync:
+                await self._ensure_leases()
+                next_sync = loop.time() + self.sync_interval
+            free = self.concurrency - len(self._tasks)
+            claimed = await self._claim(free) if free > 0 else []
+            for source_id in claimed:
+                task = asyncio.create_task(self._process(source_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._task_done)
+
+            # A full batch means more sources may be due, claim again as soon as a slot is free
+            if claimed and len(claimed) == free:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        """Cancel running fetches. Their leases expire and the sources are claimed again later."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _ensure_leases(self) -> None:
+        try:
+            async with self.session_factory() as session:
+                await LeaseRepository(session).ensure_all()
+        except Exception as e:
+            print(f"Error creating missing leases: {str(e)}")
+
+    async def _claim(self, limit: int) -> list:
+        try:
+            async with self.session_factory() as session:
+                return await LeaseRepository(session).claim(self.worker_id, limit, self.lease_seconds)
+        except Exception as e:
+            print(f"Error claiming sources: {str(e)}")
+            return []
+
+    async def _process(self, source_id: str) -> None:
+        delay = ERROR_RETRY_DELAY
+        failures = 0
+        try:
+            async with self.session_factory() as session:
+                lease = await LeaseRepository(session).get(source_id)
+            failures = lease.consecutive_failures if lease else 0
+
+            source, state = await self.task_manager.load_source(source_id)
+            parser = self.task_manager.create_parser(source, state)
+            # Failures are counted in the lease row, so backoff keeps growing whichever worker fetches next
+            self.task_manager.failures[source_id] = failures
+            try:
+                delay = await self.task_manager.fetch_source(source, parser)
+            finally:
+                failures = self.task_manager.failures.pop(source_id, 0)
+        except Exception as e:
+            print(f"Error fetching source {source_id}: {str(e)}")
+        finally:
+            await self._release(source_id, delay, failures)
+
+    async def _release(self, source_id: str, delay: float, failures: int) -> None:
+        try:
+            async with self.session_factory() as session:
+                released = await LeaseRepository(session).release(source_id, self.worker_id, delay, failures)
+            if not released:
+                print(f"Lease on source {source_id} expired before the fetch finished")
+        except Exception as e:
+            print(f"Error releasing source {source_id}: {str(e)}")
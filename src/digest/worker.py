@@ -0,0 +1,30 @@
+"""
+Ingest worker entrypoint for distributed mode (INGEST_MODE=distributed).
+
+Run as many as needed, on any number of nodes, against the same database:
+    python -m digest.worker
+"""
+import asyncio
+
+from digest.database.session import async_engine, async_session_maker
+from digest.retrieval.http import close_http_client
+from digest.retrieval.parse_pool import close_parse_pool
+from digest.retrieval.task_manager import task_manager
+from digest.retrieval.worker import IngestWorker
+
+
+async def main():
+    worker = IngestWorker(task_manager, async_session_maker)
+    try:
+        await worker.run()
+    finally:
+        await worker.stop()
+        # Content of the cancelled fetches that was handed over already is still stored
+        await task_manager.ingest.close()
+        await close_http_client()
+        close_parse_pool()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from digest.api.router import api_router
+from digest.api.v1.endpoints import sources as sources_endpoints
+from digest.config.settings import settings
+
+
+class FakeSourceRepository:
+    """In-memory stand-in for AsyncSourceRepository, shared by all sessions."""
+
+    def __init__(self, source_ids):
+        self.source_ids = set(source_ids)
+
+    def __call__(self, session):
+        return self
+
+    async def delete(self, source_id):
+        if source_id not in self.source_ids:
+            return False
+        self.source_ids.discard(source_id)
+        return True
+
+
+class FakeTaskManager:
+    def __init__(self):
+        self.reconciled = []
+
+    async def reconcile_source(self, source_id):
+        self.reconciled.append(source_id)
+        return "stopped"
+
+
+@pytest.fixture
+def task_manager(monkeypatch):
+    task_manager = FakeTaskManager()
+    monkeypatch.setattr(sources_endpoints, "task_manager", task_manager)
+    monkeypatch.setattr(sources_endpoints, "AsyncSourceRepository", FakeSourceRepository(["source-1"]))
+    return task_manager
+
+
+@pytest.mark.asyncio
+async def test_delete_source_reconciles_in_local_mode(task_manager, monkeypatch):
+    """Test that deleting a source stops its parser right away instead of at the next reconcile."""
+    monkeypatch.setattr(settings, "INGEST_MODE", "local")
+
+    await sources_endpoints.delete_source("source-1", session=SimpleNamespace())
+
+    assert task_manager.reconciled == ["source-1"]
+
+
+@pytest.mark.asyncio
+async def test_delete_source_leaves_distributed_workers_alone(task_manager, monkeypatch):
+    """Test that in distributed mode the API process has no parsers to stop."""
+    monkeypatch.setattr(settings, "INGEST_MODE", "distributed")
+
+    await sources_endpoints.delete_source("source-1", session=SimpleNamespace())
+
+    assert task_manager.reconciled == []
+
+
+@pytest.mark.asyncio
+async def test_delete_unknown_source(task_manager):
+    """Test that deleting a source that doesn't exist is a 404 and reconciles nothing."""
+    with pytest.raises(HTTPException) as error:
+        await sources_endpoints.delete_source("missing", session=SimpleNamespace())
+
+    assert error.value.status_code == 404
+    assert task_manager.reconciled == []
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/sources/breakers", "/sources/source-1/schedule", "/sources/source-1/fetch-jobs",
+     "/retrieval/scheduler", "/fetch-jobs/job-1"],
+)
+def test_fetch_loop_state_unavailable_in_distributed_mode(path, monkeypatch):
+    """Test that the API doesn't report its own idle fetch loop while the workers run the real one."""
+    monkeypatch.setattr(settings, "INGEST_MODE", "distributed")
+    app = FastAPI()
+    app.include_router(api_router)
+
+    response = TestClient(app).get(path)
+
+    assert response.status_code == 409
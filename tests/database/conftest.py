@@ -0,0 +1,66 @@
+import pytest
+from pgvector.asyncpg import register_vector
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digest.config.settings import settings
+from digest.database.session import get_async_database_url
+
+# Separate from the database of tests/retrieval/sources, so both test modules can run in one session
+TEST_DB_NAME = "test_digest_repositories"
+
+
+def get_test_db_url():
+    """Get the test database URL."""
+    base_url = settings.DATABASE_URL.rsplit('/', 1)[0]
+    return f"{base_url}/{TEST_DB_NAME}"
+
+
+@pytest.fixture(scope="session")
+def db_url():
+    """Create the test database with all tables, and drop it after the session."""
+    engine = create_engine(settings.DATABASE_URL, isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        conn.execute(text(f"DROP DATABASE IF EXISTS {TEST_DB_NAME}"))
+        conn.execute(text(f"CREATE DATABASE {TEST_DB_NAME}"))
+    engine.dispose()
+
+    test_engine = create_engine(get_test_db_url())
+    with test_engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    SQLModel.metadata.create_all(test_engine)
+    test_engine.dispose()
+
+    yield get_test_db_url()
+
+    engine = create_engine(settings.DATABASE_URL, isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        conn.execute(text(f"""
+            SELECT pg_terminate_backend(pg_stat_activity.pid)
+            FROM pg_stat_activity
+            WHERE pg_stat_activity.datname = '{TEST_DB_NAME}'
+            AND pid <> pg_backend_pid()
+        """))
+        conn.execute(text(f"DROP DATABASE IF EXISTS {TEST_DB_NAME}"))
+    engine.dispose()
+
+
+@pytest.fixture
+async def session_factory(db_url):
+    """Factory for async sessions on the test database, emptied after each test."""
+    engine = create_async_engine(get_async_database_url(db_url))
+    event.listen(engine.sync_engine, "connect", lambda connection, _: connection.run_async(register_vector))
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    yield factory
+    async with engine.begin() as conn:
+        await conn.execute(text("TRUNCATE source, content_piece CASCADE"))
+    await engine.dispose()
+
+
+@pytest.fixture
+async def session(session_factory):
+    """Create an async test database session."""
+    async with session_factory() as session:
+        yield session
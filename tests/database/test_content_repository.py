@@ -0,0 +1,146 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from digest.config.settings import settings
+from digest.database.enums import ContentType, SourceType
+from digest.database.models.content import ContentPiece
+from digest.database.models.source import Source
+from digest.database.repositories.content import AsyncContentRepository
+
+
+def piece(content_id, url=None, content="Some content", **fields):
+    return ContentPiece(
+        id=content_id,
+        title=f"Title of {content_id}",
+        content=content,
+        url=url or f"https://example.com/{content_id}",
+        source_id="source-1",
+        metainfo={"language": "english"},
+        **fields,
+    )
+
+
+@pytest.fixture
+async def repo(session):
+    """Content repository with one source to store content for."""
+    session.add(Source(id="source-1", name="Source 1", source_type=SourceType.RSS, parser_id="rss"))
+    await session.commit()
+    return AsyncContentRepository(session)
+
+
+class TestAsyncContentRepository:
+    """Tests for the AsyncContentRepository class against PostgreSQL."""
+
+    async def test_near_duplicates_are_not_processed(self, repo):
+        """Test that pieces linked to an original are left out of processing and of the fingerprint index."""
+        await repo.bulk_insert([piece("original", simhash=42)])
+        await repo.bulk_insert([piece("copy", simhash=43, duplicate_of="original")])
+
+        assert [p.id for p in await repo.get_unprocessed()] == ["original"]
+        assert await repo.get_recent_fingerprints(10) == [("original", 42)]
+
+    async def test_deleting_original_unlinks_duplicates(self, repo):
+        """Test that removing an original keeps its duplicates, which are then processed like any piece."""
+        await repo.bulk_insert([piece("original", simhash=42)])
+        await repo.bulk_insert([piece("copy", simhash=43, duplicate_of="original")])
+
+        await repo.delete("original")
+
+        copy = await repo.get_by_id("copy")
+        await repo.session.refresh(copy)
+        assert copy.duplicate_of is None
+        assert [p.id for p in await repo.get_unprocessed()] == ["copy"]
+
+    async def test_bulk_insert_skips_same_canonical_url(self, repo):
+        """Test that a page stored under another URL variant is skipped instead of failing the batch."""
+        await repo.bulk_insert([piece("first", url="https://www.example.com/story?utm_source=feed")])
+
+        inserted = await repo.bulk_insert([
+            piece("amp", url="https://example.com/story/amp"),
+            piece("other", url="https://example.com/other"),
+        ])
+
+        assert inserted == ["other"]
+        assert (await repo.get_by_id("first")).canonical_url == "https://example.com/story"
+
+    async def test_bulk_load_skips_same_canonical_url(self, repo):
+        """Test that COPY loading skips pieces whose canonical URL is stored, including within the batch."""
+        await repo.bulk_insert([piece("first", url="https://example.com/story")])
+
+        inserted = await repo.bulk_load([
+            piece("tracked", url="https://example.com/story?utm_medium=rss"),
+            piece("new", url="https://example.com/new"),
+            piece("new-again", url="https://example.com/new/"),
+        ])
+
+        assert inserted == ["new"]
+
+    async def test_upsert_inserts_new_and_updates_changed(self, repo):
+        """Test that upsert inserts new pieces, skips unchanged ones and keeps the replaced version."""
+        await repo.upsert([piece("kept", content="Unchanged"), piece("edited", content="First version")])
+
+        written = await repo.upsert([
+            piece("kept", content="Unchanged"),
+            piece("edited", content="Second version"),
+            piece("new"),
+        ])
+
+        assert sorted(written) == ["edited", "new"]
+        edited = await repo.get_by_id("edited")
+        await repo.session.refresh(edited)
+        assert edited.content == "Second version"
+        assert edited.processed is False
+        assert [revision.content for revision in await repo.get_revisions("edited")] == ["First version"]
+        assert await repo.get_revisions("kept") == []
+
+    async def test_upsert_rebuilds_search_vectors(self, repo):
+        """Test that the tsvector trigger runs for updated pieces, so search finds the new text."""
+        await repo.upsert([piece("edited", content="Original wording")])
+        await repo.upsert([piece("edited", content="Replacement wording")])
+
+        edited = await repo.get_by_id("edited")
+        await repo.session.refresh(edited)
+        assert "replac" in edited.content_tsv
+
+    async def test_upsert_prunes_old_revisions(self, repo, monkeypatch):
+        """Test that only the CONTENT_REVISIONS_KEPT most recent revisions of a piece are kept."""
+        monkeypatch.setattr(settings, "CONTENT_REVISIONS_KEPT", 2)
+        for version in range(5):
+            await repo.upsert([piece("edited", content=f"Version {version}")])
+
+        revisions = await repo.get_revisions("edited")
+        assert [revision.content for revision in revisions] == ["Version 3", "Version 2"]
+
+    async def test_upsert_hashes_pieces_stored_without_hash(self, repo):
+        """Test that a piece stored before content hashes is only updated when its text really changed."""
+        await repo.bulk_insert([piece("legacy", content="Old text")])
+        await repo.session.execute(
+            update(ContentPiece).where(ContentPiece.id == "legacy").values(content_hash=None)
+        )
+        await repo.session.commit()
+
+        assert await repo.upsert([piece("legacy", content="Old text")]) == []
+        assert await repo.upsert([piece("legacy", content="New text")]) == ["legacy"]
+
+    async def test_bulk_load_copies_and_merges_in_chunks(self, repo):
+        """Test that COPY loading stores every column, skips stored IDs and commits chunk by chunk."""
+        await repo.bulk_insert([piece("piece-0")])
+        published = datetime(2024, 1, 1, 9, 0)
+        pieces = [
+            piece(f"piece-{i}", author="Author", published_at=published, embedding=[0.5] * 768, simhash=-i)
+            for i in range(5)
+        ]
+
+        inserted = await repo.bulk_load(pieces, chunk_size=2)
+
+        assert sorted(inserted) == ["piece-1", "piece-2", "piece-3", "piece-4"]
+        stored = await repo.get_by_id("piece-3")
+        assert stored.author == "Author"
+        assert stored.published_at == published
+        assert stored.content_type == ContentType.ARTICLE
+        assert stored.metainfo == {"language": "english"}
+        assert stored.simhash == -3
+        assert list(stored.embedding) == [0.5] * 768
+        assert stored.content_tsv
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from digest.database.enums import SourceType
+from digest.database.models.source import Source, SourceLease
+from digest.database.repositories.leases import LeaseRepository
+
+
+@pytest.fixture
+async def sources(session):
+    """Three enabled sources and a disabled one, none of them retrieved yet."""
+    sources = [
+        Source(
+            id=f"source-{i}", name=f"Source {i}", source_type=SourceType.RSS, parser_id="rss", enabled=i < 3
+        )
+        for i in range(4)
+    ]
+    session.add_all(sources)
+    await session.commit()
+    return sources
+
+
+class TestLeaseRepository:
+    """Tests for the LeaseRepository class against PostgreSQL."""
+
+    async def test_ensure_all_creates_missing_leases_only(self, session, sources):
+        """Test that lease rows are created for sources without one, leaving existing rows alone."""
+        leases = LeaseRepository(session)
+        await leases.mark_due("source-0")
+        await session.execute(
+            update(SourceLease).where(SourceLease.source_id == "source-0").values(consecutive_failures=4)
+        )
+        await session.commit()
+
+        await leases.ensure_all()
+
+        assert (await leases.get("source-0")).consecutive_failures == 4
+        for source in sources[1:]:
+            assert await leases.get(source.id) is not None
+
+    async def test_concurrent_claims_skip_locked_rows(self, session_factory, sources):
+        """Test that concurrent claims split the due sources between them and never claim disabled ones."""
+        async with session_factory() as session:
+            await LeaseRepository(session).ensure_all()
+
+        async def claim(owner):
+            async with session_factory() as session:
+                return await LeaseRepository(session).claim(owner, 2, 300)
+
+        claimed = await asyncio.gather(claim("w1"), claim("w2"), claim("w3"))
+
+        all_claimed = [source_id for ids in claimed for source_id in ids]
+        assert sorted(all_claimed) == ["source-0", "source-1", "source-2"]
+        async with session_factory() as session:
+            assert await LeaseRepository(session).claim("w4", 10, 300) == []
+
+    async def test_claim_takes_expired_leases(self, session, sources):
+        """Test that a source leased by a worker that stopped is claimed again once the lease expires."""
+        leases = LeaseRepository(session)
+        await leases.ensure_all()
+        assert sorted(await leases.claim("crashed", 10, 300)) == ["source-0", "source-1", "source-2"]
+
+        # As if the lease ran out: claims make a source due again when its lease expires
+        expired = datetime.utcnow() - timedelta(seconds=1)
+        await session.execute(update(SourceLease).values(expires_at=expired, next_fetch_at=expired))
+        await session.commit()
+
+        assert sorted(await leases.claim("w1", 10, 300)) == ["source-0", "source-1", "source-2"]
+        assert await leases.release("source-0", "crashed", 3600, 0) is False
+
+    async def test_release_sets_next_fetch(self, session, sources):
+        """Test that a released source is not claimed again before its next fetch time."""
+        leases = LeaseRepository(session)
+        await leases.ensure_all()
+        await leases.claim("w1", 10, 300)
+
+        assert await leases.release("source-0", "w1", 3600, 2) is True
+
+        lease = await leases.get("source-0")
+        await session.refresh(lease)
+        assert lease.owner is None
+        assert lease.consecutive_failures == 2
+        assert lease.next_fetch_at > datetime.utcnow() + timedelta(minutes=50)
+        assert await leases.claim("w2", 10, 300) == []
+
+    async def test_mark_due_during_fetch_survives_release(self, session, sources):
+        """Test that a fetch requested while a source is leased isn't overwritten by the release."""
+        leases = LeaseRepository(session)
+        await leases.ensure_all()
+        await leases.claim("w1", 10, 300)
+
+        await leases.mark_due("source-0")
+        await leases.release("source-0", "w1", 3600, 0)
+        await leases.release("source-1", "w1", 3600, 0)
+
+        assert await leases.claim("w2", 10, 300) == ["source-0"]
@@ -1,10 +1,29 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from pathlib import Path
 from pydantic import HttpUrl
+import httpx
 import pytest
 import asyncio
-from unittest.mock import patch, MagicMock
+import feedparser
+from unittest.mock import patch
 
-from digest.retrieval.parsers.rss import RssParser
+from digest.config.settings import settings
+from digest.retrieval.http import HttpClient
+from digest.retrieval.parsers.base import FetchError, FetchStats
+from digest.retrieval.parsers.rss import RssParser, parse_feed
 from digest.database.models.content import ContentPiece
+from digest.database.models.source import SourceFetchState
+from digest.retrieval.seen import SeenCache
+
+
+def mock_http(handler):
+    """Patch the shared HTTP client so requests are answered by `handler`."""
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    return patch("digest.retrieval.parsers.base.get_http_client", return_value=client)
+
+
+FIXTURES = Path(__file__).parents[2] / "fixtures" / "feeds"
 
 
 class TestRssParser:
@@ -38,10 +57,8 @@ class TestRssParser:
     @pytest.mark.asyncio
     async def test_fetch(self):
         """Test fetching content from an RSS feed."""
-        # Mock the requests.get response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.text = """
+        # Mock the HTTP response
+        feed_xml = """
         <rss version="2.0">
             <channel>
                 <title>Test Feed</title>
@@ -62,32 +79,20 @@ class TestRssParser:
             </channel>
         </rss>
         """
-        # Mock the feedparser.parse result
-        mock_feed = MagicMock()
-        mock_feed.feed.title = "Test Feed"
-        mock_feed.entries = [
-            {
-                "title": "Test Item 1",
-                "link": "https://example.com/item1",
-                "description": "This is test item 1",
-                "published_parsed": (2023, 1, 1, 12, 0, 0, 0, 1, 0),
-                "id": "https://example.com/item1"
-            },
-            {
-                "title": "Test Item 2",
-                "link": "https://example.com/item2",
-                "description": "This is test item 2",
-                "published_parsed": (2023, 1, 2, 12, 0, 0, 0, 2, 0),
-                "id": "https://example.com/item2"
-            }
-        ]
-        
-        with patch("requests.get", return_value=mock_response), \
-             patch("feedparser.parse", return_value=mock_feed):
-            
+        mock_response = httpx.Response(
+            200,
+            text=feed_xml,
+            headers={"ETag": '"abc"', "Last-Modified": "Mon, 02 Jan 2023 12:00:00 GMT"},
+        )
+
+        with mock_http(lambda request: mock_response), \
+             patch("feedparser.parse") as mock_parse:
+
             parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
             content_pieces = await parser.fetch()
-            
+
+            # Well-formed feeds are parsed by the lxml fast path
+            mock_parse.assert_not_called()
             # Check the results
             assert len(content_pieces) == 2
             assert all(isinstance(piece, ContentPiece) for piece in content_pieces)
@@ -97,15 +102,252 @@ class TestRssParser:
             assert content_pieces[1].url == "https://example.com/item2"
             assert content_pieces[0].source_id == "test-source"
             assert content_pieces[1].source_id == "test-source"
+            assert parser.fetch_state.etag == '"abc"'
+            assert parser.fetch_state.last_modified == "Mon, 02 Jan 2023 12:00:00 GMT"
+    
+    @pytest.mark.asyncio
+    async def test_fetch_with_feedparser(self, monkeypatch):
+        """Test fetching an RSS feed with the fast path turned off, so feedparser parses it."""
+        monkeypatch.setattr(settings, "RSS_FAST_PATH", False)
+        feed_xml = (FIXTURES / "news.rss").read_bytes()
+
+        with mock_http(lambda request: httpx.Response(200, content=feed_xml)), \
+             patch("feedparser.parse", wraps=feedparser.parse) as mock_parse:
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
+            content_pieces = await parser.fetch()
+
+        mock_parse.assert_called_once()
+        expected = parser._pieces_from_entries(*parse_feed(feed_xml, fast_path=True))
+        assert [piece.url for piece in content_pieces] == [piece.url for piece in expected]
+        assert len(content_pieces) > 0
+
+    @pytest.mark.asyncio
+    async def test_fetch_sends_validators(self):
+        """Test that stored validators are sent as conditional request headers."""
+        requests = []
+        
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(304)
+        
+        state = SourceFetchState(
+            source_id="test-source", etag='"abc"', last_modified="Mon, 02 Jan 2023 12:00:00 GMT"
+        )
+        
+        with mock_http(handler), patch("feedparser.parse") as mock_parse:
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml"}, state)
+            content_pieces = await parser.fetch()
+            
+            headers = requests[0].headers
+            assert headers["If-None-Match"] == '"abc"'
+            assert headers["If-Modified-Since"] == "Mon, 02 Jan 2023 12:00:00 GMT"
+            # A 304 skips parsing entirely and keeps the validators
+            assert content_pieces == []
+            mock_parse.assert_not_called()
+            assert parser.fetch_state.etag == '"abc"'
+            assert parser.stats.unchanged == "not_modified"
+    
+    @pytest.mark.asyncio
+    async def test_fetch_skips_identical_body(self):
+        """Test that a body identical to the last one is not parsed again."""
+        body = (FIXTURES / "news.rss").read_bytes()
+        state = SourceFetchState(source_id="test-source")
+        
+        with mock_http(lambda request: httpx.Response(200, content=body)):
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml"}, state)
+            first = await parser.fetch()
+            assert first and state.body_hash
+            assert parser.stats.unchanged is None
+            
+            parser.stats = FetchStats()
+            with patch("digest.retrieval.parsers.rss.parse_feed") as mock_parse:
+                second = await parser.fetch()
+            
+            assert second == []
+            mock_parse.assert_not_called()
+            assert parser.stats.unchanged == "same_body"
+            assert parser.stats.entries is None
+    
+    @pytest.mark.asyncio
+    async def test_fetch_skips_seen_entries(self):
+        """Test that entries already in the seen cache are not turned into content pieces."""
+        feed_xml = """
+        <rss version="2.0">
+            <channel>
+                <title>Test Feed</title>
+                <item><guid>item-1</guid><title>Old</title><link>https://example.com/item1</link></item>
+                <item><guid>item-2</guid><title>New</title><link>https://example.com/item2</link></item>
+            </channel>
+        </rss>
+        """
+        
+        with mock_http(lambda request: httpx.Response(200, text=feed_xml)):
+            seen = SeenCache()
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml"}, seen=seen)
+            first = await parser.fetch()
+            seen.add("test-source", [first[0].id])
+            # Otherwise the identical body is skipped before the seen check
+            parser.fetch_state.body_hash = None
+            
+            content_pieces = await parser.fetch()
+            
+            assert [piece.title for piece in content_pieces] == ["New"]
+            assert parser.stats.entries == 2
+    
+    @pytest.mark.asyncio
+    async def test_fetch_with_upsert_rebuilds_changed_entries(self):
+        """Test that with CONTENT_UPSERT, a seen entry whose content changed is turned into a piece again."""
+        feed = """
+        <rss version="2.0">
+            <channel>
+                <title>Test Feed</title>
+                <item><guid>item-1</guid><title>Same</title><link>https://example.com/item1</link></item>
+                <item><guid>item-2</guid><title>{title}</title><link>https://example.com/item2</link></item>
+            </channel>
+        </rss>
+        """
+        title = "Draft"
+
+        with mock_http(lambda request: httpx.Response(200, text=feed.format(title=title))), \
+             patch.object(settings, "CONTENT_UPSERT", True):
+            seen = SeenCache()
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml"}, seen=seen)
+            first = await parser.fetch()
+            seen.add("test-source", [piece.id for piece in first], [piece.content_hash for piece in first])
+            title = "Corrected"
+
+            content_pieces = await parser.fetch()
+
+        assert [piece.title for piece in content_pieces] == ["Corrected"]
+        assert content_pieces[0].content_hash == ContentPiece.compute_hash("Corrected", "")
+        assert content_pieces[0].content_hash != first[1].content_hash
+
+    @pytest.mark.asyncio
+    async def test_fetch_streaming_stops_at_watermark(self):
+        """Test that streaming mode stops at the first entry older than the newest one seen."""
+        items = "".join(
+            f"<item><guid>item-{day}</guid><title>Day {day}</title><link>https://example.com/{day}</link>"
+            f"<pubDate>{day:02d} Jan 2024 12:00:00 GMT</pubDate></item>"
+            for day in (5, 4, 3, 2, 1)
+        )
+        feed_xml = f"<rss version='2.0'><channel><title>Test Feed</title>{items}</channel></rss>"
+        state = SourceFetchState(source_id="test-source", newest_published_at=datetime(2024, 1, 3, 12, 0))
+        
+        with mock_http(lambda request: httpx.Response(200, text=feed_xml, headers={"ETag": '"v2"'})), \
+             patch("feedparser.parse") as mock_parse:
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml", "stream": True}, state)
+            content_pieces = await parser.fetch()
+            
+            mock_parse.assert_not_called()
+            assert [piece.title for piece in content_pieces] == ["Day 5", "Day 4", "Day 3"]
+            assert content_pieces[0].metainfo["feed_title"] == "Test Feed"
+            assert parser.fetch_state.newest_published_at == datetime(2024, 1, 5, 12, 0)
+            assert parser.fetch_state.etag == '"v2"'
+    
+    @pytest.mark.asyncio
+    async def test_fetch_streaming_future_dated_entry(self):
+        """Test that a future-dated entry doesn't pin the watermark and hide entries published after it."""
+        def item(guid, published):
+            return (f"<item><guid>{guid}</guid><title>{guid}</title><link>https://example.com/{guid}</link>"
+                    f"<pubDate>{format_datetime(published, usegmt=True)}</pubDate></item>")
+
+        pinned = item("pinned", datetime(2100, 1, 1, tzinfo=timezone.utc))
+        old = item("old", datetime(2024, 1, 1, tzinfo=timezone.utc))
+        feed_xml = f"<rss version='2.0'><channel><title>Test Feed</title>{pinned}{old}</channel></rss>"
+
+        with mock_http(lambda request: httpx.Response(200, text=feed_xml)):
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml", "stream": True})
+            first = await parser.fetch()
+            assert parser.fetch_state.newest_published_at <= datetime.utcnow()
+
+            # A fresh entry, published after the first fetch, shows up below the pinned one
+            fresh = item("fresh", datetime.now(timezone.utc) + timedelta(minutes=5))
+            feed_xml = (
+                f"<rss version='2.0'><channel><title>Test Feed</title>{pinned}{fresh}{old}</channel></rss>"
+            )
+            second = await parser.fetch()
+
+        assert [piece.title for piece in first] == ["pinned", "old"]
+        assert [piece.title for piece in second] == ["pinned", "fresh"]
+
+    @pytest.mark.asyncio
+    async def test_fetch_streaming_ignores_future_watermark(self):
+        """Test that a watermark stored in the future, before it was capped, doesn't stop streaming."""
+        feed_xml = ("<rss version='2.0'><channel><title>Test Feed</title><item><guid>item-1</guid>"
+                    "<title>Item</title><pubDate>01 Jan 2024 12:00:00 GMT</pubDate></item></channel></rss>")
+        state = SourceFetchState(source_id="test-source", newest_published_at=datetime(2100, 1, 1))
+
+        with mock_http(lambda request: httpx.Response(200, text=feed_xml)):
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml", "stream": True}, state)
+            content_pieces = await parser.fetch()
+
+        assert [piece.title for piece in content_pieces] == ["Item"]
+        assert parser.fetch_state.newest_published_at <= datetime.utcnow()
+
+    @pytest.mark.asyncio
+    async def test_fetch_streaming_falls_back_to_feedparser(self):
+        """Test that a feed that isn't well-formed XML is still parsed, by feedparser."""
+        feed_xml = "<rss version='2.0'><channel><title>Broken & Feed</title>" \
+                   "<item><title>Item</title><link>https://example.com/1</link></item></channel></rss>"
+        
+        with mock_http(lambda request: httpx.Response(200, text=feed_xml)):
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml", "stream": True})
+            content_pieces = await parser.fetch()
+            
+            assert [piece.url for piece in content_pieces] == ["https://example.com/1"]
+    
+    @pytest.mark.parametrize("fixture", ["news.rss", "blog.atom"])
+    def test_fast_path_matches_feedparser(self, fixture):
+        """Test that the lxml fast path yields the same pieces as feedparser on real-world feeds."""
+        body = (FIXTURES / fixture).read_bytes()
+        parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
+
+        fast = parser._pieces_from_entries(*parse_feed(body, fast_path=True))
+        slow = parser._pieces_from_entries(*parse_feed(body, fast_path=False))
+
+        assert len(fast) == len(slow) > 0
+        fields = ["id", "title", "url", "author", "published_at", "content"]
+        for fast_piece, slow_piece in zip(fast, slow):
+            assert [getattr(fast_piece, f) for f in fields] == [getattr(slow_piece, f) for f in fields]
+            assert fast_piece.metainfo == slow_piece.metainfo
+
+    @pytest.mark.asyncio
+    async def test_fetch_malformed_feed_falls_back_to_feedparser(self):
+        """Test that a feed that is not well-formed XML is still parsed, by feedparser."""
+        feed_xml = b"""<rss version="2.0"><channel><title>Broken & Co</title>
+            <item><title>Unescaped & title</title><link>https://example.com/1</link></item>
+        </channel></rss>"""
+        with mock_http(lambda request: httpx.Response(200, content=feed_xml)):
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
+            content_pieces = await parser.fetch()
+
+        assert [piece.url for piece in content_pieces] == ["https://example.com/1"]
+        assert parser.stats.entries == 1
+
+    @pytest.mark.asyncio
+    async def test_fetch_records_bytes_and_enforces_max_bytes(self):
+        """Test that downloaded bytes are recorded and feeds above max_bytes fail the fetch."""
+        body = (FIXTURES / "news.rss").read_bytes()
+        
+        async def stream():
+            yield body
+        
+        with mock_http(lambda request: httpx.Response(200, content=stream())):
+            parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
+            await parser.fetch()
+            assert parser.stats.bytes_downloaded == len(body)
+        
+        with mock_http(lambda request: httpx.Response(200, content=body)):
+            for streaming in (False, True):
+                config = {"url": "https://example.com/feed.xml", "max_bytes": 1000, "stream": streaming}
+                parser = RssParser("test-source", config)
+                with pytest.raises(FetchError):
+                    await parser.fetch()
     
     @pytest.mark.asyncio
     async def test_fetch_http_error(self):
         """Test fetching content with an HTTP error."""
-        # Mock the requests.get response
-        mock_response = MagicMock()
-        mock_response.status_code = 404
-        
-        with patch("requests.get", return_value=mock_response):
+        with mock_http(lambda request: httpx.Response(404)):
             parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
             with pytest.raises(RuntimeError):
                 await parser.fetch()
@@ -113,11 +355,7 @@ class TestRssParser:
     @pytest.mark.asyncio
     async def test_test_connection_success(self):
         """Test testing a connection successfully."""
-        # Mock the requests.head response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        
-        with patch("requests.head", return_value=mock_response):
+        with mock_http(lambda request: httpx.Response(200)):
             parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
             result = await parser.test_connection()
             assert result is True
@@ -125,11 +363,7 @@ class TestRssParser:
     @pytest.mark.asyncio
     async def test_test_connection_failure(self):
         """Test testing a connection with a failure."""
-        # Mock the requests.head response
-        mock_response = MagicMock()
-        mock_response.status_code = 404
-        
-        with patch("requests.head", return_value=mock_response):
+        with mock_http(lambda request: httpx.Response(404)):
             parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
             result = await parser.test_connection()
             assert result is False
@@ -137,8 +371,10 @@ class TestRssParser:
     @pytest.mark.asyncio
     async def test_test_connection_exception(self):
         """Test testing a connection with an exception."""
-        # Mock the requests.head to raise an exception
-        with patch("requests.head", side_effect=Exception("Connection error")):
+        def handler(request):
+            raise httpx.ConnectError("Connection error")
+        
+        with mock_http(handler):
             parser = RssParser("test-source", {"url": "https://example.com/feed.xml"})
             result = await parser.test_connection()
             assert result is False 
\ No newline at end of file
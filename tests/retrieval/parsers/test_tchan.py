@@ -1,9 +1,32 @@
+import asyncio
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
 import pytest
 
+from digest.database.models.source import SourceFetchState
 from digest.retrieval.parsers.base import ParserRegistry
 from digest.retrieval.parsers.tchan import TchanParser
 
 
+def fake_scraper(message_ids, read=None, on_message=None):
+    """Patch ChannelScraper with one yielding messages with `message_ids`, newest first."""
+    class FakeScraper:
+        def messages(self, channel_name):
+            for message_id in message_ids:
+                if on_message:
+                    on_message()
+                if read is not None:
+                    read.append(message_id)
+                yield SimpleNamespace(
+                    id=message_id, text=f"post {message_id}", author=None, created_at=datetime(2024, 1, 1)
+                )
+
+    return patch("digest.retrieval.parsers.tchan.ChannelScraper", FakeScraper)
+
+
 class TestTchanParser:
     @pytest.mark.asyncio
     async def test_fetch(self):
@@ -28,3 +51,52 @@ class TestTchanParser:
     @pytest.mark.asyncio
     async def check_parser_registry(self):
         assert ParserRegistry.get_parser("tchan") is TchanParser
+
+    @pytest.mark.asyncio
+    async def test_fetch_stops_at_last_message_id(self):
+        """Test that scraping stops at the newest message of the previous fetch and advances the mark."""
+        read = []
+        state = SourceFetchState(source_id="test-source", last_message_id=7)
+        with fake_scraper([10, 9, 8, 7, 6, 5], read=read):
+            parser = TchanParser("test-source", {"channel_name": "tchantest", "limit": 10}, state)
+            content_pieces = await parser.fetch()
+
+        assert [piece.id for piece in content_pieces] == ["test-source10", "test-source9", "test-source8"]
+        assert read == [10, 9, 8, 7]
+        assert parser.stats.entries == 4
+        assert state.last_message_id == 10
+
+    @pytest.mark.asyncio
+    async def test_fetch_runs_off_the_event_loop(self):
+        """Test that the blocking scrape runs in a worker thread."""
+        threads = []
+        with fake_scraper([2, 1], on_message=lambda: threads.append(threading.current_thread())):
+            parser = TchanParser("test-source", {"channel_name": "tchantest", "limit": 10})
+            await parser.fetch()
+
+        assert threads and threading.main_thread() not in threads
+
+    @pytest.mark.asyncio
+    async def test_concurrent_scrapes_are_bounded(self):
+        """Test that no more than TCHAN_MAX_CONCURRENT_SCRAPES channels are scraped at once."""
+        running = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def on_message():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            threading.Event().wait(0.02)
+            with lock:
+                running -= 1
+
+        with fake_scraper([1], on_message=on_message), \
+             patch("digest.retrieval.parsers.tchan.settings.TCHAN_MAX_CONCURRENT_SCRAPES", 2), \
+             patch.object(TchanParser, "_scrape_slots", None):
+            config = {"channel_name": "tchantest", "limit": 10}
+            parsers = [TchanParser(f"source-{i}", config) for i in range(6)]
+            await asyncio.gather(*(parser.fetch() for parser in parsers))
+
+        assert peak == 2
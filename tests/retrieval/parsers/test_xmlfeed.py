@@ -0,0 +1,137 @@
+from datetime import datetime
+
+import pytest
+
+from digest.retrieval.parsers.xmlfeed import FeedStreamParser, FeedSyntaxError
+
+RSS_FEED = b"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/"
+     xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <channel>
+        <title>Test Feed</title>
+        <item>
+            <guid>item-1</guid>
+            <title>First</title>
+            <link>https://example.com/1</link>
+            <description>Summary 1</description>
+            <content:encoded><![CDATA[<p>Content 1</p>]]></content:encoded>
+            <dc:creator>Alice</dc:creator>
+            <pubDate>Tue, 02 Jan 2024 12:00:00 +0100</pubDate>
+            <category>tech</category>
+            <category>ai</category>
+        </item>
+        <item>
+            <title>Second</title>
+            <link>https://example.com/2</link>
+        </item>
+    </channel>
+</rss>
+"""
+
+ATOM_FEED = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+    <title>Atom Feed</title>
+    <entry>
+        <id>urn:entry:1</id>
+        <title>Atom Entry</title>
+        <link rel="self" href="https://example.com/self"/>
+        <link href="https://example.com/atom/1"/>
+        <summary>Atom summary</summary>
+        <author><name>Bob</name></author>
+        <published>2024-01-02T12:00:00Z</published>
+        <category term="science"/>
+    </entry>
+</feed>
+"""
+
+
+def parse(document: bytes, chunk_size: int = 16):
+    parser = FeedStreamParser()
+    entries = []
+    for i in range(0, len(document), chunk_size):
+        entries += parser.feed(document[i:i + chunk_size])
+    entries += parser.close()
+    return parser, entries
+
+
+def test_rss_entries():
+    """Test that RSS 2.0 entries are extracted in small chunks with the fields feedparser gives."""
+    parser, entries = parse(RSS_FEED)
+
+    assert parser.feed_title == "Test Feed"
+    assert len(entries) == 2
+    first, second = entries
+    assert first.id == "item-1"
+    assert first.title == "First"
+    assert first.link == "https://example.com/1"
+    assert first.summary == "Summary 1"
+    assert first.content == "<p>Content 1</p>"
+    assert first.author == "Alice"
+    assert first.published == datetime(2024, 1, 2, 11, 0)
+    assert first.tags == ["tech", "ai"]
+    assert second.id is None
+    assert second.published is None
+
+
+def test_atom_entries():
+    """Test that Atom entries use the alternate link and the author name."""
+    parser, entries = parse(ATOM_FEED)
+
+    assert parser.feed_title == "Atom Feed"
+    assert len(entries) == 1
+    entry = entries[0]
+    assert entry.id == "urn:entry:1"
+    assert entry.link == "https://example.com/atom/1"
+    assert entry.author == "Bob"
+    assert entry.published == datetime(2024, 1, 2, 12, 0)
+    assert entry.tags == ["science"]
+
+
+def test_rss_guid_is_link_unless_not_permalink():
+    """Test that an item without a link uses its guid, like feedparser, unless isPermaLink is false."""
+    _, entries = parse(b"""<rss version="2.0"><channel><title>T</title>
+        <item><guid>https://example.com/guid</guid></item>
+        <item><guid isPermaLink="false">tag:example.com,2024:2</guid></item>
+        <item><guid>https://example.com/guid/3</guid><link>https://example.com/3</link></item>
+    </channel></rss>""")
+
+    assert [entry.link for entry in entries] == ["https://example.com/guid", None, "https://example.com/3"]
+
+
+def test_atom_xhtml_content_is_unwrapped():
+    """Test that XHTML constructs lose their wrapping div and namespace, like feedparser's output."""
+    _, entries = parse(b"""<feed xmlns="http://www.w3.org/2005/Atom"><title>T</title><entry>
+        <title type="xhtml"><div xmlns="http://www.w3.org/1999/xhtml">A <b>bold</b> title</div></title>
+        <content type="xhtml">
+            <div xmlns="http://www.w3.org/1999/xhtml"><p>One &amp; <a href="/x">two</a></p></div>
+        </content>
+        <summary type="html">&lt;p&gt;Escaped&lt;/p&gt;</summary>
+    </entry></feed>""")
+
+    entry = entries[0]
+    assert entry.title == "A <b>bold</b> title"
+    assert entry.content == '<p>One &amp; <a href="/x">two</a></p>'
+    assert entry.summary == "<p>Escaped</p>"
+
+
+def test_entries_are_released():
+    """Test that parsed entries are removed from the tree, so memory doesn't grow with the feed."""
+    parser = FeedStreamParser()
+    parser.feed(b"<rss><channel><title>T</title>")
+    for i in range(100):
+        assert len(parser.feed(f"<item><guid>{i}</guid></item>".encode())) == 1
+    parser.feed(b"</channel></rss>")
+
+    root = parser._parser.close()
+    assert len(list(root.iter("item"))) <= 1
+
+
+@pytest.mark.parametrize("document", [
+    b"<rss><channel><item><title>Unclosed</channel></rss>",
+    b"<html><body>Not a feed</body></html>",
+    b"",
+])
+def test_rejects_malformed_documents(document):
+    """Test that documents that aren't well-formed feeds raise FeedSyntaxError."""
+    with pytest.raises(FeedSyntaxError):
+        parse(document)
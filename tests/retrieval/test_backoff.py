@@ -0,0 +1,68 @@
+import time
+
+from digest.retrieval.backoff import BreakerState, CircuitBreaker, CircuitBreakers, backoff_delay
+
+
+def test_backoff_delay_grows_and_is_capped():
+    """Test that the delay doubles with every failure, stays jittered and never exceeds the cap."""
+    for failures, full in [(1, 10), (2, 20), (3, 40)]:
+        delay = backoff_delay(failures, base_delay=10, max_delay=1000)
+        assert full / 2 <= delay <= full
+
+    assert backoff_delay(30, base_delay=10, max_delay=100) <= 100
+
+
+class TestCircuitBreaker:
+    """Tests for the CircuitBreaker class."""
+
+    def test_opens_after_threshold(self):
+        """Test that the breaker opens after `failure_threshold` consecutive failures."""
+        breaker = CircuitBreaker("example.com", failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.allow()
+
+        breaker.record_failure()
+        assert breaker.state == BreakerState.OPEN
+        assert not breaker.allow()
+        assert 0 < breaker.retry_in() <= 60
+
+    def test_success_resets_failures(self):
+        """Test that a success in between keeps the breaker closed."""
+        breaker = CircuitBreaker("example.com", failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == BreakerState.CLOSED
+
+    def test_half_open_probe(self):
+        """Test that one probe is let through after the reset timeout and its outcome decides the state."""
+        breaker = CircuitBreaker("example.com", failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        time.sleep(0.02)
+        assert breaker.allow()
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert not breaker.allow()
+
+        breaker.record_failure()
+        assert breaker.state == BreakerState.OPEN
+
+        time.sleep(0.02)
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == BreakerState.CLOSED
+        assert breaker.allow()
+
+
+def test_breakers_list_tripped_only():
+    """Test that only breakers that are not closed are listed when asked."""
+    breakers = CircuitBreakers()
+    breakers.get("ok.example.com")
+    broken = breakers.get("down.example.com")
+    broken.failure_threshold = 1
+    broken.record_failure()
+
+    assert {status.host for status in breakers.list()} == {"ok.example.com", "down.example.com"}
+    assert [status.host for status in breakers.list(tripped_only=True)] == ["down.example.com"]
@@ -0,0 +1,66 @@
+import random
+
+from digest.retrieval.dedup import NearDuplicateIndex, hamming_distance, simhash
+
+WORDS = [
+    "market", "shares", "rose", "after", "the", "central", "bank", "said", "rates", "would", "stay", "low",
+    "investors", "expect", "growth", "to", "slow", "next", "year", "analysts", "warned", "of", "risks",
+]
+
+
+def article(seed: int, words: int = 300) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+class TestSimhash:
+    """Tests for the simhash function."""
+
+    def test_near_identical_texts_are_close(self):
+        """Test that a small edit and different markup change few bits, and another text many."""
+        text = article(1)
+        edited = text.replace("market", "stock market", 1) + " Updated at 10:00."
+        wrapped = f"<p>{text}</p><div class='ad'></div>"
+
+        assert simhash(wrapped) == simhash(text)
+        assert hamming_distance(simhash(text), simhash(edited)) <= 3
+        assert hamming_distance(simhash(text), simhash(article(2))) > 10
+
+    def test_fits_bigint(self):
+        """Test that fingerprints are signed 64-bit integers."""
+        for seed in range(20):
+            assert -2 ** 63 <= simhash(article(seed)) < 2 ** 63
+
+    def test_short_text(self):
+        """Test that texts with fewer than min_words words are not fingerprinted."""
+        assert simhash("Breaking: markets rose", min_words=50) is None
+
+
+class TestNearDuplicateIndex:
+    """Tests for the NearDuplicateIndex class."""
+
+    def test_find_within_distance(self):
+        """Test that fingerprints are found up to max_distance bits away, in any band."""
+        index = NearDuplicateIndex(max_distance=3)
+        index.add("original", 0x0123456789ABCDEF)
+
+        assert index.find(0x0123456789ABCDEF ^ (1 << 63 | 1 << 30 | 1)) == "original"
+        assert index.find(0x0123456789ABCDEF ^ 0b1111) is None
+        assert index.find(0x0123456789ABCDEF, exclude="original") is None
+
+    def test_closest_match_wins(self):
+        """Test that the closest of several matches is returned."""
+        index = NearDuplicateIndex(max_distance=3)
+        index.add("far", 0b111)
+        index.add("near", 0b1)
+
+        assert index.find(0) == "near"
+
+    def test_capacity(self):
+        """Test that the oldest fingerprints are evicted beyond capacity."""
+        index = NearDuplicateIndex(capacity=2)
+        index.load([("a", -1), ("b", 0x00FF00FF00FF00FF), ("c", 0)])
+
+        assert len(index) == 2
+        assert index.find(-1) is None
+        assert index.find(0) == "c"
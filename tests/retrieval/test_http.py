@@ -0,0 +1,140 @@
+import asyncio
+import gzip
+import socket
+from unittest.mock import AsyncMock, patch
+
+import httpcore
+import httpx
+import pytest
+
+from digest.retrieval.http import CachingResolverBackend, HttpClient, PooledTransport, ResponseTooLarge
+
+
+class TestCachingResolverBackend:
+    """Tests for the CachingResolverBackend class."""
+
+    @pytest.mark.asyncio
+    async def test_resolve_is_cached(self):
+        """Test that a host is looked up once per TTL."""
+        backend = CachingResolverBackend(ttl=60)
+        infos = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", 443))]
+        loop = asyncio.get_running_loop()
+
+        with patch.object(loop, "getaddrinfo", AsyncMock(return_value=infos)) as getaddrinfo:
+            assert await backend.resolve("example.com", 443) == ["93.184.216.34"]
+            assert await backend.resolve("example.com", 443) == ["93.184.216.34"]
+
+        getaddrinfo.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_ip_literal_is_not_resolved(self):
+        """Test that IP addresses bypass the resolver."""
+        backend = CachingResolverBackend()
+        assert await backend.resolve("127.0.0.1", 80) == ["127.0.0.1"]
+
+
+class TestHttpClient:
+    """Tests for the HttpClient class."""
+
+    @pytest.mark.asyncio
+    async def test_per_host_limit(self):
+        """Test that concurrent requests to one host are capped."""
+        active = 0
+        peak = 0
+
+        async def handler(request):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return httpx.Response(200)
+
+        client = HttpClient(max_connections_per_host=2, transport=httpx.MockTransport(handler))
+        await asyncio.gather(*(client.get("https://example.com/feed.xml") for _ in range(6)))
+        await client.aclose()
+
+        assert peak == 2
+        # Limits of hosts without requests in flight are dropped
+        assert client._host_limits == {}
+
+    @pytest.mark.asyncio
+    async def test_download_decompresses_and_counts_wire_bytes(self):
+        """Test that compression is negotiated and the compressed size is reported."""
+        body = b"<rss>" + b"x" * 10000 + b"</rss>"
+        requests = []
+
+        async def compressed():
+            yield gzip.compress(body)
+
+        def handler(request):
+            requests.append(request)
+            # Streamed, like a real transport; a preloaded body bypasses the byte count
+            return httpx.Response(200, content=compressed(), headers={"Content-Encoding": "gzip"})
+
+        client = HttpClient(transport=httpx.MockTransport(handler))
+        download = await client.download("https://example.com/feed.xml", max_bytes=len(body))
+        await client.aclose()
+
+        assert {"gzip", "deflate", "br"} <= set(requests[0].headers["Accept-Encoding"].split(", "))
+        assert download.content == body
+        assert download.bytes_downloaded == len(gzip.compress(body)) < len(body)
+
+    @pytest.mark.asyncio
+    async def test_download_aborts_past_limit(self):
+        """Test that a body growing past the limit is not read to the end, even when compressed."""
+        sent = 0
+
+        async def chunks():
+            nonlocal sent
+            for _ in range(100):
+                sent += 1
+                yield b"x" * 1000
+
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=chunks()))
+        client = HttpClient(transport=transport)
+        with pytest.raises(ResponseTooLarge):
+            await client.download("https://example.com/feed.xml", max_bytes=5000)
+
+        bomb = gzip.compress(b"x" * 1_000_000)
+        client = HttpClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=bomb, headers={"Content-Encoding": "gzip"})
+        ))
+        with pytest.raises(ResponseTooLarge):
+            await client.download("https://example.com/feed.xml", max_bytes=5000)
+        await client.aclose()
+
+        assert sent < 100
+
+
+
+class TestPooledTransport:
+    """Tests for the PooledTransport class."""
+
+    @pytest.mark.asyncio
+    async def test_requests_go_through_network_backend(self):
+        """Test that connections are opened by the given network backend."""
+        backend = httpcore.AsyncMockBackend([
+            b"HTTP/1.1 200 OK\r\n",
+            b"Content-Type: application/rss+xml\r\n",
+            b"Content-Length: 12\r\n",
+            b"\r\n",
+            b"<rss></rss>\n",
+        ])
+        client = HttpClient(transport=PooledTransport(http2=False, network_backend=backend))
+        response = await client.get("http://example.com/feed.xml")
+        await client.aclose()
+
+        assert response.status_code == 200
+        assert response.text == "<rss></rss>\n"
+
+    @pytest.mark.asyncio
+    async def test_connection_errors_are_httpx_errors(self):
+        """Test that httpcore errors surface as the matching httpx errors."""
+        backend = AsyncMock(spec=httpcore.AsyncNetworkBackend)
+        backend.connect_tcp.side_effect = httpcore.ConnectTimeout("timed out")
+        client = HttpClient(transport=PooledTransport(network_backend=backend))
+
+        with pytest.raises(httpx.ConnectTimeout):
+            await client.get("http://example.com/feed.xml")
+        await client.aclose()
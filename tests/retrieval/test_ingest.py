@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+from digest.database.enums import ContentType
+from digest.database.models.content import ContentPiece
+from digest.database.repositories.content import PartialInsertError
+from digest.retrieval.ingest import IngestBuffer
+
+
+def pieces(*piece_ids):
+    return [
+        ContentPiece(id=piece_id, title="", content="text", content_type=ContentType.ARTICLE,
+                     url=f"https://example.com/{piece_id}", source_id="a")
+        for piece_id in piece_ids
+    ]
+
+
+class FakeStore:
+    """Records every batch and inserts the pieces it hasn't seen, failing batches that contain "bad"."""
+
+    def __init__(self, delay: float = 0, chunk_size: int = 0):
+        self.delay = delay
+        self.chunk_size = chunk_size  # commit this many pieces before failing a bad batch, like bulk_load
+        self.batches = []
+        self.ids = set()
+
+    async def __call__(self, content_pieces):
+        self.batches.append([piece.id for piece in content_pieces])
+        await asyncio.sleep(self.delay)
+        if any(piece.id == "bad" for piece in content_pieces):
+            chunk = content_pieces[:self.chunk_size]
+            committed = [piece.id for piece in chunk if piece.id not in self.ids and piece.id != "bad"]
+            self.ids.update(committed)
+            if committed:
+                raise PartialInsertError("duplicate key value", committed)
+            raise RuntimeError("duplicate key value")
+        new_ids = [piece.id for piece in content_pieces if piece.id not in self.ids]
+        self.ids.update(new_ids)
+        return new_ids
+
+
+class TestIngestBuffer:
+    """Tests for the IngestBuffer class."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_submissions_share_a_flush(self):
+        """Test that submissions within max_delay are stored in one call and each gets its own new IDs."""
+        store = FakeStore()
+        store.ids.add("b2")
+        buffer = IngestBuffer(store, max_rows=100, max_delay=0.05)
+
+        results = await asyncio.gather(
+            buffer.submit(pieces("a1", "a2")),
+            buffer.submit(pieces("b1", "b2")),
+            buffer.submit(pieces("a2", "c1")),
+        )
+        await buffer.close()
+
+        assert store.batches == [["a1", "a2", "b1", "b2", "a2", "c1"]]
+        # A row inserted once is credited to the first submission that had it
+        assert results == [["a1", "a2"], ["b1"], ["c1"]]
+        assert buffer.buffered == 0
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushes_early(self):
+        """Test that max_rows waiting pieces are stored without waiting for max_delay."""
+        store = FakeStore()
+        buffer = IngestBuffer(store, max_rows=3, max_delay=10)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(buffer.submit(pieces("a1", "a2")), buffer.submit(pieces("b1"))), 1
+        )
+        await buffer.close()
+
+        assert results == [["a1", "a2"], ["b1"]]
+        assert store.batches == [["a1", "a2", "b1"]]
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_only_fails_its_source(self):
+        """Test that a failed combined flush is retried per submission."""
+        store = FakeStore()
+        buffer = IngestBuffer(store, max_rows=100, max_delay=0.05)
+
+        results = await asyncio.gather(
+            buffer.submit(pieces("a1")),
+            buffer.submit(pieces("bad")),
+            buffer.submit(pieces("c1")),
+            return_exceptions=True,
+        )
+        await buffer.close()
+
+        assert results[0] == ["a1"] and results[2] == ["c1"]
+        assert isinstance(results[1], RuntimeError)
+        assert store.batches == [["a1", "bad", "c1"], ["a1"], ["bad"], ["c1"]]
+
+    @pytest.mark.asyncio
+    async def test_partial_failure_reports_committed_pieces(self):
+        """Test that pieces committed before a combined flush failed are still reported as new."""
+        store = FakeStore(chunk_size=3)
+        buffer = IngestBuffer(store, max_rows=100, max_delay=0.05)
+
+        results = await asyncio.gather(
+            buffer.submit(pieces("a1", "a2")),
+            buffer.submit(pieces("b1", "a2")),
+            buffer.submit(pieces("bad")),
+            buffer.submit(pieces("c1")),
+            return_exceptions=True,
+        )
+        await buffer.close()
+
+        assert results[0] == ["a1", "a2"] and results[1] == ["b1"] and results[3] == ["c1"]
+        assert isinstance(results[2], RuntimeError)
+        assert store.ids == {"a1", "a2", "b1", "c1"}
+
+    @pytest.mark.asyncio
+    async def test_partial_failure_of_one_submission(self):
+        """Test that a single submission whose store failed partway is retried and reports every new piece."""
+        store = FakeStore()
+        calls = []
+
+        async def flaky(content_pieces):
+            calls.append([piece.id for piece in content_pieces])
+            if len(calls) == 1:
+                store.ids.add("a1")
+                raise PartialInsertError("connection reset", ["a1"])
+            return await store(content_pieces)
+
+        buffer = IngestBuffer(flaky, max_rows=100, max_delay=0)
+        assert await buffer.submit(pieces("a1", "a2")) == ["a1", "a2"]
+        await buffer.close()
+        assert calls == [["a1", "a2"], ["a1", "a2"]]
+
+    @pytest.mark.asyncio
+    async def test_close_after_flush_stores_nothing(self):
+        """Test that closing a buffer with nothing waiting doesn't call the store."""
+        store = FakeStore()
+        buffer = IngestBuffer(store, max_rows=100, max_delay=0)
+
+        assert await buffer.submit(pieces("a1")) == ["a1"]
+        await buffer.close()
+
+        assert store.batches == [["a1"]]
+
+    @pytest.mark.asyncio
+    async def test_backpressure(self):
+        """Test that submissions wait while the buffer is at capacity."""
+        store = FakeStore(delay=0.05)
+        buffer = IngestBuffer(store, max_rows=2, max_delay=0, capacity=2)
+
+        first = asyncio.create_task(buffer.submit(pieces("a1", "a2")))
+        second = asyncio.create_task(buffer.submit(pieces("b1")))
+        await asyncio.sleep(0.02)
+        # The first batch is being stored and fills the buffer, the second waits for room
+        assert buffer.buffered == 2 and not second.done()
+
+        assert await first == ["a1", "a2"]
+        assert await second == ["b1"]
+        await buffer.close()
+        assert store.batches == [["a1", "a2"], ["b1"]]
+
+    @pytest.mark.asyncio
+    async def test_close_drains(self):
+        """Test that close stores waiting pieces at once, also those of cancelled submitters."""
+        store = FakeStore()
+        buffer = IngestBuffer(store, max_rows=100, max_delay=10)
+
+        submitter = asyncio.create_task(buffer.submit(pieces("a1")))
+        await asyncio.sleep(0.01)
+        submitter.cancel()
+        await asyncio.wait_for(buffer.close(), 1)
+
+        assert store.batches == [["a1"]]
+        assert buffer.buffered == 0
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from digest.retrieval.jobs import FetchJobRegistry, FetchJobStatus, FetchTrigger
+
+
+class TestFetchJobRegistry:
+    """Tests for the FetchJobRegistry class."""
+
+    @pytest.mark.asyncio
+    async def test_active_job_until_finished(self):
+        """Test that a job is the source's active job until it finishes."""
+        registry = FetchJobRegistry()
+        job = registry.create("a", FetchTrigger.MANUAL)
+        assert registry.active("a") is job
+
+        registry.start(job)
+        assert registry.active("a") is job
+        assert job.status == FetchJobStatus.RUNNING
+
+        registry.finish(job)
+        assert registry.active("a") is None
+        assert job.status == FetchJobStatus.SUCCEEDED
+        assert job.finished_at is not None
+
+    @pytest.mark.asyncio
+    async def test_wait_returns_result_or_raises(self):
+        """Test that waiters get the finished job, or the error the job failed with."""
+        registry = FetchJobRegistry()
+        ok = registry.create("a", FetchTrigger.SCHEDULED)
+        failing = registry.create("b", FetchTrigger.SCHEDULED)
+
+        waiters = asyncio.gather(registry.wait(ok), registry.wait(failing), return_exceptions=True)
+        registry.finish(ok)
+        registry.finish(failing, ValueError("broken feed"))
+        result, error = await waiters
+
+        assert result is ok
+        assert isinstance(error, ValueError)
+        assert failing.status == FetchJobStatus.FAILED
+        assert failing.error == "broken feed"
+
+    @pytest.mark.asyncio
+    async def test_history_is_bounded(self):
+        """Test that only the last `history` jobs of a source are kept, newest first."""
+        registry = FetchJobRegistry(history=2)
+        jobs = []
+        for _ in range(3):
+            job = registry.create("a", FetchTrigger.SCHEDULED)
+            registry.finish(job)
+            jobs.append(job)
+
+        assert registry.for_source("a") == [jobs[2], jobs[1]]
+        assert registry.get(jobs[0].id) is None
+        assert registry.for_source("unknown") == []
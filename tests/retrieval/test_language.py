@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+import pytest
+
+from digest.retrieval import language
+from digest.retrieval.language import LanguageDetector
+
+ENGLISH = "The quick brown fox jumps over the lazy dog while the farmer watches from the porch."
+GERMAN = "Der schnelle braune Fuchs springt über den faulen Hund, während der Bauer von der Veranda zusieht."
+
+
+@pytest.fixture
+def calls():
+    """Texts passed to langdetect, in order."""
+    detected = []
+    real_detect = language._detect
+
+    def counting_detect(text):
+        detected.append(text)
+        return real_detect(text)
+
+    with patch.object(language, "_detect", counting_detect):
+        yield detected
+
+
+class TestLanguageDetector:
+    """Tests for the shared language detector."""
+
+    def test_detect_is_cached(self, calls):
+        """Test that detecting the same text twice runs langdetect once."""
+        detector = LanguageDetector()
+
+        assert detector.detect(ENGLISH) == "en"
+        assert detector.detect(ENGLISH) == "en"
+        assert len(calls) == 1
+
+    def test_detect_uses_prefix(self, calls):
+        """Test that only the first max_chars characters are detected; texts sharing them share a result."""
+        detector = LanguageDetector(max_chars=40)
+
+        detector.detect(ENGLISH + " one")
+        detector.detect(ENGLISH + " two")
+        assert calls == [ENGLISH[:40]]
+
+    def test_undetectable_text(self):
+        """Test that text without letters has no language."""
+        assert LanguageDetector().detect("12345 !!!") is None
+
+    def test_cache_is_bounded(self, calls):
+        """Test that the least recently used text is evicted beyond cache_size."""
+        detector = LanguageDetector(cache_size=1)
+
+        detector.detect(ENGLISH)
+        detector.detect(GERMAN)
+        detector.detect(ENGLISH)
+        assert calls == [ENGLISH, GERMAN, ENGLISH]
+
+    @pytest.mark.asyncio
+    async def test_detect_many(self):
+        """Test that a batch keeps its order and duplicates in it are detected once."""
+        detector = LanguageDetector()
+        detected = []
+
+        def counting_detect_all(texts):
+            detected.extend(texts)
+            return [language._detect(text) for text in texts]
+
+        with patch.object(language, "_detect_all", counting_detect_all):
+            result = await detector.detect_many([ENGLISH, GERMAN, ENGLISH])
+            assert result == ["en", "de", "en"]
+            assert detected == [ENGLISH, GERMAN]
+
+            # Cached texts don't reach the worker at all
+            assert await detector.detect_many([GERMAN]) == ["de"]
+            assert detected == [ENGLISH, GERMAN]
+
+    @pytest.mark.asyncio
+    async def test_detect_many_in_parse_pool(self):
+        """Test that a batch is detected in the parse pool when there is one."""
+        with patch.object(language.settings, "PARSE_PROCESSES", 1):
+            try:
+                result = await LanguageDetector().detect_many([GERMAN, ENGLISH])
+            finally:
+                language.close_parse_pool()
+
+        assert result == ["de", "en"]
@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from digest.retrieval import parse_pool
+from digest.retrieval.http import HttpClient
+from digest.retrieval.parse_pool import close_parse_pool, run_parse
+from digest.retrieval.parsers.rss import RssParser, parse_feed
+
+FEED = (Path(__file__).parents[1] / "fixtures" / "feeds" / "news.rss").read_bytes()
+
+
+@pytest.fixture
+def pool():
+    """Run parse steps in a single worker process, whatever their size."""
+    with patch.object(parse_pool.settings, "PARSE_PROCESSES", 1), \
+         patch.object(parse_pool.settings, "PARSE_POOL_MIN_BYTES", 0):
+        yield
+        close_parse_pool()
+
+
+class TestParsePool:
+    """Tests for the parse pool."""
+
+    @pytest.mark.asyncio
+    async def test_runs_inline_without_pool(self):
+        """Test that parse steps run in the calling process when PARSE_PROCESSES is 0."""
+        with patch.object(parse_pool.settings, "PARSE_PROCESSES", 0):
+            assert await run_parse(os.getpid) == os.getpid()
+            assert parse_pool.get_parse_pool() is None
+
+    @pytest.mark.asyncio
+    async def test_small_inputs_run_inline(self, pool):
+        """Test that inputs below PARSE_POOL_MIN_BYTES skip the pool."""
+        with patch.object(parse_pool.settings, "PARSE_POOL_MIN_BYTES", 1024):
+            assert await run_parse(os.getpid, size=10) == os.getpid()
+
+    @pytest.mark.asyncio
+    async def test_runs_in_worker_process(self, pool):
+        """Test that parse steps run in another process and return the same result."""
+        assert await run_parse(os.getpid) != os.getpid()
+        assert await run_parse(parse_feed, FEED, True) == parse_feed(FEED, True)
+
+    @pytest.mark.asyncio
+    async def test_rss_fetch_in_pool(self, pool):
+        """Test that an RSS fetch parsed in the pool yields the same pieces as one parsed inline."""
+        client = HttpClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=FEED)))
+        with patch("digest.retrieval.parsers.base.get_http_client", return_value=client):
+            pooled = await RssParser("test-source", {"url": "https://example.com/feed.xml"}).fetch()
+            with patch.object(parse_pool.settings, "PARSE_PROCESSES", 0):
+                close_parse_pool()
+                inline = await RssParser("test-source", {"url": "https://example.com/feed.xml"}).fetch()
+
+        exclude = {"retrieved_at"}
+        assert [piece.model_dump(exclude=exclude) for piece in pooled] == \
+            [piece.model_dump(exclude=exclude) for piece in inline]
@@ -0,0 +1,55 @@
+import pytest
+
+from digest.retrieval.polling import adaptive_interval, spread_delay, update_item_rate
+
+
+class TestAdaptivePolling:
+    """Tests for the adaptive polling helpers."""
+
+    def test_first_observation_sets_rate(self):
+        """Test that the first observation becomes the estimate."""
+        assert update_item_rate(None, 6, 3600) == pytest.approx(6 / 3600)
+
+    def test_rate_is_smoothed(self):
+        """Test that a quiet fetch only moves the estimate part of the way down."""
+        rate = update_item_rate(0.01, 0, 600, smoothing=0.5)
+        assert rate == pytest.approx(0.005)
+
+    def test_busy_source_polls_often(self):
+        """Test that a high publish rate shortens the interval down to the lower bound."""
+        interval = adaptive_interval(1.0, 3600, min_interval=300, max_interval=86400)
+        assert interval == 300
+
+    def test_quiet_source_polls_rarely(self):
+        """Test that a source without new items backs off to the upper bound."""
+        interval = adaptive_interval(0.0, 3600, min_interval=300, max_interval=86400)
+        assert interval == 86400
+
+    def test_interval_targets_items_per_fetch(self):
+        """Test that the interval aims for `target_items` new items per fetch."""
+        interval = adaptive_interval(2 / 3600, 3600, target_items=1, min_interval=60, max_interval=86400)
+        assert interval == 1800
+
+    def test_saturated_fetch_halves_interval(self):
+        """Test that a fetch where every item was new at least halves the interval."""
+        interval = adaptive_interval(1 / 3600, 3600, saturated=True, min_interval=60, max_interval=86400)
+        assert interval == 1800
+
+
+class TestSpreadDelay:
+    """Tests for spread_delay."""
+
+    def test_deterministic_and_within_window(self):
+        """Test that a key always gets the same delay, inside the window."""
+        delays = [spread_delay(f"source-{i}", 300) for i in range(1000)]
+
+        assert delays == [spread_delay(f"source-{i}", 300) for i in range(1000)]
+        assert all(0 <= delay < 300 for delay in delays)
+
+    def test_spreads_evenly(self):
+        """Test that keys are spread over the whole window, not bunched up."""
+        delays = [spread_delay(f"source-{i}", 300) for i in range(1000)]
+        per_minute = [sum(1 for delay in delays if m * 60 <= delay < (m + 1) * 60) for m in range(5)]
+
+        assert all(150 <= count <= 250 for count in per_minute)
+
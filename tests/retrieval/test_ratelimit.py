@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+import pytest
+
+from digest.retrieval.ratelimit import TokenBucket
+
+
+class TestTokenBucket:
+    """Tests for the TokenBucket class."""
+
+    @pytest.mark.asyncio
+    async def test_burst_then_rate(self):
+        """Test that a full bucket lets a burst through and then paces callers at the rate."""
+        bucket = TokenBucket(rate=100, burst=5)
+        started = time.monotonic()
+        times = []
+
+        async def take():
+            await bucket.acquire()
+            times.append(time.monotonic() - started)
+
+        await asyncio.gather(*(take() for _ in range(15)))
+
+        assert sum(1 for t in times if t < 0.005) == 5
+        # The 10 callers after the burst need 10 new tokens at 100 per second
+        assert max(times) == pytest.approx(0.1, abs=0.03)
+
+    @pytest.mark.asyncio
+    async def test_zero_rate_is_unlimited(self):
+        """Test that a rate of 0 never waits."""
+        bucket = TokenBucket(rate=0, burst=1)
+        await asyncio.wait_for(asyncio.gather(*(bucket.acquire() for _ in range(100))), 0.1)
@@ -0,0 +1,161 @@
+import asyncio
+import gc
+
+import pytest
+
+from digest.retrieval.scheduler import FetchScheduler
+
+
+class TestFetchScheduler:
+    """Tests for the FetchScheduler class."""
+
+    @pytest.mark.asyncio
+    async def test_periodic_reschedule(self):
+        """Test that a key runs again after the delay returned by the callback."""
+        runs = []
+
+        async def callback(key):
+            runs.append(key)
+            return 0.01
+
+        scheduler = FetchScheduler(callback, concurrency=2)
+        scheduler.schedule("a")
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+        assert runs.count("a") >= 3
+
+    @pytest.mark.asyncio
+    async def test_callback_returning_none_stops(self):
+        """Test that returning None removes the key from the schedule."""
+        runs = []
+
+        async def callback(key):
+            runs.append(key)
+            return None
+
+        scheduler = FetchScheduler(callback)
+        scheduler.schedule("a")
+        await asyncio.sleep(0.05)
+
+        assert runs == ["a"]
+        assert not scheduler.is_scheduled("a")
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_due_order(self):
+        """Test that keys are dispatched in due-time order."""
+        runs = []
+
+        async def callback(key):
+            runs.append(key)
+            return None
+
+        scheduler = FetchScheduler(callback, concurrency=1)
+        scheduler.schedule("late", 0.04)
+        scheduler.schedule("early", 0.01)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+        assert runs == ["early", "late"]
+
+    @pytest.mark.asyncio
+    async def test_unschedule(self):
+        """Test that an unscheduled key never runs."""
+        runs = []
+
+        async def callback(key):
+            runs.append(key)
+            return 0.01
+
+        scheduler = FetchScheduler(callback)
+        scheduler.schedule("a", 0.02)
+        scheduler.unschedule("a")
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+        assert runs == []
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self):
+        """Test that no more than `concurrency` jobs run at the same time."""
+        running = 0
+        peak = 0
+        release = asyncio.Event()
+
+        async def callback(key):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await release.wait()
+            running -= 1
+            return None
+
+        scheduler = FetchScheduler(callback, concurrency=3)
+        for i in range(10):
+            scheduler.schedule(f"source-{i}")
+        await asyncio.sleep(0.05)
+
+        stats = scheduler.stats()
+        assert stats.running == 3
+        assert stats.queue_depth == 7
+
+        release.set()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_submit_one_off(self):
+        """Test that a one-off job resolves its future and does not reschedule."""
+        async def callback(key):
+            raise AssertionError("periodic callback should not run")
+
+        async def job():
+            return 42
+
+        scheduler = FetchScheduler(callback)
+        result = await asyncio.wait_for(scheduler.submit("a", job), 1)
+        await scheduler.stop()
+
+        assert result == 42
+        assert not scheduler.is_scheduled("a")
+
+    def test_failed_one_off_without_waiter(self):
+        """Test that a failed one-off job nobody waits for doesn't log an unretrieved exception."""
+        errors = []
+
+        async def callback(key):
+            return None
+
+        async def job():
+            raise ValueError("HTTP 404")
+
+        async def main():
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+            scheduler = FetchScheduler(callback)
+            scheduler.submit("a", job)
+            await asyncio.sleep(0.05)
+            await scheduler.stop()
+
+        # The future is only reported when it is garbage collected, after the loop is done with it
+        asyncio.run(main())
+        gc.collect()
+
+        assert errors == []
+
+    @pytest.mark.asyncio
+    async def test_lag_is_recorded(self):
+        """Test that scheduling lag is measured when workers are saturated."""
+        async def callback(key):
+            await asyncio.sleep(0.03)
+            return None
+
+        scheduler = FetchScheduler(callback, concurrency=1)
+        scheduler.schedule("a")
+        scheduler.schedule("b")
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+        assert scheduler.stats().max_lag >= 0.02
@@ -0,0 +1,59 @@
+from digest.retrieval.seen import SeenCache
+
+
+class TestSeenCache:
+    """Tests for the SeenCache class."""
+
+    def test_contains_per_source(self):
+        """Test that IDs are remembered per source."""
+        cache = SeenCache()
+        cache.add("a", ["1", "2"])
+
+        assert cache.contains("a", "1")
+        assert not cache.contains("b", "1")
+        assert not cache.contains("a", "3")
+        assert cache.is_warm("a")
+        assert not cache.is_warm("b")
+
+    def test_evicts_least_recently_seen(self):
+        """Test that a source keeps at most `capacity` IDs, dropping the least recently seen."""
+        cache = SeenCache(capacity=2)
+        cache.add("a", ["1", "2"])
+        assert cache.contains("a", "1")  # "2" is now the least recently seen
+        cache.add("a", ["3"])
+
+        assert cache.contains("a", "1")
+        assert cache.contains("a", "3")
+        assert not cache.contains("a", "2")
+
+    def test_forget(self):
+        """Test that forgetting a source drops its IDs."""
+        cache = SeenCache()
+        cache.add("a", ["1"])
+        cache.forget("a")
+
+        assert not cache.is_warm("a")
+        assert not cache.contains("a", "1")
+
+    def test_contains_with_hash(self):
+        """Test that an ID recorded with another content hash, or none, is not seen when asked with a hash."""
+        cache = SeenCache()
+        cache.add("a", ["1", "2"], ["h1", None])
+
+        assert cache.contains("a", "1", "h1")
+        assert cache.contains("a", "1")
+        assert not cache.contains("a", "1", "h1-updated")
+        assert not cache.contains("a", "2", "h2")
+
+    def test_evicts_least_recently_used_source(self):
+        """Test that at most `max_sources` sources are kept, dropping the one used least recently."""
+        cache = SeenCache(max_sources=2)
+        cache.add("a", ["1"])
+        cache.add("b", ["1"])
+        assert cache.contains("a", "1")  # "b" is now the least recently used
+        cache.add("c", ["1"])
+
+        assert cache.is_warm("a")
+        assert cache.is_warm("c")
+        assert not cache.is_warm("b")
+        assert not cache.contains("b", "1")
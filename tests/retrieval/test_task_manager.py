@@ -0,0 +1,366 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from digest.database.enums import ContentType, SourceType
+from digest.database.models.content import ContentPiece
+from digest.database.models.source import Source, SourceFetchState
+from digest.retrieval import task_manager as task_manager_module
+from digest.retrieval.parsers.base import FetchError
+from digest.retrieval.polling import spread_delay
+from digest.retrieval.task_manager import TaskManager
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeSources:
+    """In-memory stand-in for AsyncSourceRepository, shared by all sessions."""
+
+    def __init__(self, *sources):
+        self.rows = {source.id: source for source in sources}
+
+    def __call__(self, session):
+        return self
+
+    async def get_enabled(self):
+        return [source.model_copy() for source in self.rows.values() if source.enabled]
+
+    async def get_by_id(self, source_id):
+        source = self.rows.get(source_id)
+        return source.model_copy() if source else None
+
+    async def update(self, source):
+        return source
+
+
+class FakeFetchStates:
+    def __call__(self, session):
+        return self
+
+    async def get_or_create(self, source_id):
+        return SourceFetchState(source_id=source_id, etag='"v1"')
+
+    async def save(self, state):
+        return state
+
+
+class FakeContent:
+    """Stand-in for AsyncContentRepository that stores every piece not stored before."""
+
+    def __init__(self):
+        self.ids = set()
+        self.hashes = {}
+        self.batches = 0
+
+    def __call__(self, session):
+        return self
+
+    async def get_recent_ids(self, source_id, limit):
+        return []
+
+    async def get_recent_fingerprints(self, limit):
+        return []
+
+    async def bulk_insert(self, content_pieces):
+        self.batches += 1
+        new_ids = [piece.id for piece in content_pieces if piece.id not in self.ids]
+        self.ids.update(new_ids)
+        return new_ids
+
+    async def bulk_load(self, content_pieces):
+        self.loaded = len(content_pieces)
+        return await self.bulk_insert(content_pieces)
+
+    async def upsert(self, content_pieces):
+        written = []
+        for piece in content_pieces:
+            content_hash = ContentPiece.compute_hash(piece.title, piece.content)
+            if self.hashes.get(piece.id) != content_hash:
+                self.hashes[piece.id] = piece.content_hash = content_hash
+                written.append(piece.id)
+        return written
+
+
+class FakeParser:
+    def __init__(self, source_id, piece_ids, content="text"):
+        self.source_id = source_id
+        self.piece_ids = piece_ids
+        self.content = content
+        self.fetch_state = SourceFetchState(source_id=source_id)
+        self.stats = None
+        self.host = None
+
+    async def fetch(self):
+        return [
+            ContentPiece(id=piece_id, title="", content=self.content, content_type=ContentType.ARTICLE,
+                         url=f"https://example.com/{piece_id}", source_id=self.source_id)
+            for piece_id in self.piece_ids
+        ]
+
+
+def rss_source(source_id, url="https://example.com/feed.xml", **kwargs):
+    # Retrieved just now, so nothing is fetched while the test runs
+    return Source(
+        id=source_id,
+        name=source_id,
+        source_type=SourceType.RSS,
+        parser_id="rss",
+        config={"url": url},
+        last_retrieved=datetime.utcnow(),
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def sources():
+    sources = FakeSources(rss_source("a"), rss_source("b"), rss_source("off", enabled=False))
+    with patch.object(task_manager_module, "AsyncSourceRepository", sources), \
+         patch.object(task_manager_module, "AsyncFetchStateRepository", FakeFetchStates()):
+        yield sources
+
+
+class TestReconcile:
+    """Tests for TaskManager.reconcile."""
+
+    @pytest.mark.asyncio
+    async def test_starts_enabled_sources_only(self, sources):
+        """Test that only enabled sources are scheduled."""
+        manager = TaskManager(FakeSession)
+        result = await manager.reconcile()
+        await manager.stop_all_parsers()
+
+        assert sorted(result.started) == ["a", "b"]
+        assert not result.stopped and not result.reconfigured
+
+    @pytest.mark.asyncio
+    async def test_applies_only_changes(self, sources):
+        """Test that changed sources are reconfigured or stopped and the others are left running."""
+        manager = TaskManager(FakeSession)
+        await manager.reconcile()
+
+        sources.rows["a"].config = {"url": "https://example.com/other.xml"}
+        sources.rows["b"].enabled = False
+        sources.rows["off"].enabled = True
+        result = await manager.reconcile()
+        unchanged = await manager.reconcile()
+
+        assert (result.started, result.stopped, result.reconfigured) == (["off"], ["b"], ["a"])
+        assert not unchanged.changed
+        assert manager.parsers["a"].config["url"] == "https://example.com/other.xml"
+        # Validators of the old feed are not sent to the new one
+        assert manager.parsers["a"].fetch_state.etag is None
+        assert "b" not in manager.parsers and not manager.scheduler.is_scheduled("b")
+        await manager.stop_all_parsers()
+
+    @pytest.mark.asyncio
+    async def test_new_frequency_reschedules(self, sources):
+        """Test that a new update frequency takes effect without waiting for the old interval."""
+        manager = TaskManager(FakeSession)
+        await manager.reconcile()
+        state = manager.parsers["a"].fetch_state
+        assert manager.scheduler.next_run_in("a") > 3000
+
+        sources.rows["a"].update_frequency = 600
+        assert await manager.reconcile_source("a") == "reconfigured"
+
+        assert manager.scheduler.next_run_in("a") <= 600
+        # Same feed, so its fetch state is kept
+        assert manager.parsers["a"].fetch_state is state
+        await manager.stop_all_parsers()
+
+    @pytest.mark.asyncio
+    async def test_startup_spreads_due_sources(self):
+        """Test that sources due at startup get fixed, different delays within the spread window."""
+        due = [rss_source(f"due-{i}") for i in range(20)]
+        for source in due:
+            source.last_retrieved = None
+        with patch.object(task_manager_module, "AsyncSourceRepository", FakeSources(*due)), \
+             patch.object(task_manager_module, "AsyncFetchStateRepository", FakeFetchStates()):
+            manager = TaskManager(FakeSession)
+            await manager.reconcile(spread=300)
+
+        delays = {source.id: manager.scheduler.next_run_in(source.id) for source in due}
+        await manager.stop_all_parsers()
+
+        for source_id, delay in delays.items():
+            assert delay == pytest.approx(spread_delay(source_id, 300), abs=1)
+        assert len({round(delay) for delay in delays.values()}) > 10
+
+
+class TestNewContent:
+    """Tests for storing fetched content."""
+
+    @pytest.mark.asyncio
+    async def test_new_items_count_inserted_only(self, sources):
+        """Test that a fetch counts the pieces that were actually inserted."""
+        manager = TaskManager(FakeSession)
+        content = FakeContent()
+        with patch.object(task_manager_module, "AsyncContentRepository", content):
+            source = sources.rows["a"]
+            await manager.fetch_source(source, FakeParser("a", ["a1", "a2"]))
+            await manager.fetch_source(source, FakeParser("a", ["a2", "a3"]))
+            await manager.fetch_source(source, FakeParser("a", ["a3"]))
+
+        assert content.ids == {"a1", "a2", "a3"}
+        assert [job.new_items for job in reversed(manager.jobs.for_source("a"))] == [2, 1, 0]
+        assert manager.failures == {}
+
+    @pytest.mark.asyncio
+    async def test_large_batches_are_copied(self, sources):
+        """Test that fetches with at least BULK_LOAD_MIN_ROWS pieces are stored through bulk_load."""
+        manager = TaskManager(FakeSession)
+        content = FakeContent()
+        with patch.object(task_manager_module, "AsyncContentRepository", content), \
+             patch.object(task_manager_module.settings, "BULK_LOAD_MIN_ROWS", 3):
+            await manager.fetch_source(sources.rows["a"], FakeParser("a", ["a1", "a2"]))
+            assert not hasattr(content, "loaded")
+            await manager.fetch_source(sources.rows["a"], FakeParser("a", ["a3", "a4", "a5"]))
+
+        assert content.loaded == 3
+        assert manager.jobs.for_source("a")[0].new_items == 3
+
+
+    @pytest.mark.asyncio
+    async def test_concurrent_fetches_share_a_commit(self, sources):
+        """Test that the content of fetches finishing together is stored in one batch."""
+        manager = TaskManager(FakeSession)
+        content = FakeContent()
+        with patch.object(task_manager_module, "AsyncContentRepository", content):
+            await asyncio.gather(
+                manager.fetch_source(sources.rows["a"], FakeParser("a", ["a1", "a2"])),
+                manager.fetch_source(sources.rows["b"], FakeParser("b", ["b1"])),
+            )
+            await manager.stop_all_parsers()
+
+        assert content.batches == 1
+        assert manager.jobs.for_source("a")[0].new_items == 2
+        assert manager.jobs.for_source("b")[0].new_items == 1
+
+    @pytest.mark.asyncio
+    async def test_near_duplicates_are_linked_and_not_indexed(self, sources):
+        """Test that a syndicated copy is linked to the stored original and not linked to itself."""
+        story = " ".join(f"word{i % 37} of the syndicated story" for i in range(60))
+        manager = TaskManager(FakeSession)
+        with patch.object(task_manager_module, "AsyncContentRepository", FakeContent()):
+            await manager.fetch_source(sources.rows["a"], FakeParser("a", ["a1"], content=story))
+            copy = FakeParser("b", ["b1"], content=f"<p>{story}</p>")
+            pieces = await copy.fetch()
+            copy.fetch = lambda: _return(pieces)
+            await manager.fetch_source(sources.rows["b"], copy)
+
+        assert pieces[0].duplicate_of == "a1"
+        assert len(manager.near_duplicates) == 1
+        job = manager.jobs.for_source("b")[0]
+        assert (job.new_items, job.duplicates) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_upsert_stores_updated_content(self, sources):
+        """Test that with CONTENT_UPSERT, changed pieces are stored again and counted like new ones."""
+        manager = TaskManager(FakeSession)
+        with patch.object(task_manager_module, "AsyncContentRepository", FakeContent()), \
+             patch.object(task_manager_module.settings, "CONTENT_UPSERT", True):
+            source = sources.rows["a"]
+            await manager.fetch_source(source, FakeParser("a", ["a1", "a2"]))
+            await manager.fetch_source(source, FakeParser("a", ["a1", "a2"]))
+            await manager.fetch_source(source, FakeParser("a", ["a1"], content="updated text"))
+
+        assert [job.new_items for job in reversed(manager.jobs.for_source("a"))] == [2, 0, 1]
+        assert manager.seen.contains("a", "a1", ContentPiece.compute_hash("", "updated text"))
+
+
+    @pytest.mark.asyncio
+    async def test_concurrent_first_fetches_warm_caches_once(self, sources):
+        """Test that fetches starting together load the fingerprints, and each source's IDs, once."""
+        calls = []
+
+        class CountingContent(FakeContent):
+            async def get_recent_ids(self, source_id, limit):
+                calls.append(source_id)
+                await asyncio.sleep(0)
+                return []
+
+            async def get_recent_fingerprints(self, limit):
+                calls.append("fingerprints")
+                await asyncio.sleep(0)
+                return []
+
+        manager = TaskManager(FakeSession)
+        with patch.object(task_manager_module, "AsyncContentRepository", CountingContent()):
+            await asyncio.gather(*(
+                manager.fetch_source(sources.rows[source_id], FakeParser(source_id, [f"{source_id}{i}"]))
+                for i in range(4) for source_id in ("a", "b")
+            ))
+            await manager.stop_all_parsers()
+
+        assert sorted(calls) == ["a", "b", "fingerprints"]
+
+
+class TestHostFailures:
+    """Tests for which fetch errors count towards a host's circuit breaker."""
+
+    @staticmethod
+    def http_error(status_code):
+        response = requests.Response()
+        response.status_code = status_code
+        return requests.HTTPError(f"{status_code} error", response=response)
+
+    @pytest.mark.parametrize("status_code, expected", [(404, False), (410, False), (429, True), (503, True)])
+    def test_requests_http_errors_by_status(self, status_code, expected):
+        """Test that only server errors and rate limiting count against the host."""
+        assert TaskManager._is_host_failure(self.http_error(status_code)) is expected
+
+    def test_requests_connection_errors_count(self):
+        """Test that failing to connect to or hear back from the host counts against it."""
+        assert TaskManager._is_host_failure(requests.ConnectionError("refused"))
+        assert TaskManager._is_host_failure(requests.ReadTimeout("timed out"))
+
+    def test_source_errors_dont_count(self):
+        """Test that errors caused by one source's URL or content don't trip the host's breaker."""
+        assert not TaskManager._is_host_failure(requests.TooManyRedirects("loop"))
+        assert not TaskManager._is_host_failure(requests.exceptions.InvalidURL("bad channel"))
+        assert not TaskManager._is_host_failure(IndexError("string index out of range"))
+        assert not TaskManager._is_host_failure(FetchError("not a feed", 404))
+
+    @pytest.mark.asyncio
+    async def test_database_errors_dont_count(self, sources):
+        """Test that a database outage backs the source off without tripping its host's breaker."""
+        def session_factory():
+            raise ConnectionRefusedError(111, "Connect call failed ('127.0.0.1', 5432)")
+
+        manager = TaskManager(session_factory)
+        parser = FakeParser("a", ["a1"])
+        parser.host = "example.com"
+        await manager.fetch_source(sources.rows["a"], parser)
+
+        assert manager.failures == {"a": 1}
+        assert manager.breakers.get("example.com").failures == 0
+
+    @pytest.mark.asyncio
+    async def test_fetch_errors_count(self, sources):
+        """Test that the host's breaker records a failed connection to it."""
+        manager = TaskManager(FakeSession)
+        parser = FakeParser("a", ["a1"])
+        parser.host = "example.com"
+        parser.fetch = lambda: _raise(ConnectionRefusedError(111, "Connection refused"))
+        with patch.object(task_manager_module, "AsyncContentRepository", FakeContent()):
+            await manager.fetch_source(sources.rows["a"], parser)
+
+        assert manager.breakers.get("example.com").failures == 1
+        assert manager.jobs.for_source("a")[0].host_failure
+
+
+async def _return(value):
+    return value
+
+
+async def _raise(error):
+    raise error
@@ -0,0 +1,42 @@
+import pytest
+
+from digest.retrieval.urls import canonicalize_url
+
+
+class TestCanonicalizeUrl:
+    """Tests for the canonicalize_url function."""
+
+    @pytest.mark.parametrize("url", [
+        "https://example.com/news/story",
+        "http://example.com/news/story",
+        "https://WWW.Example.com/news/story/",
+        "https://example.com:443/news/story#comments",
+        "https://example.com/news/story?utm_source=rss&utm_medium=feed&fbclid=abc",
+        "https://amp.example.com/news/story",
+        "https://example.com/news/story/amp/",
+        "https://example.com/amp/news/story",
+        "https://example.com/news/story.amp?amp=1",
+        "https://www-example-com.cdn.ampproject.org/c/s/www.example.com/news/story",
+    ])
+    def test_variants_share_canonical_url(self, url):
+        """Test that tracking, scheme, host, slash and AMP variants of a page are canonicalized alike."""
+        assert canonicalize_url(url) == "https://example.com/news/story"
+
+    def test_keeps_meaningful_parts(self):
+        """Test that other query parameters (sorted), ports and path case are kept."""
+        assert canonicalize_url("http://example.com:8080/Item?id=2&page=1&utm_campaign=x") == (
+            "https://example.com:8080/Item?id=2&page=1"
+        )
+        assert canonicalize_url("https://example.com/?b=2&a=1") == "https://example.com?a=1&b=2"
+
+    def test_configurable(self):
+        """Test that the dropped parameters and www handling can be configured."""
+        url = "https://www.example.com/story?ref=home&utm_source=rss"
+        assert canonicalize_url(url, drop_params=["ref"], strip_www=False) == (
+            "https://www.example.com/story?utm_source=rss"
+        )
+
+    @pytest.mark.parametrize("url", [None, "", "/relative/path", "ftp://example.com/file", "https://[::1"])
+    def test_not_canonicalizable(self, url):
+        """Test that missing, relative, non-http and malformed URLs have no canonical form."""
+        assert canonicalize_url(url) is None
@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from digest.retrieval import worker as worker_module
+from digest.retrieval.worker import IngestWorker
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeLeases:
+    """In-memory stand-in for LeaseRepository, shared by all sessions."""
+
+    def __init__(self, source_ids):
+        self.due = list(source_ids)
+        self.owners = {}
+        self.released = {}
+        self.ensured = 0
+        self.claims = 0
+
+    def __call__(self, session):
+        return self
+
+    async def ensure_all(self):
+        self.ensured += 1
+
+    async def get(self, source_id):
+        return SimpleNamespace(consecutive_failures=2)
+
+    async def claim(self, owner, limit, lease_seconds):
+        self.claims += 1
+        claimed, self.due = self.due[:limit], self.due[limit:]
+        for source_id in claimed:
+            self.owners[source_id] = owner
+        return claimed
+
+    async def release(self, source_id, owner, next_fetch_in, consecutive_failures):
+        assert self.owners.pop(source_id) == owner
+        self.released[source_id] = (next_fetch_in, consecutive_failures)
+        return True
+
+
+class FakeTaskManager:
+    def __init__(self, failing=()):
+        self.failures = {}
+        self.failing = set(failing)
+        self.fetched = []
+        self.running = 0
+        self.peak = 0
+
+    async def load_source(self, source_id):
+        return SimpleNamespace(id=source_id), None
+
+    def create_parser(self, source, state):
+        return None
+
+    async def fetch_source(self, source, parser):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        self.fetched.append(source.id)
+        if source.id in self.failing:
+            self.failures[source.id] += 1
+            return 120
+        self.failures.pop(source.id, None)
+        return 3600
+
+
+@pytest.mark.asyncio
+async def test_worker_claims_fetches_and_releases(monkeypatch):
+    """Test that every claimed source is fetched once and released with its next delay and failure count."""
+    leases = FakeLeases([f"source-{i}" for i in range(5)])
+    monkeypatch.setattr(worker_module, "LeaseRepository", leases)
+    task_manager = FakeTaskManager(failing={"source-3"})
+
+    worker = IngestWorker(task_manager, FakeSession, worker_id="w1", concurrency=2, poll_interval=0.01)
+    run = asyncio.create_task(worker.run())
+    await asyncio.sleep(0.2)
+    run.cancel()
+    await worker.stop()
+
+    assert sorted(task_manager.fetched) == [f"source-{i}" for i in range(5)]
+    assert task_manager.peak == 2
+    assert leases.released["source-0"] == (3600, 0)
+    assert leases.released["source-3"] == (120, 3)
+    assert leases.owners == {}
+
+
+@pytest.mark.asyncio
+async def test_worker_creates_missing_leases_periodically(monkeypatch):
+    """Test that lease rows are created when the worker starts and every sync interval, not on every claim."""
+    leases = FakeLeases([])
+    monkeypatch.setattr(worker_module, "LeaseRepository", leases)
+
+    worker = IngestWorker(
+        FakeTaskManager(), FakeSession, worker_id="w1", poll_interval=0.01, sync_interval=0.1
+    )
+    run = asyncio.create_task(worker.run())
+    await asyncio.sleep(0.25)
+    run.cancel()
+    await worker.stop()
+
+    assert 2 <= leases.ensured <= 3
+    assert leases.claims > 3 * leases.ensured